@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recommender.middleware.RequestTimingMiddleware',
+    'recommender.middleware.ReplicaPinningMiddleware',
+    'recommender.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -55,6 +59,80 @@ MIDDLEWARE = [
     'recommender.middleware.AuthenticationMiddleware',
 ]
 
+# Add per-stage timings (auth, cbf, cf, model, serialize, db) to responses as a Server-Timing header
+SERVER_TIMING_HEADER = True
+
+# Compress (Brotli if installed, else gzip) response bodies of at least this many bytes
+RECOMMENDER_COMPRESS_MIN_BYTES = 1024
+
+# Span tracing of requests and ModelHandler stages, shown at /api/recommender/traces/
+RECOMMENDER_TRACING = os.environ.get('CAMPUS_RECOMMENDER_TRACING') == '1'
+# Finished traces kept in memory for the slowest-requests view
+RECOMMENDER_TRACE_BUFFER_SIZE = 200
+# Log the span tree of traces at least this slow (milliseconds); None disables logging
+RECOMMENDER_TRACE_LOG_MS = None
+# Append every finished trace to this JSON Lines file; None disables the file
+RECOMMENDER_TRACE_FILE = None
+
+# Prometheus text exposition at /metrics, off unless the environment variable is set to 1
+RECOMMENDER_METRICS_ENABLED = os.environ.get('CAMPUS_RECOMMENDER_METRICS_ENABLED') == '1'
+# Addresses allowed to scrape /metrics (comma separated in the environment variable); staff users
+# may read it from anywhere
+RECOMMENDER_METRICS_ALLOWED_IPS = os.environ.get('CAMPUS_RECOMMENDER_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+# Shared directory for multi-process servers (e.g. gunicorn workers): each process writes its
+# values there and /metrics sums them. None keeps metrics per process. Files of exited workers are
+# folded away on the next scrape; gunicorn can do it at once with a child_exit hook calling
+# recommender.metrics.registry.mark_process_dead(worker.pid).
+RECOMMENDER_METRICS_DIR = os.environ.get('CAMPUS_RECOMMENDER_METRICS_DIR') or None
+
+# Run the hybrid candidate generators in parallel on a thread pool instead of one after another
+RECOMMENDER_CONCURRENT_HYBRID = os.environ.get('CAMPUS_RECOMMENDER_CONCURRENT_HYBRID') == '1'
+# Threads in that pool; each running generator holds its own database connection
+RECOMMENDER_STAGE_WORKERS = 4
+# Hybrid candidate generators finishing after this many milliseconds are left out of the merge;
+# None waits for all
+RECOMMENDER_HYBRID_BUDGET_MS = 1500
+# Clubs each hybrid candidate generator nominates at most (0 turns a generator off), and the cap on
+# the merged set the re-ranker scores, so hybrid cost stays bounded however large the catalog is
+RECOMMENDER_CANDIDATE_BUDGETS = {'vector': 50, 'popularity': 20, 'category': 50, 'cf': 50}
+RECOMMENDER_RERANK_MAX_CANDIDATES = 150
+# Threads running ModelHandler work for the async recommender endpoints (ASGI)
+RECOMMENDER_ASYNC_WORKERS = 8
+
+# Unix socket of a shared model inference server (manage.py run_inference_server). When set, web
+# workers score, compare vectors and vectorize students through it, and only load the model,
+# vectors and vectorizer themselves while it is down.
+RECOMMENDER_INFERENCE_SOCKET = os.environ.get('CAMPUS_RECOMMENDER_INFERENCE_SOCKET') or None
+# Seconds to wait for the inference server before scoring in-process
+RECOMMENDER_INFERENCE_TIMEOUT = 1.0
+
+# Versioned artifact sets (one directory per build, see build_artifacts) and the CURRENT pointer
+# naming the one to serve. Without a pointer the files in data/ are served.
+RECOMMENDER_ARTIFACTS_DIR = os.environ.get('CAMPUS_RECOMMENDER_ARTIFACTS_DIR') or BASE_DIR / 'data' / 'artifacts'
+# Seconds between checks of CURRENT; on a change the new version is loaded in the background and
+# swapped in. None disables polling.
+RECOMMENDER_ARTIFACT_POLL_SECONDS = 10
+# Longest wait for in-flight requests before a replaced model version is released
+RECOMMENDER_HANDLER_DRAIN_SECONDS = 30
+
+# Popularity and trending tables used by the cold-start and fallback paths: trending scores halve
+# every this many days, new interactions are applied every REFRESH seconds, and the tables are
+# rebuilt from scratch every REBUILD seconds. Workers start from the snapshot written by
+# `manage.py build_popularity` when it exists.
+RECOMMENDER_TRENDING_HALF_LIFE_DAYS = 7.0
+RECOMMENDER_POPULARITY_REFRESH_SECONDS = 30
+RECOMMENDER_POPULARITY_REBUILD_SECONDS = 86400
+RECOMMENDER_POPULARITY_SNAPSHOT = BASE_DIR / 'data' / 'popularity.npz'
+
+# Buffer club views in memory and write them in bulk from a background thread; record-view then
+# answers 202 without touching the interactions table
+RECOMMENDER_BUFFERED_VIEWS = os.environ.get('CAMPUS_RECOMMENDER_BUFFERED_VIEWS') == '1'
+# Flush buffered views every this many milliseconds, or once this many distinct views are pending
+RECOMMENDER_VIEW_FLUSH_MS = 500
+RECOMMENDER_VIEW_FLUSH_EVENTS = 500
+# Above this many pending views, record-view writes synchronously again
+RECOMMENDER_VIEW_BUFFER_MAX = 100000
+
 ROOT_URLCONF = 'campus_recommender.urls'
 
 TEMPLATES = [
@@ -83,8 +161,65 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Persistent connections, checked before reuse. Set the environment variable to 0 under
+        # ASGI, where every request runs on a new thread and would leave its connection open.
+        'CONN_MAX_AGE': int(os.environ.get('CAMPUS_RECOMMENDER_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replica for GET traffic: a second SQLite file refreshed by `manage.py sync_replica`
+REPLICA_DATABASE = os.environ.get('CAMPUS_RECOMMENDER_REPLICA_DB') or None
+if REPLICA_DATABASE:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': REPLICA_DATABASE,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_ROUTERS = ['recommender.routers.ReplicaRouter']
+# Seconds a client that wrote keeps reading from the primary; keep it above the sync interval
+REPLICA_PIN_SECONDS = 30
+
+# Write-ahead logging for SQLite, when the environment variable is set to 1: readers run during a
+# write, at the cost of db.sqlite3-wal/-shm files next to the database. Off by default, as the mode
+# is stored in the database file itself.
+SQLITE_WAL = os.environ.get('CAMPUS_RECOMMENDER_SQLITE_WAL') == '1'
+
+# Applied to every SQLite connection when it is opened; writers wait up to busy_timeout
+# milliseconds for the lock instead of failing at once
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL' if SQLITE_WAL else 'DELETE',
+    # NORMAL is only durable with WAL; rollback journals keep SQLite's default
+    'synchronous': 'NORMAL' if SQLITE_WAL else 'FULL',
+    'busy_timeout': 5000,
+}
+
+# Version tokens behind the ETags of the club catalog and recommendation responses, bumped when
+# clubs, students or interactions change. Interactions bump one token per student on the hot path,
+# so the cache must be in memory; it must also be shared by every worker and by the management
+# commands, so set the Redis URL (needs the redis package) wherever more than one process serves.
+RECOMMENDER_REDIS_URL = os.environ.get('CAMPUS_RECOMMENDER_REDIS_URL') or None
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': RECOMMENDER_REDIS_URL,
+    } if RECOMMENDER_REDIS_URL else {
+        # Development: tokens per process
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'version-tokens',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
+RECOMMENDER_VERSION_CACHE = 'versions'
+# Lifetime of a version token in seconds (None: until bumped). Per-process tokens expire, so bumps
+# made by other processes reach a process's ETags within this time.
+RECOMMENDER_VERSION_TOKEN_SECONDS = None if RECOMMENDER_REDIS_URL else 60
+# Recommendations also change with other students' activity, which bumps no token of the
+# student; their ETags change at least this often
+RECOMMENDER_RECOMMENDATION_ETAG_SECONDS = 300
 
 
 # Password validation
@@ -105,6 +240,15 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Settings profile: 'test' is for throwaway test/benchmark databases only
+PROFILE = os.environ.get('CAMPUS_RECOMMENDER_PROFILE', 'default')
+
+if PROFILE == 'test':
+    # Fast (insecure) hashing so bulk imports of seeded accounts stay cheap
+    PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -141,6 +285,8 @@ CSRF_TRUSTED_ORIGINS = [
 
 # Allow credentials in CORS
 CORS_ALLOW_CREDENTIALS = True
+# Response headers the frontend may read
+CORS_EXPOSE_HEADERS = ['X-Model-Version']
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -151,4 +297,9 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON (stdlib encoder when orjson is not installed)
+    'DEFAULT_RENDERER_CLASSES': [
+        'recommender.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
@@ -0,0 +1,34 @@
+// Club catalog helpers
+// /api/clubs/ is cursor-paginated (no page numbers, no count), so whole-catalog views follow `next`
+
+import axios from 'axios'
+
+// Largest page the API serves (ClubCursorPagination.max_page_size)
+const CLUB_PAGE_SIZE = 500
+
+/**
+ * Fetch every club by following the cursor pages
+ * @param {string} baseUrl - API base URL
+ * @param {Object} params - Extra query parameters, e.g. { fields: 'id' } for a sparse fieldset
+ * @param {Object} config - Extra axios config (headers)
+ * @returns {Promise<Array>} All clubs in ID order
+ */
+export const fetchAllClubs = async (baseUrl, params = {}, config = {}) => {
+  const clubs = []
+  let response = await axios.get(`${baseUrl}/api/clubs/`, {
+    ...config,
+    params: { page_size: CLUB_PAGE_SIZE, ...params }
+  })
+  while (true) {
+    // Unpaginated responses are a plain list
+    if (!response.data.results) {
+      return response.data
+    }
+    clubs.push(...response.data.results)
+    if (!response.data.next) {
+      return clubs
+    }
+    // `next` already carries the cursor and the query parameters
+    response = await axios.get(response.data.next, config)
+  }
+}
@@ -0,0 +1,95 @@
+import os
+import logging
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .models import Student, Club
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+# Artifact file names, as looked up by ModelHandler
+MODEL_FILE = 'hybrid_recommendation_model.keras'
+STUDENT_VECTORS_FILE = 'student_vectors.npz'
+CLUB_VECTORS_FILE = 'club_vectors.npz'
+VECTORIZER_FILE = 'vectorizer.pkl'
+MANIFEST_FILE = 'manifest.json'
+# Student and club primary keys in vector row order
+ROW_IDS_FILE = 'row_ids.npz'
+# File in the artifacts directory naming the version workers serve
+CURRENT_FILE = 'CURRENT'
+
+REQUIRED_FILES = (MODEL_FILE, STUDENT_VECTORS_FILE, CLUB_VECTORS_FILE, VECTORIZER_FILE)
+
+
+def artifacts_dir():
+    """Directory holding one sub-directory per artifact version, plus the CURRENT pointer"""
+    return str(getattr(settings, 'RECOMMENDER_ARTIFACTS_DIR', os.path.join(settings.BASE_DIR, 'data', 'artifacts')))
+
+
+def version_dir(version, directory=None):
+    return os.path.join(directory or artifacts_dir(), version)
+
+
+def list_versions(directory=None):
+    """Complete versions, oldest first (version names sort by build time)"""
+    directory = directory or artifacts_dir()
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if not name.startswith('.') and os.path.isdir(os.path.join(directory, name))
+        and not missing_files(os.path.join(directory, name))
+    )
+
+
+def missing_files(path):
+    """Artifact files a version directory lacks"""
+    return [filename for filename in REQUIRED_FILES if not os.path.exists(os.path.join(path, filename))]
+
+
+def read_current(directory=None):
+    """Version named by the CURRENT pointer, or None when there is no pointer"""
+    try:
+        with open(os.path.join(directory or artifacts_dir(), CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_current(version, directory=None):
+    """Atomically point CURRENT at a version; workers polling the pointer swap to it"""
+    directory = directory or artifacts_dir()
+    missing = missing_files(version_dir(version, directory))
+    if missing:
+        raise ValueError(f"Version {version} is incomplete, missing: {', '.join(missing)}")
+    tmp_path = os.path.join(directory, f'.{CURRENT_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(f'{version}\n')
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+
+
+def save_row_ids(path, student_ids, club_ids):
+    np.savez(os.path.join(path, ROW_IDS_FILE), student_ids=np.asarray(student_ids, dtype=np.int64),
+             club_ids=np.asarray(club_ids, dtype=np.int64))
+
+
+def load_row_ids(path):
+    """(student_ids, club_ids) in vector row order, or None for versions built without them"""
+    row_ids_path = os.path.join(path, ROW_IDS_FILE)
+    if not os.path.exists(row_ids_path):
+        return None
+    with np.load(row_ids_path) as row_ids:
+        return row_ids['student_ids'], row_ids['club_ids']
+
+
+def assign_vector_indexes(student_ids, club_ids):
+    """Point every student and club at its row in a version's vector files (None if it has no row)"""
+    with transaction.atomic():
+        for model, ids in ((Student, student_ids), (Club, club_ids)):
+            # Clear first so reassigned rows never collide on the unique constraint
+            model.objects.exclude(vector_index=None).update(vector_index=None)
+            rows = [model(pk=int(pk), vector_index=i) for i, pk in enumerate(ids)]
+            model.objects.bulk_update(rows, ['vector_index'], batch_size=1000)
+        # vector_index is part of the club representation
+        versions.bump_catalog()
@@ -0,0 +1,127 @@
+import os
+import io
+import json
+import time
+import resource
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from .models import Student, Club, Interaction
+from .evaluation import latency_percentiles
+
+# Named dataset sizes; the smallest matches the training CSVs the shipped artifacts were built from
+SCALES = {
+    'small': {'students': 1000, 'clubs': 24},
+    'medium': {'students': 10000, 'clubs': 500},
+    'large': {'students': 100000, 'clubs': 5000},
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed_database(students, clubs, interactions_per_student, seed=None, batch_size=5000, stdout=None):
+    """
+    Fill an empty, migrated database with a benchmark dataset.
+
+    The training CSVs are imported first so their rows keep the vector indexes of the shipped
+    artifacts; the remaining students and clubs reuse the attributes of the imported ones and
+    have no vector row, as if they registered after the artifacts were built.
+
+    Args:
+        students: Total number of students (at least the CSV size)
+        clubs: Total number of clubs (at least the CSV size)
+        interactions_per_student: Average interactions per student
+        seed: Random seed for attributes and interactions
+        batch_size: Rows written per bulk_create
+
+    Returns:
+        Dictionary of row counts
+    """
+    quiet = io.StringIO()
+    call_command('import_training_data', stdout=quiet)
+    rng = np.random.default_rng(seed)
+
+    templates = list(Student.objects.values('gender', 'course', 'hobbies', 'interests', 'skills', 'interest_profile'))
+    extra_students = max(students - len(templates), 0)
+    # Every synthetic account gets the same unusable password; hashing per row would dominate seeding
+    password = make_password(None)
+    for start in range(0, extra_students, batch_size):
+        numbers = range(start, min(start + batch_size, extra_students))
+        with transaction.atomic():
+            User.objects.bulk_create([User(username=f'bench{n}', password=password) for n in numbers])
+            users = User.objects.in_bulk([f'bench{n}' for n in numbers], field_name='username')
+            Student.objects.bulk_create([
+                Student(user=users[f'bench{n}'], student_id=f'B{n:07d}', **templates[i])
+                for n, i in zip(numbers, rng.integers(0, len(templates), size=len(numbers)))
+            ])
+        if stdout:
+            stdout.write(f'  {start + len(numbers)}/{extra_students} extra students')
+
+    club_templates = list(Club.objects.order_by('id').values('name', 'category', 'description'))
+    extra_clubs = max(clubs - len(club_templates), 0)
+    new_clubs = []
+    for n in range(extra_clubs):
+        template = club_templates[n % len(club_templates)]
+        new_clubs.append(Club(
+            name=f"{template['name']} {n // len(club_templates) + 2}",
+            category=template['category'],
+            description=template['description'],
+        ))
+    Club.objects.bulk_create(new_clubs, batch_size=batch_size)
+
+    call_command(
+        'create_test_interactions', clear=True, seed=seed,
+        total=Student.objects.count() * interactions_per_student, stdout=quiet
+    )
+    return {
+        'students': Student.objects.count(),
+        'clubs': Club.objects.count(),
+        'interactions': Interaction.objects.count(),
+    }
+
+
+def load_manifest(path):
+    """Dataset description stored next to a seeded benchmark database, or None"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def time_calls(func, args_list, warmup=0):
+    """
+    Call func once per argument tuple, recording latency and query counts.
+
+    Args:
+        func: Callable to benchmark
+        args_list: List of argument tuples, one per call
+        warmup: Number of leading calls excluded from the statistics
+
+    Returns:
+        Dictionary with latency percentiles (ms), queries per call and peak RSS
+    """
+    durations, queries = [], []
+    for i, args in enumerate(args_list):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            func(*args)
+            elapsed = time.perf_counter() - start
+        if i >= warmup:
+            durations.append(elapsed)
+            queries.append(len(captured.captured_queries))
+
+    stats = latency_percentiles(durations)
+    stats.update({
+        'calls': len(durations),
+        'mean_ms': round(float(np.mean(durations)) * 1000, 2) if durations else None,
+        'queries_mean': round(float(np.mean(queries)), 1) if queries else None,
+        'queries_max': max(queries) if queries else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    })
+    return stats
@@ -0,0 +1,81 @@
+from django.db.models import Count
+from .models import Student, Club
+
+# Upper bounds (inclusive) of the per-student count histogram buckets
+HISTOGRAM_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+
+
+def count_histogram(counts, total_students, buckets=HISTOGRAM_BUCKETS):
+    """
+    Bucket per-student counts into a histogram.
+
+    Args:
+        counts: Iterable of counts, one per student that has at least one row
+        total_students: Total number of students, used to fill the zero bucket
+
+    Returns:
+        List of {'bucket': label, 'students': n} in bucket order
+    """
+    labels = []
+    lower = 0
+    for upper in buckets:
+        labels.append(str(upper) if upper == lower else f'{lower}-{upper}')
+        lower = upper + 1
+    labels.append(f'{lower}+')
+
+    histogram = [0] * len(labels)
+    seen = 0
+    for count in counts:
+        seen += 1
+        for i, upper in enumerate(buckets):
+            if count <= upper:
+                histogram[i] += 1
+                break
+        else:
+            histogram[-1] += 1
+
+    # Students without any row never appear in a grouped aggregate
+    if buckets and buckets[0] == 0:
+        histogram[0] += max(total_students - seen, 0)
+
+    return [{'bucket': label, 'students': n} for label, n in zip(labels, histogram)]
+
+
+def per_student_counts(queryset, chunk_size=2000):
+    """Stream (student_id, count) pairs from a grouped aggregate over the queryset"""
+    rows = queryset.values('student_id').annotate(n=Count('id')).order_by().values_list('student_id', 'n')
+    return rows.iterator(chunk_size=chunk_size)
+
+
+def top_students(queryset, limit):
+    """Top students by number of rows in the queryset, resolved with one extra query"""
+    rows = list(
+        queryset.values('student_id').annotate(n=Count('id')).order_by('-n', 'student_id')[:limit]
+    )
+    students = Student.objects.select_related('user').in_bulk([row['student_id'] for row in rows])
+    result = []
+    for row in rows:
+        student = students.get(row['student_id'])
+        result.append({
+            'pk': row['student_id'],
+            'student_id': student.student_id if student else None,
+            'username': student.user.username if student else None,
+            'count': row['n'],
+        })
+    return result
+
+
+def top_clubs(queryset, limit):
+    """Top clubs by number of rows in the queryset, resolved with one extra query"""
+    rows = list(
+        queryset.values('club_id').annotate(n=Count('id')).order_by('-n', 'club_id')[:limit]
+    )
+    clubs = Club.objects.only('id', 'name').in_bulk([row['club_id'] for row in rows])
+    return [
+        {
+            'pk': row['club_id'],
+            'name': clubs[row['club_id']].name if row['club_id'] in clubs else None,
+            'count': row['n'],
+        }
+        for row in rows
+    ]
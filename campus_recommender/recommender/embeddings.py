@@ -0,0 +1,301 @@
+import os
+import threading
+import logging
+import numpy as np
+from scipy.sparse import csr_matrix, save_npz
+from django.db import IntegrityError, transaction, close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+from .models import Student
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+# Pending students are vectorized together once this many are queued
+BATCH_SIZE = 64
+# Seconds between background flushes of the pending queue
+FLUSH_INTERVAL = 5.0
+# Write the vector store to disk after this many new/updated rows, or after PERSIST_INTERVAL seconds
+PERSIST_EVERY = 100
+PERSIST_INTERVAL = 300.0
+# Suffix of the overlay file holding the artifact rows plus vectors added online
+ONLINE_SUFFIX = '.online.npz'
+
+# Student PKs saved since the last flush. Filled by the post_save signal, drained by the service.
+_pending_students = set()
+_pending_lock = threading.Lock()
+# Set once a full batch is queued so the flusher does not wait for the next interval
+_batch_ready = threading.Event()
+# Embedding services running in this process. Without one (web workers whose vectors live in the
+# inference server) nothing would drain the queue; the server picks up edited rows itself.
+_running_services = 0
+
+
+def mark_pending(student_pk):
+    """Queue a student for (re-)vectorization by the embedding service of this process"""
+    with _pending_lock:
+        if not _running_services:
+            return
+        _pending_students.add(student_pk)
+        if len(_pending_students) >= BATCH_SIZE:
+            _batch_ready.set()
+
+
+def _take_pending():
+    with _pending_lock:
+        pending = set(_pending_students)
+        _pending_students.clear()
+    return pending
+
+
+def student_document(student):
+    """
+    Text vectorized for a student: hobbies, interests and skills joined by spaces.
+
+    Artifacts built by build_artifacts use this text. The shipped artifact does not: its rows
+    also include the "Preferred Content Types" column of the registration CSV, which the
+    Student model does not store. Rows the model was trained with are therefore never
+    re-vectorized from this text (see StudentEmbeddingService.flush).
+    """
+    terms = list(student.hobbies or []) + list(student.interests or []) + list(student.skills or [])
+    return ' '.join(str(term) for term in terms)
+
+
+def club_document(club):
+    """Text the vectorizer was fitted on for a club"""
+    return f"{club.category} {club.description}"
+
+
+def online_path(artifact_path):
+    """Path of the overlay file persisted next to a vector artifact"""
+    root, _ = os.path.splitext(artifact_path)
+    return root + ONLINE_SUFFIX
+
+
+def resolve_vectors_path(artifact_path):
+    """Prefer the online overlay when it is newer than the artifact it extends"""
+    overlay = online_path(artifact_path)
+    if os.path.exists(overlay) and os.path.getmtime(overlay) >= os.path.getmtime(artifact_path):
+        return overlay
+    return artifact_path
+
+
+class VectorStore:
+    """
+    Dense vector matrix that can grow without reloading or copying on every append.
+
+    Capacity doubles when full; `vectors` is a view of the used rows, so arrays handed
+    out earlier stay valid after the store grows.
+    """
+
+    def __init__(self, vectors):
+        self._data = np.asarray(vectors, dtype=np.float64)
+        self._size = len(self._data)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self):
+        return self._data[:self._size]
+
+    def _reserve(self, size):
+        if size <= len(self._data):
+            return
+        capacity = max(size, 2 * len(self._data), 16)
+        data = np.zeros((capacity, self._data.shape[1]), dtype=self._data.dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def set_rows(self, indexes, rows):
+        """Write rows at the given indexes, growing the store if needed (gaps stay zero)"""
+        indexes = np.asarray(indexes, dtype=np.int64)
+        if len(indexes) == 0:
+            return
+        self._reserve(int(indexes.max()) + 1)
+        self._data[indexes] = rows
+        self._size = max(self._size, int(indexes.max()) + 1)
+
+    def save(self, path):
+        """Atomically write the store as a sparse .npz file"""
+        tmp_path = path + '.tmp.npz'
+        save_npz(tmp_path, csr_matrix(self.vectors))
+        os.replace(tmp_path, path)
+
+
+class StudentEmbeddingService:
+    """
+    Vectorizes new and edited students with the loaded vectorizer.
+
+    Rows the model was trained with keep the artifact's vectors; only students without a row,
+    or whose row was added online, are (re-)vectorized. Pending students are vectorized in batches and written into the handler's vector store,
+    their vector_index is saved to the database, and the store is persisted periodically to
+    an overlay file next to the artifact.
+    """
+
+    def __init__(self, handler, vectorizer, store, artifact_path, num_trained_rows):
+        self.handler = handler
+        self.vectorizer = vectorizer
+        self.store = store
+        self.persist_path = online_path(artifact_path) if artifact_path else None
+
+        # Rows the model was trained with; newer rows borrow the embedding of their nearest training row
+        self.num_trained_rows = min(num_trained_rows, len(store))
+        self.embedding_proxy = {}
+
+        self._lock = threading.RLock()
+        self._last_sync = timezone.now()
+        self._dirty_rows = 0
+        self._last_persist = timezone.now()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background flusher thread"""
+        global _running_services
+        if self._thread is None:
+            with _pending_lock:
+                _running_services += 1
+            self._thread = threading.Thread(target=self._run, name='student-embedding-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        global _running_services
+        with _pending_lock:
+            if self._thread is not None and not self._stop.is_set():
+                _running_services -= 1
+            self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            _batch_ready.wait(FLUSH_INTERVAL)
+            _batch_ready.clear()
+            if self._stop.is_set():
+                break
+            close_old_connections()
+            try:
+                self.flush()
+                if self._persist_due():
+                    self.persist()
+            except Exception as e:
+                logger.error(f"Error flushing student embeddings: {str(e)}", exc_info=True)
+
+    def _persist_due(self):
+        if self._dirty_rows >= PERSIST_EVERY:
+            return True
+        return bool(self._dirty_rows) and (timezone.now() - self._last_persist).total_seconds() >= PERSIST_INTERVAL
+
+    def vectorize(self, student):
+        """
+        Vectorize a single student right away and return its vector row.
+
+        Called from request threads, so only this student is vectorized; the rest of the pending
+        queue and writing the overlay file are left to the background flusher.
+        """
+        # Dropped before reading the student, so an edit saved meanwhile is queued again
+        with _pending_lock:
+            _pending_students.discard(student.pk)
+        with self._lock:
+            student = Student.objects.get(pk=student.pk)
+            if student.vector_index is None or student.vector_index >= self.num_trained_rows:
+                self._vectorize([student])
+        return self.handler.get_student_vector_index(student)
+
+    def flush(self):
+        """
+        Vectorize every pending student, plus rows written by other processes since the last sync.
+
+        Students whose row came with the artifact (below num_trained_rows) are skipped: the text
+        available here would not reproduce their vectors.
+        """
+        with self._lock:
+            pending = _take_pending()
+            sync_started = timezone.now()
+
+            # Rows appended or edited by other workers, so this store stays aligned with vector_index
+            external = Student.objects.filter(vector_index__gte=len(self.store)) | Student.objects.filter(
+                vector_index__gte=self.num_trained_rows, updated_at__gt=self._last_sync
+            )
+            students = {s.pk: s for s in external.exclude(pk__in=pending)}
+            if pending:
+                students.update({
+                    s.pk: s for s in Student.objects.filter(pk__in=pending)
+                    if s.vector_index is None or s.vector_index >= self.num_trained_rows
+                })
+            self._last_sync = sync_started
+            if not students:
+                return 0
+            return self._vectorize(list(students.values()))
+
+    def _vectorize(self, students):
+        """Vectorize students into the store, allocating rows for new ones; returns how many"""
+        with self._lock:
+            rows = self.vectorizer.transform([student_document(s) for s in students]).toarray()
+
+            known = [(s, row) for s, row in zip(students, rows) if s.vector_index is not None]
+            new = [(s, row) for s, row in zip(students, rows) if s.vector_index is None]
+
+            if known:
+                self.store.set_rows([s.vector_index for s, _ in known], np.array([row for _, row in known]))
+            if new:
+                self._append(new)
+
+            self._dirty_rows += len(students)
+            self.handler.on_student_vectors_updated(self.store.vectors, [(s.pk, s.vector_index) for s in students])
+            # Recommendations computed since the profile change used the previous vectors
+            versions.bump_recommendations(s.user_id for s in students)
+            logger.info(f"Vectorized {len(students)} students ({len(new)} new)")
+            return len(students)
+
+    def _append(self, new, attempts=3):
+        """Allocate vector rows for students without one and save them to the database"""
+        for attempt in range(attempts):
+            max_index = Student.objects.aggregate(max_index=Max('vector_index'))['max_index']
+            next_index = max(len(self.store), (max_index if max_index is not None else -1) + 1)
+            # updated_at too (bulk_update skips auto_now), so other workers sync the new rows
+            now = timezone.now()
+            for offset, (student, _) in enumerate(new):
+                student.vector_index = next_index + offset
+                student.updated_at = now
+            try:
+                with transaction.atomic():
+                    Student.objects.bulk_update([s for s, _ in new], ['vector_index', 'updated_at'])
+                break
+            except IntegrityError:
+                # Another worker claimed the same rows; retry from the new maximum
+                logger.info("Vector index allocation collided with another worker, retrying")
+                for student, _ in new:
+                    student.vector_index = None
+        else:
+            raise RuntimeError("Could not allocate vector indexes for new students")
+
+        rows = np.array([row for _, row in new])
+        self.store.set_rows([s.vector_index for s, _ in new], rows)
+
+        # Nearest trained student by cosine similarity, used for the model's ID embedding
+        trained = self.store.vectors[:self.num_trained_rows]
+        if len(trained):
+            nearest = np.argmax(rows @ trained.T, axis=1)
+            for (student, _), proxy in zip(new, nearest):
+                self.embedding_proxy[student.vector_index] = int(proxy)
+
+    def embedding_index(self, vector_index):
+        """Row of the model's student embedding table to use for a vector row"""
+        if vector_index < self.num_trained_rows:
+            return vector_index
+        proxy = self.embedding_proxy.get(vector_index)
+        if proxy is None:
+            trained = self.store.vectors[:self.num_trained_rows]
+            proxy = int(np.argmax(trained @ self.store.vectors[vector_index])) if len(trained) else 0
+            self.embedding_proxy[vector_index] = proxy
+        return proxy
+
+    def persist(self):
+        """Write the vector store to the overlay file"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            self.store.save(self.persist_path)
+            self._dirty_rows = 0
+            self._last_persist = timezone.now()
+        logger.info(f"Persisted {len(self.store)} student vectors to {self.persist_path}")
@@ -0,0 +1,178 @@
+import time
+import math
+import sqlite3
+import logging
+import numpy as np
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Recommender modes, named after the RecommenderViewSet actions that serve them
+MODES = ('hybrid', 'content_based', 'collaborative')
+
+# Per-process ModelHandler, created by init_worker
+_handler = None
+
+
+def precision_at_k(recommended, relevant, k):
+    """Fraction of the top-k recommendations that are relevant"""
+    if k <= 0:
+        return 0.0
+    return len(set(recommended[:k]) & relevant) / k
+
+
+def recall_at_k(recommended, relevant, k):
+    """Fraction of the relevant clubs found in the top-k recommendations"""
+    if not relevant:
+        return 0.0
+    return len(set(recommended[:k]) & relevant) / len(relevant)
+
+
+def ndcg_at_k(recommended, relevant, k):
+    """Normalized discounted cumulative gain with binary relevance"""
+    dcg = sum(1.0 / math.log2(rank + 2) for rank, club_id in enumerate(recommended[:k]) if club_id in relevant)
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def latency_percentiles(samples, percentiles=(50, 95, 99)):
+    """Latency percentiles in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {f'p{p}': None for p in percentiles}
+    values = np.percentile(np.asarray(samples) * 1000, percentiles)
+    return {f'p{p}': round(float(v), 2) for p, v in zip(percentiles, values)}
+
+
+def holdout_split(interactions, fraction, min_interactions=2, seed=None):
+    """
+    Hold out each student's most recent clubs.
+
+    Args:
+        interactions: Iterable of (student_id, club_id, timestamp) rows
+        fraction: Share of each student's distinct clubs to hold out (at least one)
+        min_interactions: Students with fewer distinct clubs are not evaluated
+
+    Returns:
+        Dictionary mapping student_id to the set of held-out club IDs
+    """
+    latest = defaultdict(dict)
+    for student_id, club_id, timestamp in interactions:
+        clubs = latest[student_id]
+        if club_id not in clubs or timestamp > clubs[club_id]:
+            clubs[club_id] = timestamp
+
+    rng = np.random.default_rng(seed)
+    held_out = {}
+    for student_id, clubs in latest.items():
+        if len(clubs) < min_interactions:
+            continue
+        # Ties on timestamp (e.g. bulk-generated data) are broken randomly
+        ranked = sorted(clubs, key=lambda club_id: (clubs[club_id], rng.random()), reverse=True)
+        size = max(1, int(len(ranked) * fraction))
+        held_out[student_id] = set(ranked[:size])
+    return held_out
+
+
+def snapshot_sqlite(source_path, target_path):
+    """Copy a SQLite database with the online backup API, so a live database is copied consistently"""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def init_worker(database_name=None):
+    """
+    Process pool initializer: set up Django and load one ModelHandler per worker.
+
+    Args:
+        database_name: Optional database file to read instead of the configured one
+    """
+    global _handler
+    import django
+    django.setup()
+    from django.db import connections
+    if database_name:
+        connections['default'].settings_dict['NAME'] = database_name
+        connections['default'].close()
+
+    from .model_handler import ModelHandler
+    _handler = ModelHandler()
+    _handler.verbose = False
+    if _handler.embedding_service:
+        # Students vectorized during evaluation must not leak into the serving overlay file
+        _handler.embedding_service.persist_path = None
+    # Recommendation methods log every step at INFO level; keep worker output readable
+    logging.getLogger('recommender.model_handler').setLevel(logging.WARNING)
+
+
+def evaluate_students(tasks, modes, top_n, options):
+    """
+    Run every mode for a chunk of students.
+
+    Args:
+        tasks: List of (student_pk, relevant club ID set)
+        modes: Recommender modes to evaluate
+        top_n: Number of recommendations requested per call
+        options: Dictionary with cbf_weight and top_k_users
+
+    Returns:
+        List of (student_pk, mode, recommended club IDs, seconds) rows
+    """
+    from .models import Student
+    students = Student.objects.in_bulk([student_pk for student_pk, _ in tasks])
+
+    results = []
+    for student_pk, _ in tasks:
+        student = students.get(student_pk)
+        if student is None:
+            continue
+        for mode in modes:
+            start = time.perf_counter()
+            if mode == 'hybrid':
+                recommendations = _handler.get_hybrid_recommendations(student, top_n=top_n, cbf_weight=options['cbf_weight'])
+            elif mode == 'content_based':
+                recommendations = _handler.get_content_based_recommendations(student, top_n=top_n)
+            else:
+                recommendations = _handler.get_collaborative_recommendations(student, top_n=top_n, top_k_users=options['top_k_users'])
+            elapsed = time.perf_counter() - start
+            results.append((student_pk, mode, [rec['club_id'] for rec in recommendations], elapsed))
+    return results
+
+
+def summarize(results, relevant, ks, num_clubs):
+    """
+    Aggregate per-call results into per-mode accuracy and latency figures.
+
+    Args:
+        results: Rows returned by evaluate_students
+        relevant: Dictionary mapping student_pk to its relevant club IDs
+        ks: Cut-offs to report
+        num_clubs: Catalogue size, for coverage
+
+    Returns:
+        Dictionary keyed by mode
+    """
+    by_mode = defaultdict(list)
+    for student_pk, mode, recommended, elapsed in results:
+        by_mode[mode].append((student_pk, recommended, elapsed))
+
+    summary = {}
+    for mode, rows in by_mode.items():
+        metrics = {}
+        for k in ks:
+            metrics[f'precision@{k}'] = float(np.mean([precision_at_k(rec, relevant[pk], k) for pk, rec, _ in rows]))
+            metrics[f'recall@{k}'] = float(np.mean([recall_at_k(rec, relevant[pk], k) for pk, rec, _ in rows]))
+            metrics[f'ndcg@{k}'] = float(np.mean([ndcg_at_k(rec, relevant[pk], k) for pk, rec, _ in rows]))
+        recommended_clubs = {club_id for _, rec, _ in rows for club_id in rec}
+        metrics['coverage'] = len(recommended_clubs) / num_clubs if num_clubs else 0.0
+        metrics['empty'] = sum(1 for _, rec, _ in rows if not rec)
+        summary[mode] = {
+            'students': len(rows),
+            'metrics': {key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()},
+            'latency_ms': latency_percentiles([elapsed for _, _, elapsed in rows]),
+        }
+    return summary
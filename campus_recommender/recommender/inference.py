@@ -0,0 +1,311 @@
+import os
+import time
+import queue
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from .models import Student
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the rows scored in one model call, and how long the first request of a batch
+# waits for others to join it
+MAX_BATCH_ROWS = 512
+MAX_WAIT_MS = 2.0
+
+
+class InferenceUnavailable(Exception):
+    """The inference server could not be reached or did not answer in time"""
+    pass
+
+
+class InferenceVersionMismatch(InferenceUnavailable):
+    """The inference server holds other artifacts than the client expects"""
+    pass
+
+
+def artifact_version(path):
+    """
+    Identity of an artifact file, compared between web workers and the inference server.
+
+    Returns:
+        The resolved path and modification time, or None when the file does not exist
+    """
+    if not path or not os.path.exists(path):
+        return None
+    return f'{os.path.realpath(path)}@{os.stat(path).st_mtime_ns}'
+
+
+def default_authkey():
+    """Shared secret for the socket handshake, derived from SECRET_KEY"""
+    return hashlib.sha256(f'inference:{settings.SECRET_KEY}'.encode()).digest()
+
+
+def handler_versions(handler):
+    """Artifact versions of a ModelHandler, as pinned by its requests to the inference server"""
+    return {
+        'model': artifact_version(handler.model_path),
+        'student_vectors': artifact_version(handler.student_vectors_path),
+        'club_vectors': artifact_version(handler.club_vectors_path),
+    }
+
+
+class _ScoreRequest:
+    __slots__ = ('student_vector', 'student_idx', 'club_rows', 'future')
+
+    def __init__(self, student_vector, student_idx, club_rows):
+        self.student_vector = student_vector
+        self.student_idx = student_idx
+        self.club_rows = club_rows
+        self.future = Future()
+
+
+class InferenceServer:
+    """
+    Holds one copy of the model, the student and club vectors and the vectorizer for web workers.
+
+    The artifacts are those of a ModelHandler loaded in this process, whose embedding service is
+    the one vectorizing new students while web workers use the server. Requests arrive over a
+    Unix socket, one thread per connection. A batcher thread coalesces concurrent score requests
+    into a single model call: the first request waits at most max_wait_ms for others, up to
+    max_batch_rows rows in total. Every request carries the artifact versions the client
+    expects; requests for other versions are refused instead of answered.
+    """
+
+    def __init__(self, handler, socket_path, authkey=None, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+        self.handler = handler
+        self.model = handler.model
+        self.club_vectors = handler.club_vectors
+        self.socket_path = socket_path
+        self.authkey = authkey or default_authkey()
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.model_path = handler.model_path
+        self.versions = handler_versions(handler)
+        self.embedding_rows = handler.embedding_rows
+        self._queue = queue.Queue()
+        self._listener = None
+        self._stopped = threading.Event()
+        self._started_at = time.time()
+        self.stats = {'requests': 0, 'batches': 0, 'rows': 0, 'errors': 0}
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            # Left over from a previous run; a live server would still be bound to it
+            os.unlink(self.socket_path)
+        self._listener = Listener(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+        threading.Thread(target=self._batch_loop, name='inference-batcher', daemon=True).start()
+        logger.info(f"Inference server listening on {self.socket_path}")
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    # Closed by stop(), or a client failed the handshake
+                    if self._stopped.is_set():
+                        break
+                    logger.warning('Rejected an inference client connection')
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), name='inference-conn', daemon=True).start()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self._started_at, 1),
+            'model_path': self.model_path,
+            'model_version': (
+                time.strftime('%Y%m%d-%H%M%S', time.gmtime(os.path.getmtime(self.model_path)))
+                if self.model_path and os.path.exists(self.model_path) else None
+            ),
+            'versions': self.versions,
+            'embedding_rows': self.embedding_rows,
+            'student_vectors': len(self.handler.student_vectors),
+            'club_vectors': len(self.club_vectors),
+            'max_batch_rows': self.max_batch_rows,
+            'max_wait_ms': self.max_wait * 1000,
+            'queued': self._queue.qsize(),
+            **self.stats,
+        }
+
+    def _serve_connection(self, conn):
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                kind = message[0]
+                if kind == 'health':
+                    conn.send(('ok', self.health()))
+                    continue
+                if kind not in ('score', 'similar', 'vectorize'):
+                    conn.send(('error', f'Unknown request {kind!r}'))
+                    continue
+                if message[1] != self.versions:
+                    conn.send(('version_mismatch', self.versions))
+                    continue
+                try:
+                    conn.send(('ok', getattr(self, f'_{kind}')(*message[2:])))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+        finally:
+            conn.close()
+            close_old_connections()
+
+    def _student_vector(self, vector_index):
+        vectors = self.handler.student_vectors
+        if not 0 <= vector_index < len(vectors):
+            raise IndexError(f'No student vector row {vector_index}')
+        return vectors[vector_index]
+
+    def _score(self, vector_index, club_rows):
+        request = _ScoreRequest(
+            self._student_vector(vector_index), self.handler.get_student_embedding_index(vector_index), club_rows
+        )
+        self._queue.put(request)
+        return request.future.result()
+
+    def _similar(self, vector_index):
+        return self.club_vectors @ self._student_vector(vector_index)
+
+    def _vectorize(self, student_pk):
+        close_old_connections()
+        student = Student.objects.only('id', 'vector_index').get(pk=student_pk)
+        return self.handler.ensure_student_vector_index(student)
+
+    def _next_batch(self):
+        first = self._queue.get()
+        batch, rows = [first], len(first.club_rows)
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += len(request.club_rows)
+        return batch
+
+    def _batch_loop(self):
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            try:
+                scores = self.score_batch(batch)
+            except Exception as e:
+                logger.error(f"Error scoring inference batch: {str(e)}", exc_info=True)
+                self.stats['errors'] += len(batch)
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            offset = 0
+            for request in batch:
+                request.future.set_result(scores[offset:offset + len(request.club_rows)])
+                offset += len(request.club_rows)
+
+    def score_batch(self, batch):
+        """Score the rows of several requests with one model call"""
+        sizes = [len(request.club_rows) for request in batch]
+        club_rows = np.concatenate([request.club_rows for request in batch])
+        inputs = {
+            'student_vector': np.repeat(np.stack([request.student_vector for request in batch]), sizes, axis=0),
+            'club_vector': self.club_vectors[club_rows],
+            'student_idx': np.repeat([request.student_idx for request in batch], sizes).reshape(-1, 1),
+            'club_idx': club_rows.reshape(-1, 1),
+        }
+        scores = np.asarray(self.model(inputs, training=False)).reshape(-1)
+        self.stats['requests'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['rows'] += len(club_rows)
+        return scores
+
+
+class InferenceClient:
+    """
+    Client of an InferenceServer, safe to share between threads (one connection per thread).
+
+    After a failure the server is not tried again for retry_interval seconds, so callers fall
+    back to in-process work without paying a timeout on every request. Requests other than
+    health are pinned to versions (handler_versions of the client's handler).
+    """
+
+    def __init__(self, socket_path, authkey=None, timeout=1.0, retry_interval=5.0, versions=None):
+        self.socket_path = socket_path
+        self.authkey = authkey or default_authkey()
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.versions = versions
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if time.monotonic() < self._down_until:
+                raise InferenceUnavailable(f'Inference server at {self.socket_path} is marked down')
+            conn = self._local.conn = Client(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+        return conn
+
+    def _call(self, *message):
+        try:
+            conn = self._connection()
+            conn.send(message)
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f'No answer within {self.timeout}s')
+            status, result = conn.recv()
+        except InferenceUnavailable:
+            raise
+        except Exception as e:
+            self._reset()
+            self._down_until = time.monotonic() + self.retry_interval
+            logger.warning(f"Inference server at {self.socket_path} failed ({str(e)}); not retrying for {self.retry_interval}s")
+            raise InferenceUnavailable(f'Inference server at {self.socket_path}: {str(e)}') from e
+        if status == 'version_mismatch':
+            raise InferenceVersionMismatch(f'Inference server serves {result}, not {self.versions}')
+        if status != 'ok':
+            raise InferenceUnavailable(f'Inference server error: {result}')
+        return result
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def score(self, vector_index, club_rows):
+        """Model scores of a student vector row for the given club vector rows, from the pinned versions only"""
+        return self._call('score', self.versions, int(vector_index), np.asarray(club_rows, dtype=np.int64))
+
+    def similar(self, vector_index):
+        """Similarity of a student vector row to every club vector row"""
+        return self._call('similar', self.versions, int(vector_index))
+
+    def vectorize(self, student_pk):
+        """Vector row of a student, vectorized by the server if it has none yet (None if it cannot be)"""
+        return self._call('vectorize', self.versions, int(student_pk))
+
+    def health(self):
+        """Server status, or None when it is unreachable"""
+        try:
+            return self._call('health')
+        except InferenceUnavailable:
+            return None
@@ -0,0 +1,167 @@
+import time
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+from .models import Student, Club, Interaction
+from . import metrics, versions
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached club ID list is trusted before it is reloaded
+CLUB_IDS_TTL = 60.0
+
+
+class ViewBuffer:
+    """
+    Write-behind buffer for club view events.
+
+    Views are validated against in-memory caches (club IDs, user to student), coalesced per
+    (student, club) and written by a background thread every flush_interval seconds, or as soon
+    as max_events distinct views are pending, with one bulk upsert in a single transaction.
+    Pending views are drained on interpreter exit.
+    """
+
+    def __init__(self, flush_interval=0.5, max_events=500, max_pending=100000):
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._club_ids = frozenset()
+        self._club_ids_loaded = 0.0
+        self._students_by_user = {}
+
+    def start(self):
+        """Start the background flusher thread and register the exit drain"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-buffer-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the flusher and write everything still pending"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def student_pk(self, user):
+        """Student PK of a user (cached), or None if the user is not a student"""
+        pk = self._students_by_user.get(user.pk)
+        if pk is None:
+            pk = Student.objects.filter(user=user).values_list('pk', flat=True).first()
+            if pk is not None:
+                self._students_by_user[user.pk] = pk
+        return pk
+
+    def club_exists(self, club_id):
+        """Check a club ID against the cached ID set, reloading it when stale"""
+        if time.monotonic() - self._club_ids_loaded >= CLUB_IDS_TTL:
+            self._club_ids = frozenset(Club.objects.values_list('id', flat=True))
+            self._club_ids_loaded = time.monotonic()
+        if club_id in self._club_ids:
+            return True
+        # Created since the last load, or unknown: one primary key lookup, so requests for unknown
+        # IDs cannot make every call reload the whole set
+        try:
+            return Club.objects.filter(pk=club_id).exists()
+        except OverflowError:
+            # Beyond the database's integer range, so no club has it
+            return False
+
+    def record(self, student_pk, club_id, viewed_at=None):
+        """
+        Queue a view. Returns False when the buffer is full and the caller should write directly.
+        """
+        with self._lock:
+            key = (student_pk, club_id)
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                return False
+            coalesced = key in self._pending
+            self._pending[key] = viewed_at or timezone.now()
+            size = len(self._pending)
+        metrics.VIEW_EVENTS.inc(result='coalesced' if coalesced else 'queued')
+        if size >= self.max_events:
+            self._wakeup.set()
+        return True
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing buffered views: {str(e)}", exc_info=True)
+
+    def flush(self):
+        """Bulk-upsert every pending view; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            # Students or clubs deleted since the view was queued would fail the whole batch
+            user_ids = dict(Student.objects.filter(pk__in={s for s, _ in pending}).values_list('pk', 'user_id'))
+            club_pks = set(Club.objects.filter(pk__in={c for _, c in pending}).values_list('pk', flat=True))
+            rows = [
+                Interaction(student_id=student_pk, club_id=club_id, interaction_type='view', timestamp=viewed_at)
+                for (student_pk, club_id), viewed_at in pending.items()
+                if student_pk in user_ids and club_id in club_pks
+            ]
+            dropped = len(pending) - len(rows)
+            if dropped:
+                logger.warning(f"Dropped {dropped} buffered views of deleted students or clubs")
+            try:
+                with transaction.atomic():
+                    # timestamp is auto_now_add, so upserted rows get the flush time
+                    Interaction.objects.bulk_create(
+                        rows,
+                        update_conflicts=True,
+                        unique_fields=['student', 'club', 'interaction_type'],
+                        update_fields=['timestamp'],
+                    )
+                    versions.bump_recommendations(user_ids[row.student_id] for row in rows)
+            except Exception:
+                # Put the views back (newer views queued meanwhile win) so the next flush retries them
+                with self._lock:
+                    for key, viewed_at in pending.items():
+                        self._pending.setdefault(key, viewed_at)
+                raise
+            metrics.VIEW_FLUSH_ROWS.observe(len(rows))
+            return len(rows)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_view_buffer():
+    """The process-wide view buffer, started on first use"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                buffer = ViewBuffer(
+                    flush_interval=getattr(settings, 'RECOMMENDER_VIEW_FLUSH_MS', 500) / 1000,
+                    max_events=getattr(settings, 'RECOMMENDER_VIEW_FLUSH_EVENTS', 500),
+                    max_pending=getattr(settings, 'RECOMMENDER_VIEW_BUFFER_MAX', 100000),
+                )
+                buffer.start()
+                _buffer = buffer
+    return _buffer
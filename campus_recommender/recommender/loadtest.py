@@ -0,0 +1,127 @@
+import ssl
+import time
+import asyncio
+import resource
+from urllib.parse import urlsplit
+from .evaluation import latency_percentiles
+
+
+class LoadTestError(Exception):
+    pass
+
+
+def raise_open_file_limit(needed):
+    """Raise the soft open-file limit towards the hard limit so many client sockets fit"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        soft = target
+    return soft
+
+
+async def _read_response(reader):
+    """Read one HTTP/1.1 response; returns (status, keep_alive)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by server')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def _client(url, request, deadline, timeout, latencies, statuses, errors):
+    """One keep-alive client sending requests back to back until the deadline"""
+    ssl_context = ssl.create_default_context() if url.scheme == 'https' else None
+    port = url.port or (443 if url.scheme == 'https' else 80)
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(url.hostname, port, ssl=ssl_context), timeout
+                )
+            writer.write(request)
+            status, keep_alive = await asyncio.wait_for(_read_response(reader), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _run(url, path, headers, concurrency, duration, timeout):
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n'
+        + ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        + 'Connection: keep-alive\r\n\r\n'
+    ).encode('latin-1')
+    latencies, statuses, errors = [], {}, {}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _client(url, request, deadline, timeout, latencies, statuses, errors) for _ in range(concurrency)
+    ))
+    return latencies, statuses, errors, time.perf_counter() - started
+
+
+def run_load(base_url, path, concurrency, duration, headers=None, timeout=30.0):
+    """
+    Hit one endpoint with concurrent keep-alive clients for a fixed time.
+
+    Args:
+        base_url: Server URL, e.g. http://127.0.0.1:8000
+        path: Request path, e.g. /api/recommender/recommend/
+        concurrency: Number of concurrent clients
+        duration: Seconds to keep sending requests
+        headers: Extra request headers (e.g. Authorization)
+        timeout: Seconds before a request counts as an error
+
+    Returns:
+        Dictionary with the throughput, latency percentiles and status/error counts
+    """
+    url = urlsplit(base_url)
+    if url.scheme not in ('http', 'https') or not url.hostname:
+        raise LoadTestError(f'Unsupported URL: {base_url}')
+    latencies, statuses, errors, elapsed = asyncio.run(
+        _run(url, path, headers or {}, concurrency, duration, timeout)
+    )
+    ok = sum(count for status, count in statuses.items() if 200 <= status < 300)
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'duration_seconds': round(elapsed, 2),
+        'requests': len(latencies),
+        'ok': ok,
+        'throughput_rps': round(ok / elapsed, 1) if elapsed else 0.0,
+        **latency_percentiles(latencies),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'errors': errors,
+    }
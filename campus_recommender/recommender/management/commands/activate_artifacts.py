@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from recommender import artifacts
+import json
+import os
+
+
+class Command(BaseCommand):
+    help = (
+        'Point CURRENT at an artifact version. Web workers poll the pointer, load the version in the '
+        'background and swap to it without a restart (RECOMMENDER_ARTIFACT_POLL_SECONDS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', nargs='?', default=None, help='Version to serve (default: the newest)')
+        parser.add_argument('--list', action='store_true', help='List the available versions and exit')
+        parser.add_argument('--dir', default=None, help='Artifacts directory (default: RECOMMENDER_ARTIFACTS_DIR)')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or artifacts.artifacts_dir()
+        versions = artifacts.list_versions(directory)
+        current = artifacts.read_current(directory)
+
+        if options['list']:
+            if not versions:
+                self.stdout.write(f'No artifact versions in {directory}')
+            for version in versions:
+                marker = '*' if version == current else ' '
+                self.stdout.write(f'{marker} {version}{self._summary(directory, version)}')
+            return
+
+        if not versions:
+            raise CommandError(f'No complete artifact versions in {directory}; run build_artifacts first')
+        version = options['version'] or versions[-1]
+        if version not in versions:
+            raise CommandError(f"Unknown or incomplete version {version}; available: {', '.join(versions)}")
+        if version == current:
+            self.stdout.write(f'{version} is already current')
+            return
+
+        # Vector rows of the new version; the mapping workers hold in memory keeps the previous
+        # version consistent until they have swapped
+        row_ids = artifacts.load_row_ids(artifacts.version_dir(version, directory))
+        if row_ids is None:
+            self.stderr.write(self.style.WARNING(
+                f'{version} has no {artifacts.ROW_IDS_FILE}; vector_index columns are left unchanged'
+            ))
+        else:
+            artifacts.assign_vector_indexes(*row_ids)
+            self.stdout.write(f'Assigned vector rows to {len(row_ids[0])} students and {len(row_ids[1])} clubs')
+
+        artifacts.write_current(version, directory)
+        self.stdout.write(self.style.SUCCESS(f'CURRENT -> {version} (was {current or "unversioned data/ files"})'))
+
+    def _summary(self, directory, version):
+        try:
+            with open(os.path.join(artifacts.version_dir(version, directory), artifacts.MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return ''
+        return f"  {manifest.get('num_students')} students, {manifest.get('num_clubs')} clubs, built {manifest.get('created_at')}"
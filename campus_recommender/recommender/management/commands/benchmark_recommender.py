@@ -0,0 +1,188 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import setup_test_environment
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from recommender.models import Student
+from recommender import benchmarks
+import numpy as np
+import subprocess
+import tempfile
+import logging
+import json
+import time
+import io
+import os
+
+# Handler methods and RecommenderViewSet endpoints that can be benchmarked
+HANDLER_TARGETS = ('content_based', 'collaborative', 'hybrid', 'vector_based')
+ENDPOINT_TARGETS = ('endpoint_recommend', 'endpoint_content_based', 'endpoint_collaborative')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the ModelHandler hot paths and recommender endpoints on a seeded SQLite database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmarks.SCALES), default='small', help='Named dataset size')
+        parser.add_argument('--students', type=int, default=None, help='Override the number of students of the scale')
+        parser.add_argument('--clubs', type=int, default=None, help='Override the number of clubs of the scale')
+        parser.add_argument('--interactions-per-student', type=int, default=10, help='Average interactions per student')
+        parser.add_argument(
+            '--database',
+            default=None,
+            help='SQLite file for the benchmark dataset (default: one per dataset size in the temp directory). '
+                 'It is reused while the dataset parameters match',
+        )
+        parser.add_argument('--reseed', action='store_true', help='Rebuild the benchmark database even if it matches')
+        parser.add_argument('--targets', nargs='+', choices=HANDLER_TARGETS + ENDPOINT_TARGETS,
+                            default=list(HANDLER_TARGETS + ENDPOINT_TARGETS))
+        parser.add_argument('--requests', type=int, default=50, help='Timed calls per target')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed calls per target before timing')
+        parser.add_argument('--top-n', type=int, default=5, help='Recommendations requested per call')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset and the sampled students')
+        parser.add_argument(
+            '--verbose-handler',
+            action='store_true',
+            help='Keep ModelHandler terminal output on, as when serving (it is included in the timings)',
+        )
+        parser.add_argument('--output', default=None, help='Write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        scale = dict(benchmarks.SCALES[options['scale']])
+        if options['students']:
+            scale['students'] = options['students']
+        if options['clubs']:
+            scale['clubs'] = options['clubs']
+        dataset = {
+            'students': scale['students'],
+            'clubs': scale['clubs'],
+            'interactions_per_student': options['interactions_per_student'],
+            'seed': options['seed'],
+        }
+
+        database = options['database'] or os.path.join(
+            tempfile.gettempdir(),
+            f"campus-benchmark-{dataset['students']}-{dataset['clubs']}-{dataset['interactions_per_student']}.sqlite3"
+        )
+        self._use_database(database)
+        manifest_path = database + '.json'
+        manifest = benchmarks.load_manifest(manifest_path)
+        if options['reseed'] or not manifest or manifest['dataset'] != dataset:
+            manifest = self._seed(database, manifest_path, dataset)
+        else:
+            self.stderr.write(f'Reusing benchmark database {database}')
+            # Datasets seeded before a schema change only need the new migrations
+            call_command('migrate', verbosity=0, stdout=io.StringIO())
+
+        # Requests go through the test client, which needs the test server host to be allowed
+        setup_test_environment()
+        rss_before = benchmarks.peak_rss_mb()
+        load_start = time.perf_counter()
+        from recommender.model_handler import ModelHandler, install_model_handler
+        handler = ModelHandler()
+        handler.verbose = options['verbose_handler']
+        if handler.embedding_service:
+            # Synthetic students vectorized on demand must not leak into the serving overlay file
+            handler.embedding_service.persist_path = None
+        if not options['verbose_handler']:
+            logging.getLogger('recommender.model_handler').setLevel(logging.WARNING)
+        install_model_handler(handler)
+        load_seconds = time.perf_counter() - load_start
+
+        rng = np.random.default_rng(options['seed'])
+        student_pks = list(Student.objects.values_list('id', flat=True))
+        count = options['warmup'] + options['requests']
+        chosen = rng.choice(student_pks, size=count, replace=count > len(student_pks))
+        students = Student.objects.select_related('user').in_bulk([int(pk) for pk in chosen])
+        sample = [students[int(pk)] for pk in chosen]
+
+        results = {}
+        for target in options['targets']:
+            self.stderr.write(f'Benchmarking {target}...')
+            func, args_list = self._target(target, handler, sample, options['top_n'])
+            results[target] = benchmarks.time_calls(func, args_list, warmup=options['warmup'])
+            stats = results[target]
+            self.stderr.write(
+                f"  p50 {stats['p50']}ms, p95 {stats['p95']}ms, p99 {stats['p99']}ms, "
+                f"{stats['queries_mean']} queries/call, peak RSS {stats['peak_rss_mb']}MB"
+            )
+
+        report = {
+            'commit': self._git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'scale': options['scale'],
+            'dataset': manifest,
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'top_n': options['top_n'],
+            'handler_load_seconds': round(load_seconds, 2),
+            'rss_before_handler_mb': round(rss_before, 1),
+            'targets': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def _use_database(self, path):
+        """Point the default connection at the benchmark database"""
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            raise CommandError('The benchmark seeds its own SQLite database and needs the SQLite backend')
+        connection.close()
+        connection.settings_dict['NAME'] = path
+
+    def _seed(self, database, manifest_path, dataset):
+        self.stderr.write(f'Seeding benchmark database {database}...')
+        connections['default'].close()
+        for path in (database, manifest_path):
+            if os.path.exists(path):
+                os.remove(path)
+        start = time.perf_counter()
+        call_command('migrate', verbosity=0, stdout=io.StringIO())
+        counts = benchmarks.seed_database(
+            dataset['students'], dataset['clubs'], dataset['interactions_per_student'],
+            seed=dataset['seed'], stdout=self.stderr
+        )
+        manifest = {'dataset': dataset, 'counts': counts, 'seed_seconds': round(time.perf_counter() - start, 1)}
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        self.stderr.write(f"Seeded {counts} in {manifest['seed_seconds']}s")
+        return manifest
+
+    def _target(self, target, handler, sample, top_n):
+        """Callable and per-call arguments for a benchmark target"""
+        if target == 'content_based':
+            return handler.get_content_based_recommendations, [(s, top_n) for s in sample]
+        if target == 'collaborative':
+            return handler.get_collaborative_recommendations, [(s, top_n) for s in sample]
+        if target == 'hybrid':
+            return handler.get_hybrid_recommendations, [(s, top_n) for s in sample]
+        if target == 'vector_based':
+            return handler._get_vector_based_recommendations, [(s, top_n) for s in sample]
+
+        # Endpoints authenticate with the student's token, like the frontend
+        path = {
+            'endpoint_recommend': '/api/recommender/recommend/',
+            'endpoint_content_based': '/api/recommender/content_based/',
+            'endpoint_collaborative': '/api/recommender/collaborative/',
+        }[target]
+        client = APIClient()
+        tokens = {s.user_id: Token.objects.get_or_create(user=s.user)[0].key for s in sample}
+
+        def request(student):
+            response = client.get(path, {'n': top_n}, HTTP_AUTHORIZATION=f'Token {tokens[student.user_id]}')
+            if response.status_code != 200:
+                raise CommandError(f'{path} returned {response.status_code} for student {student.student_id}')
+
+        return request, [(s,) for s in sample]
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from recommender.models import Club
+from recommender.renderers import FastJSONRenderer, orjson
+from recommender.serializers import ClubSerializer
+from recommender.views import _recommendation_details
+import numpy as np
+import gzip
+import json
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Sparse fieldsets (fields=) compared against the full representation of each payload
+SPARSE_FIELDS = {
+    'clubs': ('id', 'name', 'category'),
+    'recommendations': ('id', 'name', 'score'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare serialization time and response bytes (raw, gzip, brotli) of the stdlib and orjson '
+        'renderers on club list and recommendation payloads, with and without a sparse fieldset'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100, help='Items per payload')
+        parser.add_argument('--repeat', type=int, default=200, help='Timed renders per renderer')
+        parser.add_argument('--output', default=None, help='Write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        clubs = list(Club.objects.order_by('id')[:options['items']])
+        if not clubs:
+            raise CommandError('No clubs in the database; import or seed data first')
+        # Cycle the clubs when the database has fewer than --items
+        clubs = [clubs[i % len(clubs)] for i in range(options['items'])]
+        by_id = {club.id: club for club in clubs}
+        rng = np.random.default_rng(0)
+        recommendations = [
+            {'club_id': club.id, 'score': np.float32(score), 'type': 'hybrid',
+             'sources': {'content': float(score), 'collaborative': float(score) / 2}}
+            for club, score in zip(clubs, rng.random(len(clubs)))
+        ]
+
+        payloads = {
+            'clubs': lambda fields: ClubSerializer(clubs, many=True, fields=fields).data,
+            'recommendations': lambda fields: _recommendation_details(recommendations, by_id, fields),
+        }
+        renderers = {'stdlib': JSONRenderer()}
+        if orjson is not None:
+            renderers['orjson'] = FastJSONRenderer()
+        else:
+            self.stderr.write(self.style.WARNING('orjson is not installed; only the stdlib renderer is measured'))
+
+        results = []
+        for payload_name, build in payloads.items():
+            for fields in (None, SPARSE_FIELDS[payload_name]):
+                data = build(fields)
+                for renderer_name, renderer in renderers.items():
+                    results.append(self._measure(payload_name, fields, renderer_name, renderer, data, options['repeat']))
+
+        self.stdout.write(f"{'payload':<16}{'fields':<20}{'renderer':<10}{'ms':>8}{'raw':>9}{'gzip':>9}{'br':>9}")
+        for result in results:
+            self.stdout.write(
+                f"{result['payload']:<16}{result['fields']:<20}{result['renderer']:<10}"
+                f"{result['median_ms']:>8.3f}{result['raw_bytes']:>9}{result['gzip_bytes']:>9}"
+                f"{result['brotli_bytes'] if result['brotli_bytes'] is not None else '-':>9}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'items': options['items'], 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _measure(self, payload_name, fields, renderer_name, renderer, data, repeat):
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = renderer.render(data)
+            durations.append((time.perf_counter() - start) * 1000)
+        return {
+            'payload': payload_name,
+            'fields': ','.join(fields) if fields else 'all',
+            'renderer': renderer_name,
+            'median_ms': float(np.median(durations)),
+            'raw_bytes': len(body),
+            'gzip_bytes': len(gzip.compress(body, compresslevel=6)),
+            'brotli_bytes': len(brotli.compress(body, quality=5)) if brotli is not None else None,
+        }
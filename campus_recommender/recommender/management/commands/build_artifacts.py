@@ -0,0 +1,167 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.utils import timezone
+from recommender.models import Student, Club, Interaction
+from recommender import training, artifacts
+from recommender.embeddings import online_path
+import tensorflow as tf
+import pickle
+import os
+
+
+class Command(BaseCommand):
+    help = 'Vectorize students and clubs, train the hybrid model on real interactions and write a versioned artifact set'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--epochs', type=int, default=5, help='Training epochs')
+        parser.add_argument('--batch-size', type=int, default=256, help='Training batch size')
+        parser.add_argument('--negatives', type=int, default=1, help='Negative samples per positive interaction')
+        parser.add_argument('--validation-split', type=float, default=0.1, help='Fraction of pairs held out for validation')
+        parser.add_argument('--max-features', type=int, default=1000, help='Vocabulary size of a newly fitted vectorizer')
+        parser.add_argument(
+            '--reuse-vectorizer',
+            action='store_true',
+            help='Transform with the vectorizer in --data-dir instead of fitting a new one',
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=artifacts.artifacts_dir(),
+            help='Directory receiving one sub-directory per artifact version',
+        )
+        parser.add_argument(
+            '--data-dir',
+            default=os.path.join(settings.BASE_DIR, 'data'),
+            help='Directory ModelHandler loads artifacts from',
+        )
+        parser.add_argument(
+            '--install',
+            action='store_true',
+            help='Also copy the new artifacts over --data-dir and update the vector_index columns',
+        )
+        parser.add_argument(
+            '--activate',
+            action='store_true',
+            help='Point CURRENT at the new version (see activate_artifacts); running workers swap to it',
+        )
+        parser.add_argument('--threads', type=int, default=None, help='Limit TensorFlow CPU threads')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for sampling and shuffling')
+
+    def handle(self, *args, **options):
+        if options['threads']:
+            tf.config.threading.set_intra_op_parallelism_threads(options['threads'])
+            tf.config.threading.set_inter_op_parallelism_threads(options['threads'])
+        if options['seed'] is not None:
+            tf.keras.utils.set_random_seed(options['seed'])
+
+        timer = training.StageTimer()
+        version = timezone.now().strftime('%Y%m%d-%H%M%S')
+        data_dir = options['data_dir']
+
+        # 1. Vectorize students and clubs from the database; row order defines the vector indexes
+        with timer.stage('vectorize'):
+            students = list(Student.objects.order_by('id').only('id', 'hobbies', 'interests', 'skills'))
+            clubs = list(Club.objects.order_by('id').only('id', 'category', 'description'))
+            if not students or not clubs:
+                raise CommandError('Need at least one student and one club to build artifacts')
+
+            if options['reuse_vectorizer']:
+                vectorizer_path = os.path.join(data_dir, training.VECTORIZER_FILE)
+                with open(vectorizer_path, 'rb') as f:
+                    vectorizer = pickle.load(f)
+            else:
+                vectorizer = training.fit_vectorizer(
+                    (training.student_document(s) for s in students),
+                    (training.club_document(c) for c in clubs),
+                    max_features=options['max_features']
+                )
+            student_vectors, club_vectors = training.vectorize(vectorizer, students, clubs)
+        self._report('vectorize', timer, f'{student_vectors.shape[0]} students, {club_vectors.shape[0]} clubs, {student_vectors.shape[1]} features')
+
+        # 2. Training pairs from real interactions plus sampled negatives
+        with timer.stage('pairs'):
+            student_row = {s.id: i for i, s in enumerate(students)}
+            club_row = {c.id: i for i, c in enumerate(clubs)}
+            interactions = Interaction.objects.values_list('student_id', 'club_id').distinct().iterator(chunk_size=10000)
+            pos_students, pos_clubs = [], []
+            for student_id, club_id in interactions:
+                if student_id in student_row and club_id in club_row:
+                    pos_students.append(student_row[student_id])
+                    pos_clubs.append(club_row[club_id])
+            if not pos_students:
+                raise CommandError('No interactions to train on')
+
+            pair_students, pair_clubs, labels = training.generate_pairs(
+                pos_students, pos_clubs, len(clubs), options['negatives'], seed=options['seed']
+            )
+            num_validation = int(len(labels) * options['validation_split'])
+            split = len(labels) - num_validation
+        self._report('pairs', timer, f'{len(labels)} pairs ({int(labels.sum())} positive), {num_validation} held out')
+
+        # 3. Train with streaming tf.data batches
+        with timer.stage('train'):
+            model = training.build_hybrid_model(len(students), len(clubs), student_vectors.shape[1])
+            train_ds = training.make_dataset(
+                student_vectors, club_vectors, pair_students[:split], pair_clubs[:split], labels[:split],
+                options['batch_size'], seed=options['seed']
+            )
+            validation_ds = None
+            if num_validation:
+                validation_ds = training.make_dataset(
+                    student_vectors, club_vectors, pair_students[split:], pair_clubs[split:], labels[split:],
+                    options['batch_size'], shuffle=False
+                )
+            throughput = training.ThroughputCallback(split, log=self._log_epoch)
+            history = model.fit(
+                train_ds, validation_data=validation_ds, epochs=options['epochs'],
+                callbacks=[throughput], shuffle=False, verbose=0
+            )
+        self._report('train', timer, f"{options['epochs']} epochs")
+
+        # 4. Write the versioned artifact set atomically
+        with timer.stage('write'):
+            manifest = {
+                'version': version,
+                'created_at': timezone.now(),
+                'num_students': len(students),
+                'num_clubs': len(clubs),
+                'num_features': student_vectors.shape[1],
+                'num_pairs': len(labels),
+                'num_positive': int(labels.sum()),
+                'options': {key: options[key] for key in ('epochs', 'batch_size', 'negatives', 'validation_split', 'reuse_vectorizer', 'seed')},
+                'history': {key: [float(v) for v in values] for key, values in history.history.items()},
+                'throughput': throughput.epochs,
+                'stage_seconds': timer.timings,
+            }
+            version_dir = training.write_artifacts(
+                options['output_dir'], version, model, student_vectors.tocsr(), club_vectors.tocsr(), vectorizer, manifest,
+                row_ids=([s.id for s in students], [c.id for c in clubs])
+            )
+        self._report('write', timer, version_dir)
+
+        if options['install']:
+            with timer.stage('install'):
+                training.install_artifacts(version_dir, data_dir)
+                artifacts.assign_vector_indexes([s.id for s in students], [c.id for c in clubs])
+                # Rows vectorized online refer to the previous artifact
+                overlay = online_path(os.path.join(data_dir, training.STUDENT_VECTORS_FILE))
+                if os.path.exists(overlay):
+                    os.remove(overlay)
+            self._report('install', timer, data_dir)
+
+        if options['activate']:
+            with timer.stage('activate'):
+                if not options['install']:
+                    artifacts.assign_vector_indexes([s.id for s in students], [c.id for c in clubs])
+                artifacts.write_current(version, options['output_dir'])
+            self._report('activate', timer, f'CURRENT -> {version}')
+
+        total = sum(timer.timings.values())
+        self.stdout.write(self.style.SUCCESS(f'Built artifact version {version} in {total:.1f}s'))
+
+    def _log_epoch(self, entry):
+        metrics = ', '.join(f'{key}: {value:.4f}' for key, value in entry.items() if key not in ('epoch', 'seconds', 'examples_per_sec'))
+        self.stdout.write(f"  epoch {entry['epoch']}: {entry['seconds']:.1f}s, {entry['examples_per_sec']:.0f} examples/sec, {metrics}")
+
+    def _report(self, stage, timer, detail):
+        self.stdout.write(f'[{stage}] {timer.timings[stage]:.2f}s - {detail}')
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recommender.popularity import PopularityService
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the club popularity and trending tables from every interaction and write the snapshot '
+        'web workers start from (they then apply newer interactions incrementally)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(settings.RECOMMENDER_POPULARITY_SNAPSHOT),
+                            help='Snapshot file (default: RECOMMENDER_POPULARITY_SNAPSHOT)')
+        parser.add_argument('--top', type=int, default=5, help='Clubs to show per segment')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        service = PopularityService(half_life_days=getattr(settings, 'RECOMMENDER_TRENDING_HALF_LIFE_DAYS', 7.0))
+        table = service.build(use_snapshot=False)
+        table.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Built popularity tables for {len(table.club_names)} clubs and {len(table.courses)} courses "
+            f"in {time.perf_counter() - start:.2f}s -> {options['output']}"
+        ))
+
+        segments = [('overall', {})] + [(f'category {category}', {'category': category}) for category in sorted(table.categories)]
+        for label, segment in segments:
+            clubs = ', '.join(
+                f'{table.club_info(club_id)[0]} ({trending:.1f}/{popularity:.0f})'
+                for club_id, trending, popularity in table.top(options['top'], **segment)
+            )
+            self.stdout.write(f'  {label}: {clubs}')
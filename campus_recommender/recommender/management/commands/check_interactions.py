@@ -1,33 +1,121 @@
 from django.core.management.base import BaseCommand
-from recommender.models import Student, Interaction, Club
+from django.db.models import Count
+from recommender.models import Student, Interaction
+from recommender import diagnostics
+import json
 
 class Command(BaseCommand):
     help = 'Check student interactions with clubs'
+    # Diagnostics only touch the database; skip loading the URL conf (and TensorFlow)
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', help='Show the interactions of a single student (by student_id)')
+        parser.add_argument('--top', type=int, default=10, help='Number of top students and clubs to report')
+        parser.add_argument('--per-student', action='store_true', help='List the interaction count of every student')
+        parser.add_argument('--list', action='store_true', help='List every interaction')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per round trip when streaming')
+        parser.add_argument('--json', action='store_true', help='Write the report as JSON')
 
     def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        interactions = Interaction.objects.all()
+        total_students = Student.objects.count()
+
+        report = {
+            'total_interactions': interactions.count(),
+            'total_students': total_students,
+            'by_type': {
+                row['interaction_type']: row['n']
+                for row in interactions.values('interaction_type').annotate(n=Count('id')).order_by('interaction_type')
+            },
+        }
+        counts = [n for _, n in diagnostics.per_student_counts(interactions, chunk_size)]
+        report['students_with_interactions'] = len(counts)
+        report['histogram'] = diagnostics.count_histogram(counts, total_students)
+        report['top_students'] = diagnostics.top_students(interactions, options['top'])
+        report['top_clubs'] = diagnostics.top_clubs(interactions, options['top'])
+
+        if options['student']:
+            report['student'] = self._student_report(options['student'])
+
+        if options['json']:
+            # Streaming sections are materialized only when explicitly requested
+            if options['per_student']:
+                report['per_student'] = [
+                    {'pk': pk, 'student_id': student_id, 'username': username, 'interactions': n}
+                    for pk, student_id, username, n in self._per_student_rows(chunk_size)
+                ]
+            if options['list']:
+                report['interactions'] = [
+                    {'student_pk': i.student_id, 'student_id': i.student.student_id, 'club_pk': i.club_id,
+                     'club_name': i.club.name, 'type': i.interaction_type, 'timestamp': i.timestamp}
+                    for i in self._interaction_rows(chunk_size)
+                ]
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+            return
+
         self.stdout.write(self.style.SUCCESS('Checking student interactions...'))
-        
-        # 查找ID为test13的学生
-        student_13 = Student.objects.filter(student_id='test13').first()
-        if student_13:
-            self.stdout.write(f"Student test13 found: ID={student_13.id}, Name={student_13.user.username}")
-            interactions = Interaction.objects.filter(student=student_13)
-            if interactions:
-                self.stdout.write(self.style.SUCCESS(f"Student test13 has {interactions.count()} interactions:"))
-                for interaction in interactions:
-                    self.stdout.write(f"- Club: {interaction.club.name} (ID: {interaction.club.id})")
+        self.stdout.write(f"Total interactions: {report['total_interactions']}")
+        for interaction_type, n in report['by_type'].items():
+            self.stdout.write(f"  {interaction_type}: {n}")
+        self.stdout.write(f"Students with interactions: {report['students_with_interactions']} / {total_students}")
+
+        self.stdout.write("\nInteractions per student:")
+        for bucket in report['histogram']:
+            self.stdout.write(f"  {bucket['bucket']:>8}: {bucket['students']}")
+
+        self.stdout.write(f"\nTop {options['top']} students:")
+        for row in report['top_students']:
+            self.stdout.write(f"  Student ID: {row['student_id']} (PK: {row['pk']}), Name: {row['username']}, Interactions: {row['count']}")
+
+        self.stdout.write(f"\nTop {options['top']} clubs:")
+        for row in report['top_clubs']:
+            self.stdout.write(f"  Club: {row['name']} (ID: {row['pk']}), Interactions: {row['count']}")
+
+        if 'student' in report:
+            student_report = report['student']
+            self.stdout.write('')
+            if student_report is None:
+                self.stdout.write(self.style.ERROR(f"Student with ID '{options['student']}' not found"))
+            elif not student_report['interactions']:
+                self.stdout.write(self.style.WARNING(f"Student {options['student']} has no interactions"))
             else:
-                self.stdout.write(self.style.WARNING("Student test13 has no interactions"))
-        else:
-            self.stdout.write(self.style.ERROR("Student with ID 'test13' not found"))
-            
-        # 列出所有学生及其交互数
-        self.stdout.write("\nAll students and their interaction counts:")
-        for student in Student.objects.all():
-            interaction_count = Interaction.objects.filter(student=student).count()
-            self.stdout.write(f"Student ID: {student.student_id} (PK: {student.id}), Name: {student.user.username}, Interactions: {interaction_count}")
-        
-        # 列出所有交互
-        self.stdout.write("\nAll interactions:")
-        for interaction in Interaction.objects.all():
-            self.stdout.write(f"Student: {interaction.student.student_id} (PK: {interaction.student.id}), Club: {interaction.club.name} (ID: {interaction.club.id})") 
\ No newline at end of file
+                self.stdout.write(self.style.SUCCESS(f"Student {options['student']} has {len(student_report['interactions'])} interactions:"))
+                for row in student_report['interactions']:
+                    self.stdout.write(f"- Club: {row['club_name']} (ID: {row['club_pk']}), Type: {row['type']}")
+
+        if options['per_student']:
+            self.stdout.write("\nAll students and their interaction counts:")
+            for pk, student_id, username, n in self._per_student_rows(chunk_size):
+                self.stdout.write(f"Student ID: {student_id} (PK: {pk}), Name: {username}, Interactions: {n}")
+
+        if options['list']:
+            self.stdout.write("\nAll interactions:")
+            for interaction in self._interaction_rows(chunk_size):
+                self.stdout.write(f"Student: {interaction.student.student_id} (PK: {interaction.student_id}), Club: {interaction.club.name} (ID: {interaction.club_id})")
+
+    def _student_report(self, student_id):
+        student = Student.objects.select_related('user').filter(student_id=student_id).first()
+        if student is None:
+            return None
+        interactions = Interaction.objects.filter(student=student).select_related('club').order_by('id')
+        return {
+            'pk': student.id,
+            'username': student.user.username,
+            'interactions': [
+                {'club_pk': i.club_id, 'club_name': i.club.name, 'type': i.interaction_type, 'timestamp': i.timestamp}
+                for i in interactions
+            ],
+        }
+
+    def _per_student_rows(self, chunk_size):
+        # One grouped query (LEFT JOIN) instead of a COUNT per student
+        return Student.objects.annotate(
+            n=Count('interaction')
+        ).order_by('id').values_list('id', 'student_id', 'user__username', 'n').iterator(chunk_size=chunk_size)
+
+    def _interaction_rows(self, chunk_size):
+        return Interaction.objects.select_related('student', 'club').only(
+            'student_id', 'club_id', 'interaction_type', 'timestamp', 'student__student_id', 'club__name'
+        ).order_by('id').iterator(chunk_size=chunk_size)
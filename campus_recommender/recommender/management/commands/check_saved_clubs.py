@@ -1,62 +1,116 @@
 from django.core.management.base import BaseCommand
 from recommender.models import Student, SavedClub, Club
+from recommender import diagnostics
 from django.db import transaction
-from django.contrib.auth.models import User
+import json
 
 class Command(BaseCommand):
     help = 'Check and diagnose saved clubs functionality'
+    # Diagnostics only touch the database; skip loading the URL conf (and TensorFlow)
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Number of top students and clubs to report')
+        parser.add_argument('--list', action='store_true', help='List every saved club, grouped by student')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per round trip when streaming')
+        parser.add_argument('--json', action='store_true', help='Write the report as JSON')
+        parser.add_argument(
+            '--write-test',
+            action='store_true',
+            help='Also create and roll back a saved club to verify writes (do not use on production snapshots)',
+        )
 
     def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        saved_clubs = SavedClub.objects.all()
+        total_students = Student.objects.count()
+
+        counts = [n for _, n in diagnostics.per_student_counts(saved_clubs, chunk_size)]
+        report = {
+            'total_saved_clubs': saved_clubs.count(),
+            'total_students': total_students,
+            'students_with_saved_clubs': len(counts),
+            'histogram': diagnostics.count_histogram(counts, total_students),
+            'top_students': diagnostics.top_students(saved_clubs, options['top']),
+            'top_clubs': diagnostics.top_clubs(saved_clubs, options['top']),
+        }
+        if options['write_test']:
+            report['write_test'] = self._write_test()
+
+        if options['json']:
+            if options['list']:
+                report['saved_clubs'] = [
+                    {'student_pk': saved.student_id, 'student_id': saved.student.student_id,
+                     'club_pk': saved.club_id, 'club_name': saved.club.name, 'saved_at': saved.saved_at}
+                    for saved in self._saved_club_rows(chunk_size)
+                ]
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+            return
+
         self.stdout.write('Checking saved clubs...')
-        
-        # Check if SavedClub model exists and has records
-        saved_clubs_count = SavedClub.objects.count()
-        self.stdout.write(f'Total saved clubs in database: {saved_clubs_count}')
-        
-        # Check all students and their saved clubs
-        students = Student.objects.all()
-        self.stdout.write(f'Total students: {students.count()}')
-        
-        for student in students:
-            saved_clubs = SavedClub.objects.filter(student=student)
-            self.stdout.write(f'Student ID: {student.student_id} (PK: {student.id}) has {saved_clubs.count()} saved clubs')
-            
-            for saved in saved_clubs:
-                self.stdout.write(f'  - {saved.club.name} (ID: {saved.club.id}), Saved at: {saved.saved_at}')
-        
-        # Test creating a saved club
+        self.stdout.write(f"Total saved clubs in database: {report['total_saved_clubs']}")
+        self.stdout.write(f'Total students: {total_students}')
+        self.stdout.write(f"Students with saved clubs: {report['students_with_saved_clubs']}")
+
+        self.stdout.write('\nSaved clubs per student:')
+        for bucket in report['histogram']:
+            self.stdout.write(f"  {bucket['bucket']:>8}: {bucket['students']}")
+
+        self.stdout.write(f"\nTop {options['top']} students:")
+        for row in report['top_students']:
+            self.stdout.write(f"  Student ID: {row['student_id']} (PK: {row['pk']}) has {row['count']} saved clubs")
+
+        self.stdout.write(f"\nTop {options['top']} saved clubs:")
+        for row in report['top_clubs']:
+            self.stdout.write(f"  {row['name']} (ID: {row['pk']}), Saved by: {row['count']}")
+
+        if options['list']:
+            # Rows arrive ordered by student, so print a header whenever the student changes
+            self.stdout.write('\nAll saved clubs:')
+            current_student = None
+            for saved in self._saved_club_rows(chunk_size):
+                if saved.student_id != current_student:
+                    current_student = saved.student_id
+                    self.stdout.write(f'Student ID: {saved.student.student_id} (PK: {saved.student_id})')
+                self.stdout.write(f'  - {saved.club.name} (ID: {saved.club_id}), Saved at: {saved.saved_at}')
+
+        if 'write_test' in report:
+            result = report['write_test']
+            if result.get('error'):
+                self.stdout.write(self.style.ERROR(f"Error testing saved clubs: {result['error']}"))
+            else:
+                self.stdout.write(f"\nWrite test: {result['message']}")
+
+        # Check API endpoints
+        self.stdout.write('\nAPI Endpoints for saved clubs:')
+        self.stdout.write('- GET /api/saved-clubs/ - List saved clubs for current user')
+        self.stdout.write('- POST /api/saved-clubs/ - Save a club (requires club ID)')
+        self.stdout.write('- DELETE /api/saved-clubs/{id}/ - Remove a saved club')
+
+    def _saved_club_rows(self, chunk_size):
+        return SavedClub.objects.select_related('student', 'club').only(
+            'student_id', 'club_id', 'saved_at', 'student__student_id', 'club__name'
+        ).order_by('student_id', 'id').iterator(chunk_size=chunk_size)
+
+    def _write_test(self):
+        """Create a saved club inside a transaction that is always rolled back"""
         try:
             with transaction.atomic():
-                # Get a student and club
                 student = Student.objects.first()
                 club = Club.objects.first()
-                
-                if student and club:
-                    self.stdout.write(f'Testing saving club {club.name} for student {student.student_id}...')
-                    
-                    # Check if it already exists
+
+                if not (student and club):
+                    message = 'No student or club available for testing'
+                else:
                     existing = SavedClub.objects.filter(student=student, club=club).first()
                     if existing:
-                        self.stdout.write(f'Club already saved (ID: {existing.id})')
+                        message = f'Club {club.name} already saved for student {student.student_id} (ID: {existing.id})'
                     else:
-                        # Try to create a new saved club
                         new_saved = SavedClub.objects.create(student=student, club=club)
-                        self.stdout.write(f'Successfully created saved club with ID: {new_saved.id}')
-                        
-                        # Clean up the test data
-                        new_saved.delete()
-                        self.stdout.write('Test saved club deleted')
-                else:
-                    self.stdout.write('No student or club available for testing')
-                    
+                        message = f'Successfully created saved club {club.name} for student {student.student_id} (ID: {new_saved.id})'
+
                 # Always rollback the transaction
-                raise Exception("Rolling back transaction")
+                transaction.set_rollback(True)
+            return {'message': message}
         except Exception as e:
-            if str(e) != "Rolling back transaction":
-                self.stdout.write(self.style.ERROR(f'Error testing saved clubs: {str(e)}'))
-        
-        # Check API endpoints
-        self.stdout.write('\nAPI Endpoints for saved clubs:')
-        self.stdout.write('- GET /api/saved-clubs/ - List saved clubs for current user')
-        self.stdout.write('- POST /api/saved-clubs/ - Save a club (requires club ID)')
-        self.stdout.write('- DELETE /api/saved-clubs/{id}/ - Remove a saved club') 
\ No newline at end of file
+            return {'error': str(e)}
@@ -1,9 +1,23 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
 from recommender.models import Student, Club, Interaction, SavedClub
+from recommender import versions
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.constants import OnConflict
 from django.utils import timezone
+from datetime import timedelta
+import numpy as np
+import csv
+import os
+import time
+
+INTERACTION_TYPES = [choice[0] for choice in Interaction.INTERACTION_TYPES]
+
 
 class Command(BaseCommand):
-    help = '创建测试交互数据，包括浏览、点赞和收藏等'
+    help = '批量创建测试交互数据（浏览、点赞、加入和收藏），可按规模生成用于推荐系统基准测试'
+    # 跳过系统检查，避免加载 URL 配置时导入 TensorFlow
+    requires_system_checks = []
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -11,77 +25,273 @@ class Command(BaseCommand):
             action='store_true',
             help='清除所有现有交互记录后再创建新数据',
         )
+        parser.add_argument(
+            '--density',
+            type=float,
+            default=0.2,
+            help='每个学生交互的 (社团, 交互类型) 组合占全部组合的比例，默认 0.2',
+        )
+        parser.add_argument(
+            '--total',
+            type=int,
+            default=None,
+            help='目标交互总数；设置后覆盖 --density',
+        )
+        parser.add_argument(
+            '--type-mix',
+            default='view=0.6,like=0.3,join=0.1',
+            help='交互类型比例，例如 "view=0.6,like=0.3,join=0.1"',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='交互时间均匀分布在最近多少天内，默认 30',
+        )
+        parser.add_argument(
+            '--popularity-skew',
+            type=float,
+            default=1.0,
+            help='社团热度的 Zipf 指数，0 表示均匀分布，默认 1.0',
+        )
+        parser.add_argument(
+            '--saved-ratio',
+            type=float,
+            default=0.5,
+            help='点赞或加入的社团中同时被收藏的比例，默认 0.5',
+        )
+        parser.add_argument(
+            '--from-pairs',
+            nargs='?',
+            const='',
+            default=None,
+            help='从 synthetic_pairs.csv 中 label=1 的样本生成交互（可指定文件路径）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50000,
+            help='每个事务写入的记录数，默认 50000',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='随机种子，用于生成可复现的数据',
+        )
 
     def handle(self, *args, **options):
         if options['clear']:
             self.stdout.write('正在清除所有现有交互记录...')
             Interaction.objects.all().delete()
             SavedClub.objects.all().delete()
+            versions.bump_recommendations()
             self.stdout.write(self.style.SUCCESS('已清除所有交互记录'))
-        
-        # 获取所有学生和俱乐部
-        students = Student.objects.all()
-        clubs = Club.objects.all()
-        
-        if not students:
+
+        # 只取主键，避免在大规模数据下实例化全部学生和社团
+        student_ids = np.array(Student.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+        club_ids = np.array(Club.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+
+        if len(student_ids) == 0:
             self.stdout.write(self.style.ERROR('没有学生记录，请先创建学生'))
             return
-        
-        if not clubs:
+
+        if len(club_ids) == 0:
             self.stdout.write(self.style.ERROR('没有俱乐部记录，请先创建俱乐部'))
             return
-        
-        self.stdout.write(f'找到 {students.count()} 个学生和 {clubs.count()} 个俱乐部')
-        
-        # 为每个学生创建一些随机交互
+
+        self.stdout.write(f'找到 {len(student_ids)} 个学生和 {len(club_ids)} 个俱乐部')
+
+        self.rng = np.random.default_rng(options['seed'])
+        self.type_names, self.type_probs = self._parse_type_mix(options['type_mix'])
+        self.now = timezone.now()
+        self.spread_seconds = max(options['days'], 0) * 86400
+        self.saved_ratio = min(max(options['saved_ratio'], 0.0), 1.0)
+        batch_size = max(options['batch_size'], 1)
+
+        if options['from_pairs'] is not None:
+            batches = self._pairs_from_csv(options['from_pairs'], batch_size)
+        else:
+            batches = self._sampled_pairs(student_ids, club_ids, options, batch_size)
+
         interaction_count = 0
         saved_club_count = 0
-        
-        for student in students:
-            # 为每个学生生成一些交互记录
-            # 学生浏览前3个社团
-            for club in clubs[:3]:
-                interaction, created = Interaction.objects.get_or_create(
-                    student=student,
-                    club=club,
-                    interaction_type='view'
-                )
-                if created:
-                    interaction_count += 1
-                    self.stdout.write(f'学生 {student.user.username} 浏览了社团 {club.name}')
-            
-            # 学生点赞前2个社团
-            if clubs.count() >= 2:
-                for club in clubs[:2]:
-                    interaction, created = Interaction.objects.get_or_create(
-                        student=student,
-                        club=club,
-                        interaction_type='like'
-                    )
-                    if created:
-                        interaction_count += 1
-                        self.stdout.write(f'学生 {student.user.username} 点赞了社团 {club.name}')
-            
-            # 学生加入第1个社团
-            if clubs.count() >= 1:
-                interaction, created = Interaction.objects.get_or_create(
-                    student=student,
-                    club=clubs[0],
-                    interaction_type='join'
-                )
-                if created:
-                    interaction_count += 1
-                    self.stdout.write(f'学生 {student.user.username} 加入了社团 {clubs[0].name}')
-            
-            # 学生收藏前2个社团
-            if clubs.count() >= 2:
-                for club in clubs[:2]:
-                    saved_club, created = SavedClub.objects.get_or_create(
-                        student=student,
-                        club=club
-                    )
-                    if created:
-                        saved_club_count += 1
-                        self.stdout.write(f'学生 {student.user.username} 收藏了社团 {club.name}')
-        
-        self.stdout.write(self.style.SUCCESS(f'成功创建 {interaction_count} 条交互记录和 {saved_club_count} 条收藏记录')) 
\ No newline at end of file
+        start = time.perf_counter()
+
+        for pair_students, pair_clubs, pair_types in batches:
+            created_interactions, created_saved = self._write_batch(pair_students, pair_clubs, pair_types)
+            interaction_count += created_interactions
+            saved_club_count += created_saved
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'已写入 {interaction_count} 条交互记录，{saved_club_count} 条收藏记录 ({interaction_count / max(elapsed, 1e-9):.0f} 条/秒)')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'成功创建 {interaction_count} 条交互记录和 {saved_club_count} 条收藏记录，用时 {elapsed:.1f} 秒'
+        ))
+
+    def _parse_type_mix(self, type_mix):
+        """解析 "view=0.6,like=0.3,join=0.1" 形式的交互类型比例"""
+        mix = {}
+        for part in type_mix.split(','):
+            if not part.strip():
+                continue
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in INTERACTION_TYPES:
+                raise CommandError(f'未知的交互类型: {name}（可选: {", ".join(INTERACTION_TYPES)}）')
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'无效的交互类型比例: {part}')
+
+        total = sum(mix.values())
+        if total <= 0:
+            raise CommandError('交互类型比例之和必须大于 0')
+        names = list(mix)
+        return names, np.array([mix[name] / total for name in names])
+
+    def _sampled_pairs(self, student_ids, club_ids, options, batch_size):
+        """
+        按学生分批随机生成 (学生, 社团, 类型) 组合。
+
+        每个学生从 社团 × 类型 的组合中无放回抽样，抽样概率为社团热度（Zipf 分布）
+        乘以类型比例，因此同一批内不会违反唯一约束。
+        """
+        num_clubs = len(club_ids)
+        num_types = len(self.type_names)
+        num_slots = num_clubs * num_types
+
+        # 打乱社团热度排名，避免总是 ID 最小的社团最热门
+        ranks = self.rng.permutation(num_clubs) + 1
+        club_probs = 1.0 / np.power(ranks, options['popularity_skew'])
+        club_probs /= club_probs.sum()
+        slot_probs = np.outer(club_probs, self.type_probs).ravel()
+
+        if options['total'] is not None:
+            per_student = options['total'] / len(student_ids)
+        else:
+            per_student = options['density'] * num_slots
+        per_student = min(per_student, num_slots)
+
+        # 每个学生的交互数量服从泊松分布，使活跃度有差异
+        counts = np.minimum(self.rng.poisson(per_student, size=len(student_ids)), num_slots)
+
+        pair_students, pair_slots = [], []
+        pending = 0
+        for student_id, count in zip(student_ids, counts):
+            if count == 0:
+                continue
+            slots = self.rng.choice(num_slots, size=count, replace=False, p=slot_probs)
+            pair_students.append(np.full(count, student_id, dtype=np.int64))
+            pair_slots.append(slots)
+            pending += count
+            if pending >= batch_size:
+                yield self._slots_to_pairs(pair_students, pair_slots, club_ids, num_types)
+                pair_students, pair_slots = [], []
+                pending = 0
+
+        if pending:
+            yield self._slots_to_pairs(pair_students, pair_slots, club_ids, num_types)
+
+    def _slots_to_pairs(self, pair_students, pair_slots, club_ids, num_types):
+        slots = np.concatenate(pair_slots)
+        return np.concatenate(pair_students), club_ids[slots // num_types], slots % num_types
+
+    def _pairs_from_csv(self, path, batch_size):
+        """
+        从 synthetic_pairs.csv 读取正样本。student_idx / club_idx 是向量矩阵的行号，
+        按 vector_index 对应到数据库中的学生和社团，与模型产物的行保持一致。
+        """
+        if not path:
+            path = os.path.join(settings.BASE_DIR, 'data', 'synthetic_pairs.csv')
+        if not os.path.exists(path):
+            raise CommandError(f'找不到样本文件: {path}')
+
+        students_by_row = dict(Student.objects.exclude(vector_index=None).values_list('vector_index', 'id'))
+        clubs_by_row = dict(Club.objects.exclude(vector_index=None).values_list('vector_index', 'id'))
+
+        self.stdout.write(f'正在从 {path} 读取样本...')
+        pair_students, pair_clubs = [], []
+        seen = set()
+        skipped = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if int(row['label']) != 1:
+                    continue
+                student_id = students_by_row.get(int(row['student_idx']))
+                club_id = clubs_by_row.get(int(row['club_idx']))
+                if student_id is None or club_id is None:
+                    skipped += 1
+                    continue
+                key = (student_id, club_id)
+                if key in seen:
+                    continue
+                seen.add(key)
+                pair_students.append(student_id)
+                pair_clubs.append(club_id)
+                if len(pair_students) >= batch_size:
+                    yield self._typed_pairs(pair_students, pair_clubs)
+                    pair_students, pair_clubs = [], []
+
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'跳过 {skipped} 条在数据库中找不到对应向量行的样本'))
+        if pair_students:
+            yield self._typed_pairs(pair_students, pair_clubs)
+
+    def _typed_pairs(self, pair_students, pair_clubs):
+        types = self.rng.choice(len(self.type_names), size=len(pair_students), p=self.type_probs)
+        return np.array(pair_students, dtype=np.int64), np.array(pair_clubs, dtype=np.int64), types
+
+    def _write_batch(self, pair_students, pair_clubs, pair_types):
+        """在一个事务内批量写入交互和收藏记录，已存在的记录会被忽略"""
+        offsets = self.rng.integers(0, self.spread_seconds + 1, size=len(pair_students))
+        timestamps = [self.now - timedelta(seconds=int(offset)) for offset in offsets]
+
+        interactions = [
+            (int(student_id), int(club_id), self.type_names[type_idx], timestamp)
+            for student_id, club_id, type_idx, timestamp in zip(pair_students, pair_clubs, pair_types, timestamps)
+        ]
+
+        # 点赞或加入的社团按比例加入收藏
+        engaged_types = [i for i, name in enumerate(self.type_names) if name in ('like', 'join')]
+        engaged = np.isin(pair_types, engaged_types) & (self.rng.random(len(pair_students)) < self.saved_ratio)
+        saved_clubs = [
+            (int(student_id), int(club_id), timestamps[i])
+            for i, (student_id, club_id) in enumerate(zip(pair_students, pair_clubs))
+            if engaged[i]
+        ]
+
+        with transaction.atomic():
+            created_interactions = self._insert(Interaction, ('student', 'club', 'interaction_type', 'timestamp'), interactions)
+            created_saved = self._insert(SavedClub, ('student', 'club', 'saved_at'), saved_clubs)
+            # 直接写入的记录不会发送 post_save 信号
+            versions.bump_recommendations()
+
+        return created_interactions, created_saved
+
+    def _insert(self, model, field_names, rows):
+        """
+        用一条 executemany 插入 rows 并忽略违反唯一约束的记录，返回实际插入的行数。
+
+        bulk_create 会让 auto_now_add 把时间戳改成写入时间，这里直接写入生成的时间戳。
+        """
+        if not rows:
+            return 0
+        connection = connections[DEFAULT_DB_ALIAS]
+        fields = [model._meta.get_field(name) for name in field_names]
+        quote = connection.ops.quote_name
+        sql = (
+            f"{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} {quote(model._meta.db_table)} "
+            f"({', '.join(quote(field.column) for field in fields)}) VALUES ({', '.join(['%s'] * len(fields))})"
+            f"{connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)}"
+        )
+        # 整数和字符串列可直接写入，只需转换时间戳列（时区、数据库格式）
+        columns = [
+            [field.get_db_prep_save(value, connection) for value in column] if isinstance(field, models.DateTimeField) else column
+            for field, column in zip(fields, zip(*rows))
+        ]
+        params = list(zip(*columns))
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+            return cursor.rowcount
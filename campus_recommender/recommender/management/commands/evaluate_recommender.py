@@ -0,0 +1,166 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection
+from recommender.models import Student, Club, Interaction
+from recommender import evaluation
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import numpy as np
+import tempfile
+import sqlite3
+import json
+import csv
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Measure ranking quality and latency of each recommender mode on held-out interactions or labelled pairs'
+    # Workers load their own ModelHandler; skip loading the URL conf in the parent
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=['holdout', 'pairs'],
+            default='holdout',
+            help='holdout: hide each student\'s latest interactions; pairs: use positive labels from a pairs CSV',
+        )
+        parser.add_argument(
+            '--pairs',
+            default=os.path.join(settings.BASE_DIR, 'data', 'synthetic_pairs.csv'),
+            help='CSV with student_idx, club_idx and label columns (vector indexes)',
+        )
+        parser.add_argument('--holdout-fraction', type=float, default=0.2, help='Share of each student\'s clubs to hold out')
+        parser.add_argument('--modes', nargs='+', choices=evaluation.MODES, default=list(evaluation.MODES))
+        parser.add_argument('--k', type=int, nargs='+', default=[5, 10], help='Cut-offs for precision, recall and NDCG')
+        parser.add_argument('--students', type=int, default=200, help='Number of students sampled for evaluation (0 = all)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (0 = evaluate in this process)')
+        parser.add_argument('--chunk-size', type=int, default=20, help='Students sent to a worker per task')
+        parser.add_argument('--cbf-weight', type=float, default=0.4, help='cbf_weight passed to the hybrid recommender')
+        parser.add_argument('--top-k-users', type=int, default=20, help='top_k_users passed to collaborative filtering')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for sampling and tie-breaking')
+        parser.add_argument('--output', default=None, help='Also write the JSON report to this file')
+        parser.add_argument('--json', action='store_true', help='Write the report as JSON')
+
+    def handle(self, *args, **options):
+        ks = sorted(set(options['k']))
+        top_n = ks[-1]
+        num_clubs = Club.objects.count()
+        if not num_clubs:
+            raise CommandError('No clubs to recommend')
+
+        snapshot_dir = None
+        database_name = None
+        if options['source'] == 'holdout':
+            relevant = evaluation.holdout_split(
+                Interaction.objects.values_list('student_id', 'club_id', 'timestamp').iterator(chunk_size=10000),
+                options['holdout_fraction'],
+                seed=options['seed']
+            )
+        else:
+            relevant = self._pairs_relevance(options['pairs'])
+        relevant = self._sample(relevant, options['students'], options['seed'])
+        if not relevant:
+            raise CommandError('No students to evaluate')
+
+        if options['source'] == 'holdout':
+            # Recommenders read interactions straight from the database, so they run against
+            # a snapshot with the held-out rows removed
+            if connection.vendor != 'sqlite':
+                raise CommandError('Holdout evaluation snapshots the database and needs SQLite; use --source pairs')
+            snapshot_dir = tempfile.TemporaryDirectory(prefix='evaluate-')
+            database_name = os.path.join(snapshot_dir.name, 'snapshot.sqlite3')
+            self._write_snapshot(database_name, relevant)
+
+        tasks = list(relevant.items())
+        chunks = [tasks[i:i + options['chunk_size']] for i in range(0, len(tasks), options['chunk_size'])]
+        worker_options = {'cbf_weight': options['cbf_weight'], 'top_k_users': options['top_k_users']}
+        self.stderr.write(f"Evaluating {len(tasks)} students, modes {options['modes']}, k={ks}, {options['workers']} workers")
+
+        start = time.perf_counter()
+        try:
+            results = self._run(chunks, options['modes'], top_n, worker_options, options['workers'], database_name)
+        finally:
+            if snapshot_dir:
+                snapshot_dir.cleanup()
+        elapsed = time.perf_counter() - start
+
+        report = {
+            'source': options['source'],
+            'students': len(tasks),
+            'k': ks,
+            'parameters': worker_options,
+            'wall_seconds': round(elapsed, 2),
+            'modes': evaluation.summarize(results, relevant, ks, num_clubs),
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Evaluated {report['students']} students ({report['source']}) in {report['wall_seconds']}s")
+        for mode, summary in report['modes'].items():
+            metrics = ', '.join(f'{key}: {value}' for key, value in summary['metrics'].items())
+            latency = ', '.join(f'{key}: {value}ms' for key, value in summary['latency_ms'].items())
+            self.stdout.write(f'\n{mode} ({summary["students"]} students)')
+            self.stdout.write(f'  {metrics}')
+            self.stdout.write(f'  latency {latency}')
+
+    def _run(self, chunks, modes, top_n, worker_options, workers, database_name):
+        if workers <= 0:
+            evaluation.init_worker(database_name)
+            return [row for chunk in chunks for row in evaluation.evaluate_students(chunk, modes, top_n, worker_options)]
+
+        # spawn, not fork: TensorFlow does not survive forking once it has been imported
+        results = []
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=evaluation.init_worker, initargs=(database_name,)) as pool:
+            futures = [pool.submit(evaluation.evaluate_students, chunk, modes, top_n, worker_options) for chunk in chunks]
+            for done, future in enumerate(as_completed(futures), 1):
+                results.extend(future.result())
+                self.stderr.write(f'  {done}/{len(futures)} chunks done')
+        return results
+
+    def _pairs_relevance(self, path):
+        """Positive pairs mapped from vector indexes to student and club primary keys"""
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        student_pks = dict(Student.objects.exclude(vector_index=None).values_list('vector_index', 'id'))
+        club_pks = dict(Club.objects.exclude(vector_index=None).values_list('vector_index', 'id'))
+        if not student_pks or not club_pks:
+            raise CommandError('No vector indexes in the database; run import_training_data first')
+
+        relevant = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                if int(row['label']) != 1:
+                    continue
+                student_pk = student_pks.get(int(row['student_idx']))
+                club_pk = club_pks.get(int(row['club_idx']))
+                if student_pk is not None and club_pk is not None:
+                    relevant.setdefault(student_pk, set()).add(club_pk)
+        return relevant
+
+    def _sample(self, relevant, size, seed):
+        if not size or size >= len(relevant):
+            return relevant
+        rng = np.random.default_rng(seed)
+        chosen = rng.choice(sorted(relevant), size=size, replace=False)
+        return {int(pk): relevant[int(pk)] for pk in chosen}
+
+    def _write_snapshot(self, path, relevant):
+        evaluation.snapshot_sqlite(settings.DATABASES['default']['NAME'], path)
+        table = Interaction._meta.db_table
+        rows = [(student_pk, club_pk) for student_pk, clubs in relevant.items() for club_pk in clubs]
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                conn.executemany(f'DELETE FROM {table} WHERE student_id = ? AND club_id = ?', rows)
+        finally:
+            conn.close()
+        self.stderr.write(f'Held out {len(rows)} (student, club) pairs in a database snapshot')
@@ -0,0 +1,146 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from recommender.models import Student
+from recommender import timing
+import statistics
+import json
+import time
+import re
+
+# Endpoints whose queries are explained, with the user they are requested as
+ENDPOINTS = {name: budget['user'] for name, budget in timing.QUERY_BUDGETS.items() if 'async' not in name}
+ENDPOINTS['dashboard-stats'] = 'admin'
+
+# SCAN visits every row of a table, or every entry of an index ("SCAN t USING INDEX i"); lookups
+# are SEARCH. SQLite before 3.36 prints "SCAN TABLE <table>".
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN on every query the recommender endpoints execute and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student-id', default=None, help='Student to request as (default: the first with interactions)')
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Full scans of tables with fewer rows are reported but not flagged')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs of each query; the median time is reported')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error when any query is flagged')
+        parser.add_argument('--json', action='store_true', help='Write the results as JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN output is only parsed for SQLite')
+        setup_test_environment()
+        clients = {
+            'student': self._client(self._student_user(options['student_id'])),
+            'admin': self._client(User.objects.filter(is_staff=True).first()),
+        }
+
+        table_rows = {}
+        results = []
+        for name in options['endpoints']:
+            client = clients[ENDPOINTS[name]]
+            if client is None:
+                raise CommandError(f'No {ENDPOINTS[name]} account to request {name} as')
+            # Warm up first so handler initialization queries are not explained
+            client.get(reverse(name))
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(reverse(name))
+
+            seen = set()
+            for query in captured.captured_queries:
+                sql = query['sql']
+                if sql in seen or not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                seen.add(sql)
+                plan = self._plan(sql)
+                scans = []
+                for line in plan:
+                    match = FULL_SCAN.match(line.strip())
+                    if match:
+                        table = match.group(1)
+                        if table not in table_rows:
+                            table_rows[table] = self._row_count(table)
+                        # Subqueries and CTEs have no row count and are judged by the tables they scan
+                        rows = table_rows[table]
+                        scans.append({'table': table, 'rows': rows, 'flagged': rows is not None and rows >= options['min_rows']})
+                results.append({
+                    'endpoint': name,
+                    'status': response.status_code,
+                    'ms': self._time(sql, options['repeat']),
+                    'sql': sql,
+                    'plan': plan,
+                    'full_scans': scans,
+                    'flagged': any(scan['flagged'] for scan in scans),
+                })
+
+        flagged = [r for r in results if r['flagged']]
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for r in results:
+                style = self.style.ERROR if r['flagged'] else self.style.SUCCESS
+                label = 'FULL SCAN' if r['flagged'] else 'ok'
+                self.stdout.write(style(f"[{label}] {r['endpoint']} {r['ms']}ms"))
+                self.stdout.write(f"    {r['sql'][:300]}")
+                for line in r['plan']:
+                    self.stdout.write(f'      {line}')
+            self.stdout.write(f'{len(results)} queries explained, {len(flagged)} with full scans of large tables')
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'{len(flagged)} queries scan large tables')
+
+    def _plan(self, sql):
+        """EXPLAIN QUERY PLAN rows as indented detail lines"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            rows = cursor.fetchall()
+        depth = {0: -1}
+        lines = []
+        for node_id, parent_id, _, detail in rows:
+            depth[node_id] = depth.get(parent_id, -1) + 1
+            lines.append(f"{'  ' * depth[node_id]}{detail}")
+        return lines
+
+    def _time(self, sql, repeat):
+        """Median run time of a query in milliseconds"""
+        timings = []
+        with connection.cursor() as cursor:
+            for _ in range(max(repeat, 1)):
+                start = time.perf_counter()
+                cursor.execute(sql)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(timings), 2)
+
+    def _row_count(self, table):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                return cursor.fetchone()[0]
+        except Exception:
+            return None
+
+    def _student_user(self, student_id):
+        students = Student.objects.select_related('user')
+        if student_id:
+            student = students.filter(student_id=student_id).first()
+            if student is None:
+                raise CommandError(f'Student {student_id} not found')
+            return student.user
+        student = students.filter(interaction__isnull=False).first() or students.first()
+        return student.user if student else None
+
+    def _client(self, user):
+        if user is None:
+            return None
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
@@ -0,0 +1,228 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from recommender.models import Student, Club
+from recommender import profiles, search, versions
+from collections import defaultdict
+from itertools import islice
+import ast
+import csv
+import os
+import time
+
+
+def parse_list(value):
+    """Parse a stringified Python list such as "['Reading', 'Arts']" from the CSV"""
+    if not value:
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    if isinstance(parsed, (list, tuple)):
+        return [str(item).strip() for item in parsed if str(item).strip()]
+    return [str(parsed)]
+
+
+def read_chunks(path, chunk_size):
+    """Yield lists of (row_number, row) tuples so only one chunk is held in memory"""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = enumerate(csv.DictReader(f))
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Import students and clubs from the training CSVs, recording each row\'s vector index'
+    # Importing only touches the database; skip loading the URL conf (and TensorFlow)
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        data_dir = os.path.join(settings.BASE_DIR, 'data')
+        parser.add_argument(
+            '--students',
+            default=os.path.join(data_dir, 'student_registrations.csv'),
+            help='Path to student_registrations.csv',
+        )
+        parser.add_argument(
+            '--clubs',
+            default=os.path.join(data_dir, 'club_descriptions.csv'),
+            help='Path to club_descriptions.csv',
+        )
+        parser.add_argument('--skip-students', action='store_true', help='Do not import students')
+        parser.add_argument('--skip-clubs', action='store_true', help='Do not import clubs')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows parsed and written per transaction')
+        parser.add_argument(
+            '--password',
+            default=None,
+            help='Initial password for imported accounts. Without it accounts get an unusable password. '
+                 'Hashing uses PASSWORD_HASHERS, so large imports are only fast with CAMPUS_RECOMMENDER_PROFILE=test',
+        )
+        parser.add_argument(
+            '--update-existing',
+            action='store_true',
+            help='Update attributes of students/clubs that already exist (vector indexes are always updated)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+
+        if options['password'] and getattr(settings, 'PROFILE', 'default') != 'test':
+            self.stdout.write(self.style.WARNING(
+                'Hashing passwords with the production hasher; this is slow for large imports'
+            ))
+
+        if not options['skip_clubs']:
+            self._import_clubs(options['clubs'], chunk_size, options['update_existing'])
+
+        if not options['skip_students']:
+            self._import_students(options['students'], chunk_size, options['password'], options['update_existing'])
+            # bulk_create bypasses the model signals that maintain the search index
+            if search.is_available():
+                search.rebuild_index()
+                self.stdout.write('Search index rebuilt')
+
+        # Bulk writes do not bump the catalog and recommendation versions behind the API ETags either
+        versions.bump_catalog()
+        versions.bump_recommendations()
+
+    def _check_file(self, path):
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+    def _import_clubs(self, path, chunk_size, update_existing):
+        self._check_file(path)
+        self.stdout.write(f'Importing clubs from {path}...')
+        start = time.perf_counter()
+
+        # The CSV defines the whole club_vectors artifact, so previous indexes are stale
+        Club.objects.exclude(vector_index=None).update(vector_index=None)
+
+        created = updated = 0
+        for chunk in read_chunks(path, chunk_size):
+            with transaction.atomic():
+                # Clubs have no natural key and names repeat in the CSV, so each row claims
+                # the oldest same-named club that has not been matched to a vector row yet
+                names = {row['Club Name'].strip() for _, row in chunk}
+                unmatched = defaultdict(list)
+                for club in Club.objects.filter(name__in=names, vector_index=None).order_by('id'):
+                    unmatched[club.name].append(club)
+
+                new_clubs, matched_clubs = [], []
+                for index, row in chunk:
+                    name = row['Club Name'].strip()
+                    if not unmatched[name]:
+                        new_clubs.append(Club(
+                            name=name,
+                            category=row['Category'].strip(),
+                            description=row['Description'].strip(),
+                            vector_index=index,
+                        ))
+                        continue
+                    club = unmatched[name].pop(0)
+                    club.vector_index = index
+                    if update_existing:
+                        club.category = row['Category'].strip()
+                        club.description = row['Description'].strip()
+                    matched_clubs.append(club)
+
+                Club.objects.bulk_create(new_clubs)
+                update_fields = ['vector_index', 'category', 'description'] if update_existing else ['vector_index']
+                Club.objects.bulk_update(matched_clubs, update_fields)
+            created += len(new_clubs)
+            updated += len(matched_clubs)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Clubs: {created} created, {updated} updated in {elapsed:.1f}s'))
+
+    def _import_students(self, path, chunk_size, password, update_existing):
+        self._check_file(path)
+        self.stdout.write(f'Importing students from {path}...')
+        start = time.perf_counter()
+
+        Student.objects.exclude(vector_index=None).update(vector_index=None)
+        max_id_length = Student._meta.get_field('student_id').max_length
+
+        created = updated = skipped = 0
+        for chunk in read_chunks(path, chunk_size):
+            rows = {}
+            for index, row in chunk:
+                student_id = row['Student ID'].strip()
+                if not student_id or len(student_id) > max_id_length:
+                    skipped += 1
+                    continue
+                rows[student_id] = (index, row)
+
+            with transaction.atomic():
+                existing = {s.student_id: s for s in Student.objects.filter(student_id__in=rows.keys())}
+                new_ids = [student_id for student_id in rows if student_id not in existing]
+
+                # Accounts use the student ID as username; reuse accounts that already exist
+                users = {u.username: u for u in User.objects.filter(username__in=new_ids)}
+                new_users = []
+                for student_id in new_ids:
+                    if student_id in users:
+                        continue
+                    row = rows[student_id][1]
+                    first_name, _, last_name = row['Name'].strip().partition(' ')
+                    new_users.append(User(
+                        username=student_id,
+                        email=row['Email'].strip(),
+                        first_name=first_name,
+                        last_name=last_name,
+                        password=make_password(password),
+                    ))
+                User.objects.bulk_create(new_users)
+                users.update({u.username: u for u in User.objects.filter(username__in=[u.username for u in new_users])})
+
+                # An account that already belongs to a student under another ID cannot get a
+                # second one; report it instead of failing the whole chunk
+                taken = set(Student.objects.filter(user__in=[users[student_id] for student_id in new_ids]).values_list('user__username', flat=True))
+                if taken:
+                    self.stdout.write(self.style.WARNING(
+                        f"  Skipping {len(taken)} students whose account belongs to another student: {', '.join(sorted(taken)[:10])}"
+                    ))
+                    skipped += len(taken)
+
+                new_students = []
+                for student_id in new_ids:
+                    if student_id in taken:
+                        continue
+                    index, row = rows[student_id]
+                    student = Student(user=users[student_id], student_id=student_id, vector_index=index)
+                    self._apply_attributes(student, row)
+                    new_students.append(student)
+                Student.objects.bulk_create(new_students)
+
+                for student_id, student in existing.items():
+                    student.vector_index = rows[student_id][0]
+                    if update_existing:
+                        self._apply_attributes(student, rows[student_id][1])
+                update_fields = ['vector_index']
+                if update_existing:
+                    update_fields += ['gender', 'course', 'hobbies', 'interests', 'skills', 'interest_profile']
+                Student.objects.bulk_update(existing.values(), update_fields)
+
+            created += len(new_students)
+            updated += len(existing)
+            self.stdout.write(f'  {created + updated} students processed')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Students: {created} created, {updated} updated, {skipped} skipped in {elapsed:.1f}s'
+        ))
+
+    def _apply_attributes(self, student, row):
+        gender = row['Gender'].strip()
+        student.gender = gender if gender in dict(Student.GENDER_CHOICES) else 'Other'
+        student.course = row['Course'].strip()
+        student.hobbies = parse_list(row['Hobbies'])
+        student.interests = parse_list(row['Academic Interests']) + parse_list(row['Extracurricular Interests'])
+        student.skills = parse_list(row['Skills'])
+        # Bulk writes skip Student.save, which keeps the profile current otherwise
+        student.interest_profile = profiles.build_profile(student)
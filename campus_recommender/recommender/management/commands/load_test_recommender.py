@@ -0,0 +1,118 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from recommender.models import Student
+from recommender import loadtest
+import subprocess
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test recommender endpoints of a running server at several concurrency levels. '
+        'To compare deployments, run it against the WSGI server (e.g. gunicorn campus_recommender.wsgi) '
+        'with --label wsgi --output wsgi.json, then against the ASGI server (e.g. uvicorn '
+        'campus_recommender.asgi:application) with --paths /api/recommender/async/recommend/ '
+        '--label asgi --compare wsgi.json'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test')
+        parser.add_argument('--paths', nargs='+', default=['/api/recommender/recommend/'], help='Endpoints to load')
+        parser.add_argument('--concurrency', nargs='+', type=int, default=[50, 200, 1000], help='Concurrent clients per run')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Seconds of untimed load before each path')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request counts as an error')
+        parser.add_argument('--token', default=None, help='API token to send (default: the token of --student-id)')
+        parser.add_argument('--student-id', default=None, help='Student to request as (default: the first with interactions)')
+        parser.add_argument('--label', default=None, help='Deployment name stored with the results, e.g. wsgi or asgi')
+        parser.add_argument('--compare', default=None, help='Results JSON of an earlier run to compare throughput against')
+        parser.add_argument('--output', default=None, help='Write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f"Token {options['token'] or self._student_token(options['student_id'])}"}
+        limit = loadtest.raise_open_file_limit(max(options['concurrency']) + 100)
+        if limit < max(options['concurrency']) + 20:
+            self.stderr.write(self.style.WARNING(f'Open file limit is {limit}; high concurrency runs will see connection errors'))
+
+        runs = []
+        for path in options['paths']:
+            if options['warmup']:
+                loadtest.run_load(options['url'], path, min(options['concurrency']), options['warmup'],
+                                  headers, options['timeout'])
+            for concurrency in options['concurrency']:
+                self.stderr.write(f'{path} with {concurrency} clients for {options["duration"]}s...')
+                try:
+                    result = loadtest.run_load(options['url'], path, concurrency, options['duration'],
+                                               headers, options['timeout'])
+                except loadtest.LoadTestError as e:
+                    raise CommandError(str(e))
+                runs.append(result)
+                self.stderr.write(
+                    f"  {result['throughput_rps']} req/s, p50 {result['p50']}ms, p95 {result['p95']}ms, "
+                    f"p99 {result['p99']}ms, statuses {result['statuses']}, errors {result['errors']}"
+                )
+
+        report = {
+            'label': options['label'],
+            'url': options['url'],
+            'commit': self._git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'duration': options['duration'],
+            'runs': runs,
+        }
+        if options['compare']:
+            report['comparison'] = self._compare(options['compare'], runs)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def _compare(self, path, runs):
+        """Throughput of this run against an earlier one, matched by concurrency (and order of paths)"""
+        with open(path) as f:
+            baseline = json.load(f)
+        baseline_runs = {}
+        for run in baseline['runs']:
+            baseline_runs.setdefault(run['concurrency'], []).append(run)
+        comparison = []
+        for run in runs:
+            candidates = baseline_runs.get(run['concurrency'])
+            if not candidates:
+                continue
+            before = candidates.pop(0)
+            comparison.append({
+                'concurrency': run['concurrency'],
+                'baseline': baseline.get('label'),
+                'baseline_path': before['path'],
+                'path': run['path'],
+                'baseline_rps': before['throughput_rps'],
+                'rps': run['throughput_rps'],
+                'speedup': round(run['throughput_rps'] / before['throughput_rps'], 2) if before['throughput_rps'] else None,
+                'baseline_p99': before['p99'],
+                'p99': run['p99'],
+            })
+            self.stderr.write(
+                f"c={run['concurrency']}: {before['throughput_rps']} -> {run['throughput_rps']} req/s, "
+                f"p99 {before['p99']} -> {run['p99']}ms"
+            )
+        return comparison
+
+    def _student_token(self, student_id):
+        students = Student.objects.select_related('user')
+        if student_id:
+            student = students.filter(student_id=student_id).first()
+        else:
+            student = students.filter(interaction__isnull=False).first() or students.first()
+        if student is None:
+            raise CommandError('No student to request as; pass --token')
+        token, _ = Token.objects.get_or_create(user=student.user)
+        return token.key
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from recommender import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student/admin full-text search index'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.ERROR('Search index is not available (requires SQLite with FTS5, run migrate first)'))
+            return
+
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recommender import inference
+from recommender.model_handler import ModelHandler
+import signal
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve model scoring, vector similarity and student vectorization to the web workers over a '
+        'Unix socket, with one shared copy of the model, vectors and vectorizer and micro-batching '
+        'across requests. Web workers use it when RECOMMENDER_INFERENCE_SOCKET points at the same path'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None, help='Unix socket path (default: RECOMMENDER_INFERENCE_SOCKET)')
+        parser.add_argument('--artifact-version', default=None,
+                            help='Artifact version to serve (default: the one ModelHandler serves)')
+        parser.add_argument('--max-batch-rows', type=int, default=inference.MAX_BATCH_ROWS,
+                            help='Most rows scored in one model call')
+        parser.add_argument('--max-wait-ms', type=float, default=inference.MAX_WAIT_MS,
+                            help='How long a request waits for others to join its batch')
+        parser.add_argument('--check', action='store_true', help='Print the health of a running server and exit')
+
+    def handle(self, *args, **options):
+        socket_path = options['socket'] or getattr(settings, 'RECOMMENDER_INFERENCE_SOCKET', None)
+        if not socket_path:
+            raise CommandError('No socket path: pass --socket or set RECOMMENDER_INFERENCE_SOCKET')
+
+        if options['check']:
+            health = inference.InferenceClient(socket_path, retry_interval=0).health()
+            if health is None:
+                raise CommandError(f'Inference server at {socket_path} is not reachable')
+            self.stdout.write(json.dumps(health, indent=2))
+            return
+
+        # Loaded in-process: this handler must not hand its work to another server
+        handler = ModelHandler(options['artifact_version'], use_inference_server=False)
+        handler.verbose = False
+        if not handler.loaded:
+            raise CommandError('Model, vectors or vectorizer could not be loaded; see the log')
+
+        server = inference.InferenceServer(
+            handler, socket_path,
+            max_batch_rows=options['max_batch_rows'],
+            max_wait_ms=options['max_wait_ms'],
+        )
+        signal.signal(signal.SIGTERM, lambda *_: server.stop())
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving version {handler.version} on {socket_path} "
+            f"(batches up to {options['max_batch_rows']} rows, {options['max_wait_ms']}ms wait)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+        finally:
+            handler.close()
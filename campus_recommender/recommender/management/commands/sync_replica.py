@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recommender.routers import PRIMARY, REPLICA
+import sqlite3
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the replica with the online backup API, once or every '
+        '--interval seconds. The replica is kept in WAL mode, so its readers keep working while it is '
+        'refreshed; the primary is read-locked for one step of --pages pages at a time'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help='Keep syncing every this many seconds')
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Pages copied per step (-1 copies everything in one step)')
+        parser.add_argument('--step-sleep', type=float, default=0.01,
+                            help='Seconds between steps, in which writers on the primary get the lock')
+
+    def handle(self, *args, **options):
+        if REPLICA not in settings.DATABASES:
+            raise CommandError('No replica database configured (set CAMPUS_RECOMMENDER_REPLICA_DB)')
+        primary, replica = settings.DATABASES[PRIMARY], settings.DATABASES[REPLICA]
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError('sync_replica copies SQLite files; use the database server\'s replication otherwise')
+        busy_timeout = getattr(settings, 'SQLITE_PRAGMAS', {}).get('busy_timeout', 5000) / 1000
+
+        while True:
+            start = time.perf_counter()
+            source = sqlite3.connect(str(primary['NAME']), timeout=busy_timeout)
+            target = sqlite3.connect(str(replica['NAME']), timeout=busy_timeout)
+            try:
+                # A WAL database is written without blocking its readers; the mode survives the copy
+                target.execute('PRAGMA journal_mode=WAL')
+                source.backup(target, pages=options['pages'], progress=lambda *_: time.sleep(options['step_sleep']))
+            except sqlite3.Error as e:
+                if options['interval'] is None:
+                    raise CommandError(f'Replica sync failed: {str(e)}')
+                self.stderr.write(self.style.ERROR(f'Replica sync failed: {str(e)}'))
+            else:
+                # The file itself may lag behind until the WAL is checkpointed
+                page_count, = target.execute('PRAGMA page_count').fetchone()
+                page_size, = target.execute('PRAGMA page_size').fetchone()
+                size_mb = page_count * page_size / 1024 / 1024
+                self.stdout.write(f"Synced {primary['NAME']} -> {replica['NAME']} ({size_mb:.1f}MB) "
+                                  f"in {(time.perf_counter() - start) * 1000:.0f}ms")
+            finally:
+                target.close()
+                source.close()
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import glob
+import fcntl
+import bisect
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, from sub-millisecond stages to multi-second requests
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# Seconds between writes of this process's values in multi-process mode
+FLUSH_INTERVAL = 1.0
+# Counters and histograms of exited processes, summed, in the shared directory
+ARCHIVE_FILE = 'dead-processes.json'
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, help_text):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def _touch(self):
+        self.registry.changed()
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self._touch()
+
+    def merge(self, current, other):
+        return current + other
+
+    def samples(self, values):
+        for key, value in values.items():
+            yield f'{self.name}_total{_format_labels(key)} {value}'
+
+
+class Gauge(Metric):
+    """Last value set; across processes the maximum is reported"""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self.values[_label_key(labels)] = value
+        self._touch()
+
+    def merge(self, current, other):
+        return max(current, other)
+
+    def samples(self, values):
+        for key, value in values.items():
+            yield f'{self.name}{_format_labels(key)} {value}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            # Per-bucket (non-cumulative) counts followed by the sum and the count
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * len(self.buckets) + [0, 0.0, 0]
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+        self._touch()
+
+    def merge(self, current, other):
+        return [a + b for a, b in zip(current, other)]
+
+    def samples(self, values):
+        for key, entry in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry[:len(self.buckets) + 1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                yield f'{self.name}_bucket{_format_labels(key, [("le", le)])} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(key)} {entry[-2]}'
+            yield f'{self.name}_count{_format_labels(key)} {entry[-1]}'
+
+
+class Registry:
+    """
+    In-process metrics with Prometheus text exposition.
+
+    With a shared directory (multi-process mode, e.g. several gunicorn workers) every process
+    periodically writes its own values to <directory>/metrics-<pid>.json and the exposition
+    sums counters and histograms over all files, so any worker can serve the scrape. Files of
+    exited processes are folded into ARCHIVE_FILE (counters and histograms only, so totals never
+    go backwards) and deleted, when a scrape finds them or through mark_process_dead, e.g. from
+    gunicorn's child_exit hook. Gauges are therefore merged over live processes only.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._pid = os.getpid()
+        self._dirty = False
+        self._flusher = None
+
+    def counter(self, name, help_text):
+        return self._register(Counter(self, name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge(self, name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, help_text, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def changed(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+        self._dirty = True
+        if self.directory and self._flusher is None:
+            self._start_flusher()
+
+    def _after_fork(self):
+        # A forked worker starts from zero; its parent's values are already in the parent's file
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+            self._pid = os.getpid()
+            self._flusher = None
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError as e:
+                    logger.error(f"Error writing metrics: {str(e)}")
+
+    def _snapshot(self):
+        with self.lock:
+            return {
+                name: {json.dumps(key): (list(value) if isinstance(value, list) else value)
+                       for key, value in metric.values.items()}
+                for name, metric in self.metrics.items()
+            }
+
+    def flush(self):
+        """Write this process's values to the shared directory"""
+        if not self.directory:
+            return
+        self._dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _directory_lock(self):
+        """Exclusive lock on the shared directory, held while the archive is rewritten"""
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, '.lock'), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def mark_process_dead(self, pid):
+        """Fold the counters and histograms of an exited process into the archive and delete its file"""
+        with self._directory_lock():
+            self._fold(pid)
+
+    def _fold(self, pid):
+        # Called with the directory lock held
+        path = os.path.join(self.directory, f'metrics-{pid}.json')
+        data = self._read(path)
+        if data is None:
+            return
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+        archive = self._read(archive_path) or {}
+        for name, values in data.items():
+            metric = self.metrics.get(name)
+            if metric is None or metric.type == 'gauge':
+                continue
+            archived = archive.setdefault(name, {})
+            for raw_key, value in values.items():
+                archived[raw_key] = value if raw_key not in archived else metric.merge(archived[raw_key], value)
+        tmp_path = f'{archive_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(archive, f)
+        os.replace(tmp_path, archive_path)
+        os.remove(path)
+
+    @staticmethod
+    def _process_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _collect(self):
+        """Values per metric, merged over all live processes (plus the archive) in multi-process mode"""
+        if not self.directory:
+            with self.lock:
+                return {name: dict(metric.values) for name, metric in self.metrics.items()}
+
+        self.flush()
+        # Under the lock, so no file is folded into the archive between being read and the archive being read
+        with self._directory_lock():
+            files = [os.path.join(self.directory, ARCHIVE_FILE)]
+            for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+                if pid != os.getpid() and not self._process_alive(pid):
+                    self._fold(pid)
+                else:
+                    files.append(path)
+            contents = [self._read(path) for path in files]
+        merged = {name: {} for name in self.metrics}
+        for data in contents:
+            if data is None:
+                continue
+            for name, values in data.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for raw_key, value in values.items():
+                    key = tuple(tuple(pair) for pair in json.loads(raw_key))
+                    current = merged[name].get(key)
+                    merged[name][key] = value if current is None else metric.merge(current, value)
+        return merged
+
+    def exposition(self):
+        """Metrics in the Prometheus text format"""
+        lines = []
+        for name, values in self._collect().items():
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.samples(values))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(getattr(settings, 'RECOMMENDER_METRICS_DIR', None))
+
+REQUESTS = registry.counter('http_requests', 'HTTP requests by endpoint, method and status')
+REQUEST_LATENCY = registry.histogram('http_request_duration_seconds', 'HTTP request latency by endpoint')
+STAGE_LATENCY = registry.histogram('recommender_stage_duration_seconds', 'Recommender stage latency (auth, cbf, cf, model, serialize)')
+MODEL_BATCH_SIZE = registry.histogram('recommender_model_batch_size', 'Rows per model inference call', BATCH_SIZE_BUCKETS)
+CANDIDATES = registry.histogram('recommender_candidates', 'Hybrid candidates per request by generator (merged: the re-ranked set)', BATCH_SIZE_BUCKETS)
+MODEL_LATENCY = registry.histogram('recommender_model_inference_seconds', 'Model inference latency per call')
+CACHE_REQUESTS = registry.counter('recommender_cache_requests', 'Cache lookups by cache and result (hit or miss)')
+FALLBACKS = registry.counter('recommender_fallbacks', 'Recommendations served by a fallback path')
+ARTIFACT_LOAD_SECONDS = registry.gauge('recommender_artifact_load_seconds', 'Time to load each artifact file')
+ARTIFACT_INFO = registry.gauge('recommender_artifact_info', 'Loaded artifact files and versions (1 while served, 0 once replaced)')
+VIEW_EVENTS = registry.counter('recommender_view_events', 'Club views recorded, by result (queued, coalesced, direct)')
+VIEW_FLUSH_ROWS = registry.histogram('recommender_view_flush_rows', 'Interaction rows written per buffered view flush', BATCH_SIZE_BUCKETS)
+MODEL_RELOADS = registry.counter('recommender_model_reloads', 'Model handler reloads by result (swapped, failed)')
@@ -1,54 +1,299 @@
-from django.http import HttpResponseRedirect
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from rest_framework.authtoken.models import Token
+from . import timing, tracing, metrics, routers
 import logging
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
 class AuthenticationMiddleware:
+    # Works under WSGI and ASGI; under ASGI it does not push async views onto a sync thread
+    sync_capable = True
+    async_capable = True
+
+    # API paths that don't require authentication
+    exempt_paths = [
+        '/api/admins/login/',
+        '/api/students/login/',
+        '/api/students/register/',
+        '/admin/',
+        '/api-auth/'
+    ]
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
         
     def __call__(self, request):
-        # API paths that don't require authentication
-        exempt_paths = [
-            '/api/admins/login/',
-            '/api/students/login/',
-            '/api/students/register/',
-            '/admin/',
-            '/api-auth/'
-        ]
-        
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token_key = self._token_to_check(request)
+        if token_key is None:
+            return self.get_response(request)
+        try:
+            with timing.stage('auth'):
+                Token.objects.get(key=token_key)
+            # Token is valid, proceed
+            logger.debug("Valid token found")
+            return self.get_response(request)
+        except Token.DoesNotExist:
+            logger.debug(f"Invalid token: {token_key[:10]}...")
+            return self._unauthorized(request)
+
+    async def __acall__(self, request):
+        token_key = self._token_to_check(request)
+        if token_key is None:
+            return await self.get_response(request)
+        try:
+            with timing.stage('auth'):
+                await Token.objects.aget(key=token_key)
+            logger.debug("Valid token found")
+            return await self.get_response(request)
+        except Token.DoesNotExist:
+            logger.debug(f"Invalid token: {token_key[:10]}...")
+            return self._unauthorized(request)
+
+    def _token_to_check(self, request):
+        """
+        Token key to validate for the request, or None when the request passes without one.
+
+        Returns an empty string for API requests without a token header, which never validates.
+        """
         # Log the request path for debugging
         logger.debug(f"Request path: {request.path}")
         
         # Check if the request path is exempt
-        for path in exempt_paths:
+        for path in self.exempt_paths:
             if request.path.startswith(path):
                 logger.debug(f"Path {request.path} is exempt from authentication")
-                return self.get_response(request)
-            
-        # Check if this is an API request
-        if request.path.startswith('/api/'):
-            # Check for token authentication
-            auth_header = request.headers.get('Authorization', '')
-            logger.debug(f"Authorization header: {auth_header[:15]}..." if auth_header else "No Authorization header")
-            
-            if auth_header.startswith('Token '):
-                token_key = auth_header.split(' ')[1]
-                try:
-                    Token.objects.get(key=token_key)
-                    # Token is valid, proceed
-                    logger.debug("Valid token found")
-                    return self.get_response(request)
-                except Token.DoesNotExist:
-                    logger.debug(f"Invalid token: {token_key[:10]}...")
-                    
-            # No valid token, return 401 for API requests
-            logger.debug(f"Unauthorized access to {request.path}")
-            from django.http import JsonResponse
-            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+                return None
             
         # For non-API requests, let Django handle normally
         # The frontend routes should handle authentication
-        return self.get_response(request) 
\ No newline at end of file
+        if not request.path.startswith('/api/'):
+            return None
+
+        # Check for token authentication
+        auth_header = request.headers.get('Authorization', '')
+        logger.debug(f"Authorization header: {auth_header[:15]}..." if auth_header else "No Authorization header")
+        if auth_header.startswith('Token '):
+            return auth_header.split(' ')[1]
+        return ''
+
+    def _unauthorized(self, request):
+        # No valid token, return 401 for API requests
+        logger.debug(f"Unauthorized access to {request.path}")
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+class RequestTimingMiddleware:
+    """
+    Record DB query count, DB time and handler time for every request.
+
+    Stage timings recorded with timing.stage() during the request are added to a Server-Timing
+    header, and GET requests over their QUERY_BUDGETS entry are logged as warnings. With
+    RECOMMENDER_TRACING on, each request is also the root span of a trace. Request counts and
+    latency histograms per endpoint go to the metrics registry.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.emit_header = getattr(settings, 'SERVER_TIMING_HEADER', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with timing.collect() as timings, tracing.span('request', method=request.method) as trace:
+            response = self.get_response(request)
+            self._annotate_trace(request, response, timings, trace)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        async with timing.acollect() as timings:
+            with tracing.span('request', method=request.method) as trace:
+                response = await self.get_response(request)
+                self._annotate_trace(request, response, timings, trace)
+        return self._finish(request, response, timings)
+
+    def _annotate_trace(self, request, response, timings, trace):
+        if trace is not None:
+            # The root span is named after the endpoint once the URL has been resolved
+            match = getattr(request, 'resolver_match', None)
+            trace.name = match.view_name if match else request.path
+            trace.attrs.update({'status': response.status_code, 'queries': timings.queries})
+
+    def _finish(self, request, response, timings):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+        total = timings.elapsed
+        # Unresolved paths share one label so 404 scans cannot blow up the metric cardinality
+        endpoint = match.view_name if match else 'unmatched'
+        metrics.REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.REQUEST_LATENCY.observe(total, endpoint=endpoint)
+        logger.info(
+            f"{request.method} {view_name} {response.status_code} total={total * 1000:.1f}ms "
+            f"handler={(total - timings.db_seconds) * 1000:.1f}ms db={timings.db_seconds * 1000:.1f}ms "
+            f"queries={timings.queries}"
+        )
+
+        budget = timing.QUERY_BUDGETS.get(view_name) if request.method == 'GET' else None
+        if budget and timings.queries > budget['max_queries']:
+            logger.warning(f"{view_name} ran {timings.queries} queries, budget is {budget['max_queries']}")
+
+        if self.emit_header:
+            response['Server-Timing'] = timings.server_timing()
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Let GET/HEAD requests read recommender data from the replica database, if one is configured.
+
+    Requests that write set a short-lived cookie; while it is present the client reads from the
+    primary, so it sees its own writes until the replica has been synced (REPLICA_PIN_SECONDS
+    should exceed the sync interval).
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = 'replica_pin'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = routers.REPLICA in settings.DATABASES
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 30)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                routers.reset(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                routers.reset(token)
+        return self._finish(request, response)
+
+    def _start(self, request):
+        if not self.enabled or request.method not in self.safe_methods or self.cookie_name in request.COOKIES:
+            return None
+        return routers.use_replica()
+
+    def _finish(self, request, response):
+        if self.enabled and request.method not in self.safe_methods:
+            response.set_cookie(self.cookie_name, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of at least RECOMMENDER_COMPRESS_MIN_BYTES with Brotli (when the
+    brotli package is installed and the client accepts it) or gzip.
+
+    Smaller bodies are sent as they are: below a kilobyte or so the compressed size barely
+    changes and compression only costs CPU time. Streaming responses are gzipped chunk by chunk.
+    """
+
+    sync_capable = True
+    async_capable = True
+    gzip_level = 6
+    brotli_quality = 5
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_bytes = getattr(settings, 'RECOMMENDER_COMPRESS_MIN_BYTES', 1024)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    def _encoding(self, request):
+        """Preferred encoding the client accepts (q > 0), or None"""
+        accepted = {}
+        for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            name, _, params = item.strip().partition(';')
+            quality = 1.0
+            if params.strip().startswith('q='):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+        if brotli is not None and accepted.get('br', 0) > 0:
+            return 'br'
+        if accepted.get('gzip', 0) > 0:
+            return 'gzip'
+        return None
+
+    def _compress(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self._encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # Async iterators are left alone; compress_sequence only wraps sync iterators
+            if encoding != 'gzip' or getattr(response, 'is_async', False):
+                return response
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < self.min_bytes:
+                return response
+            with timing.stage('compress'):
+                if encoding == 'br':
+                    body = brotli.compress(response.content, quality=self.brotli_quality)
+                else:
+                    body = gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response.headers['Content-Length'] = str(len(body))
+
+        # The compressed bytes differ from the identity representation the ETag was computed on
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-19 09:12
+
+from django.db import migrations
+
+# Kept here rather than imported from recommender.search, so later changes to that module
+# cannot change what this migration does
+STUDENT_SEARCH_TABLE = 'recommender_student_search'
+ADMIN_SEARCH_TABLE = 'recommender_admin_search'
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-specific; other backends keep using the icontains fallback
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        # prefix='1 2 3' keeps short prefix lookups (every keystroke) on the index
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {STUDENT_SEARCH_TABLE} USING fts5("
+            "username, student_id, email, prefix='1 2 3')"
+        )
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {ADMIN_SEARCH_TABLE} USING fts5("
+            "username, email, first_name, last_name, prefix='1 2 3')"
+        )
+        cursor.execute(f"DELETE FROM {STUDENT_SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {STUDENT_SEARCH_TABLE} (rowid, username, student_id, email) "
+            "SELECT s.id, u.username, s.student_id, u.email "
+            "FROM recommender_student s JOIN auth_user u ON u.id = s.user_id"
+        )
+        cursor.execute(f"DELETE FROM {ADMIN_SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {ADMIN_SEARCH_TABLE} (rowid, username, email, first_name, last_name) "
+            "SELECT a.id, u.username, u.email, u.first_name, u.last_name "
+            "FROM recommender_admin a JOIN auth_user u ON u.id = a.user_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {STUDENT_SEARCH_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {ADMIN_SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0005_application'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='club',
+            name='vector_index',
+            field=models.PositiveIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='vector_index',
+            field=models.PositiveIntegerField(blank=True, null=True, unique=True),
+        ),
+    ]
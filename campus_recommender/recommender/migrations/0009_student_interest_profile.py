@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:04
+
+from collections import Counter
+
+from django.db import migrations, models
+
+# Version 1 of the profile builder, kept here rather than imported from recommender.profiles, so
+# later changes to that module cannot change what this migration does. Profiles of a later
+# version are rebuilt on read (profiles.get_profile) and on the next save.
+PROFILE_VERSION = 1
+
+CATEGORY_MAPPING = {
+    'arts': ['arts', 'creative', 'design', 'music', 'photography', 'film', 'drama', 'drawing', 'painting'],
+    'literature': ['literature', 'reading', 'writing', 'poetry', 'book', 'arts'],
+    'music': ['music', 'singing', 'choir', 'band', 'orchestra', 'arts'],
+    'photography': ['photography', 'camera', 'arts', 'visual'],
+    'design': ['design', 'graphic', 'arts', 'creative', 'visual'],
+    'drawing': ['drawing', 'sketch', 'arts', 'creative', 'visual'],
+    'painting': ['painting', 'arts', 'creative', 'visual'],
+    'academics': ['academics', 'study', 'learning', 'education', 'research', 'science'],
+    'mathematics': ['mathematics', 'math', 'algebra', 'calculus', 'academics', 'science'],
+    'science': ['science', 'physics', 'chemistry', 'biology', 'academics', 'research'],
+    'technology': ['technology', 'computer', 'programming', 'coding', 'tech', 'it'],
+    'engineering': ['engineering', 'mechanics', 'electronics', 'design', 'technology'],
+    'programming': ['programming', 'coding', 'software', 'development', 'technology', 'computer', 'tech'],
+    'sports': ['sports', 'athletic', 'fitness', 'exercise', 'team'],
+    'basketball': ['basketball', 'sports', 'team', 'athletic'],
+    'football': ['football', 'sports', 'team', 'athletic'],
+    'soccer': ['soccer', 'sports', 'team', 'athletic'],
+    'swimming': ['swimming', 'sports', 'athletic'],
+    'tennis': ['tennis', 'sports', 'athletic'],
+    'fitness': ['fitness', 'gym', 'health', 'exercise', 'sports'],
+    'volunteer': ['volunteer', 'service', 'community', 'charity', 'helping'],
+    'environment': ['environment', 'nature', 'climate', 'sustainability', 'green'],
+    'social': ['social', 'community', 'networking', 'cultural', 'diversity'],
+    'leadership': ['leadership', 'management', 'organization', 'entrepreneurship'],
+    'business': ['business', 'entrepreneurship', 'finance', 'marketing', 'economics'],
+    'gaming': ['gaming', 'games', 'video games', 'esports', 'entertainment'],
+    'food': ['food', 'cooking', 'culinary', 'baking', 'nutrition'],
+    'travel': ['travel', 'adventure', 'exploration', 'culture'],
+}
+
+RELATED_TERMS = {}
+for _group in CATEGORY_MAPPING.values():
+    for _term in _group:
+        RELATED_TERMS.setdefault(_term, set()).update(_group)
+
+
+def build_profile(student):
+    terms = [item.lower() for item in (student.hobbies or []) + (student.interests or []) + (student.skills or [])]
+    if student.course:
+        terms.append(student.course.lower())
+    related = Counter()
+    for term in terms:
+        related.update(RELATED_TERMS.get(term, ()))
+    return {
+        'version': PROFILE_VERSION,
+        'terms': list(dict.fromkeys(terms)),
+        'related': dict(related),
+        'course': (student.course or '').lower(),
+    }
+
+
+def build_interest_profiles(apps, schema_editor):
+    Student = apps.get_model('recommender', 'Student')
+    batch = []
+    for student in Student.objects.only('id', 'course', 'hobbies', 'interests', 'skills').iterator(chunk_size=2000):
+        student.interest_profile = build_profile(student)
+        batch.append(student)
+        if len(batch) >= 2000:
+            Student.objects.bulk_update(batch, ['interest_profile'])
+            batch = []
+    Student.objects.bulk_update(batch, ['interest_profile'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommender', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='interest_profile',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(build_interest_profiles, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,21 @@
-import tensorflow as tf
 import numpy as np
 from scipy.sparse import load_npz
 import pickle
 import os
+import time
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as futures_wait
 from django.conf import settings
+from django.db import close_old_connections
 from .models import Student, Club, Interaction
-from django.db.models import Count, Q
+from .embeddings import VectorStore, StudentEmbeddingService, resolve_vectors_path
+from . import timing, tracing, metrics
+from .inference import InferenceClient, InferenceUnavailable, InferenceVersionMismatch, handler_versions
+from . import artifacts, popularity, profiles
+from contextlib import contextmanager
+from django.db.models import Count
 import logging
 import glob
 import sys
@@ -13,54 +23,189 @@ import sys
 # Configure logging
 logger = logging.getLogger(__name__)
 
+
+def default_base_dirs():
+    """Directories searched for the model and vector files"""
+    base_dirs = []
+    
+    # 1. Try Django settings
+    if hasattr(settings, 'BASE_DIR'):
+        base_dirs.append(settings.BASE_DIR)
+    
+    # 2. Try inferring from current file
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(current_dir)
+    base_dirs.append(parent_dir)
+    base_dirs.append(os.path.dirname(parent_dir))
+    
+    # 3. Try using relative paths
+    base_dirs.append(os.path.join(os.getcwd(), 'campus_recommender'))
+    base_dirs.append(os.getcwd())
+    return base_dirs
+
+
+def find_data_file(filename, base_dirs):
+    """
+    Search for a file in multiple possible locations.
+    
+    The versioned artifact builds (RECOMMENDER_ARTIFACTS_DIR) are never searched: they are only
+    loaded as a whole, through CURRENT or an explicit version.
+    """
+    for base_dir in base_dirs:
+        # Try data directory
+        data_path = os.path.join(base_dir, 'data', filename)
+        if os.path.exists(data_path):
+            return data_path
+            
+        # Try recommender/data directory
+        rec_data_path = os.path.join(base_dir, 'recommender', 'data', filename)
+        if os.path.exists(rec_data_path):
+            return rec_data_path
+            
+        # Try project root directory
+        root_path = os.path.join(base_dir, filename)
+        if os.path.exists(root_path):
+            return root_path
+    
+    # Last attempt: search in all subdirectories
+    excluded = os.path.realpath(artifacts.artifacts_dir())
+    for base_dir in base_dirs:
+        for root, dirs, files in os.walk(base_dir):
+            dirs[:] = [name for name in dirs if os.path.realpath(os.path.join(root, name)) != excluded]
+            if filename in files:
+                return os.path.join(root, filename)
+    
+    return None
+
+
+def artifact_paths(version=None):
+    """
+    Artifact files to serve.
+
+    Args:
+        version: Artifact version directory to load; defaults to the one CURRENT points at
+
+    Returns:
+        (version, paths) where version is None when no versioned artifacts exist; the model is
+        then searched for in the data directories, and the other files are taken from its directory
+        (club_vectors.npz before the shipped 'club_vectors .npz') so files of different builds are
+        never mixed
+    """
+    version = version or artifacts.read_current()
+    if version:
+        directory = artifacts.version_dir(version)
+        return version, {
+            'model': os.path.join(directory, artifacts.MODEL_FILE),
+            'student_vectors': os.path.join(directory, artifacts.STUDENT_VECTORS_FILE),
+            'club_vectors': os.path.join(directory, artifacts.CLUB_VECTORS_FILE),
+            'vectorizer': os.path.join(directory, artifacts.VECTORIZER_FILE),
+        }
+    
+    base_dirs = default_base_dirs()
+    logger.info(f"Attempting to find data files in the following paths: {base_dirs}")
+    model_path = find_data_file(artifacts.MODEL_FILE, base_dirs)
+    directory = os.path.dirname(model_path) if model_path else None
+    
+    def sibling(*filenames):
+        for filename in filenames:
+            path = os.path.join(directory, filename) if directory else None
+            if path and os.path.exists(path):
+                return path
+        return None
+    
+    return None, {
+        'model': model_path,
+        'student_vectors': sibling(artifacts.STUDENT_VECTORS_FILE),
+        # Shipped with a space in the name; a build installed over it (build_artifacts --install) wins
+        'club_vectors': sibling(artifacts.CLUB_VECTORS_FILE, 'club_vectors .npz'),
+        'vectorizer': sibling(artifacts.VECTORIZER_FILE),
+    }
+
+
+# Attribute weights of content-based scoring
+CBF_WEIGHTS = {
+    'category_match': 3.0,    # Highest weight for category matching
+    'description_match': 2.0, # Description matching
+    'name_match': 1.5,        # Name matching
+    'course_match': 1.0       # Course matching
+}
+
+# Clubs each hybrid candidate generator may nominate, when RECOMMENDER_CANDIDATE_BUDGETS is not set
+DEFAULT_CANDIDATE_BUDGETS = {'vector': 50, 'popularity': 20, 'category': 50, 'cf': 50}
+
+
 class ModelHandler:
     """
     Model handler for recommendation system using the trained hybrid model.
     """
     
-    def __init__(self):
-        """Initialize the model handler by loading the trained model and necessary data."""
-        # Set correct paths - try multiple possible paths
-        self.base_dirs = []
-        
-        # 1. Try Django settings
-        if hasattr(settings, 'BASE_DIR'):
-            self.base_dirs.append(settings.BASE_DIR)
-        
-        # 2. Try inferring from current file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        parent_dir = os.path.dirname(current_dir)
-        self.base_dirs.append(parent_dir)
-        self.base_dirs.append(os.path.dirname(parent_dir))
-        
-        # 3. Try using relative paths
-        self.base_dirs.append(os.path.join(os.getcwd(), 'campus_recommender'))
-        self.base_dirs.append(os.getcwd())
+    def __init__(self, version=None, use_inference_server=True):
+        """
+        Initialize the model handler by loading the trained model and necessary data.
         
-        # Log the directories being searched
-        logger.info(f"Attempting to find data files in the following paths: {self.base_dirs}")
+        Args:
+            version: Artifact version to load (default: the CURRENT one, else the data directory files)
+            use_inference_server: Hand model and vector work to RECOMMENDER_INFERENCE_SOCKET if set
+                (False for the handler the inference server itself runs on)
+        """
+        self.base_dirs = default_base_dirs()
         
         # Find model files
-        self.model_path = self._find_file('hybrid_recommendation_model.keras')
-        self.student_vectors_path = self._find_file('student_vectors.npz')
-        self.club_vectors_path = self._find_file('club_vectors.npz') or self._find_file('club_vectors .npz')  # Note the space
-        self.vectorizer_path = self._find_file('vectorizer.pkl')
+        self.artifact_version, paths = artifact_paths(version)
+        paths = {name: path if path and os.path.exists(path) else None for name, path in paths.items()}
+        self.model_path = paths['model']
+        self.student_vectors_path = paths['student_vectors']
+        self.club_vectors_path = paths['club_vectors']
+        self.vectorizer_path = paths['vectorizer']
+        
+        # Version reported with every response: the artifact directory, or the model file's timestamp
+        if self.artifact_version:
+            self.version = self.artifact_version
+        elif self.model_path:
+            self.version = time.strftime('%Y%m%d-%H%M%S', time.gmtime(os.path.getmtime(self.model_path)))
+        else:
+            self.version = None
         
-        logger.info(f"Found file paths:")
+        logger.info(f"Found file paths (version {self.version}):")
         logger.info(f"Model file: {self.model_path}")
         logger.info(f"Student vectors: {self.student_vectors_path}")
         logger.info(f"Club vectors: {self.club_vectors_path}")
         logger.info(f"Vectorizer: {self.vectorizer_path}")
         
-        # Create index mappings
-        self.student_id_mapping = {}
-        self.club_id_mapping = {}
+        # Index mappings: NumPy arrays indexed by primary key holding the vector row (-1 = no vector),
+        # plus the reverse club mapping from vector row to primary key
+        self.student_index_by_pk = np.full(0, -1, dtype=np.int64)
+        self.club_index_by_pk = np.full(0, -1, dtype=np.int64)
+        self.club_pk_by_index = np.full(0, -1, dtype=np.int64)
         
         # Load model and data
         self.model = None
         self.student_vectors = None
         self.club_vectors = None
         self.vectorizer = None
+        self.embedding_service = None
+        self.loaded = False
+        
+        # Requests using this handler; a replaced handler is closed once they have finished
+        self.in_flight = 0
+        self._artifact_labels = []
+        
+        # Hybrid stage execution: concurrent on a bounded thread pool, within a latency budget
+        self.concurrent_stages = getattr(settings, 'RECOMMENDER_CONCURRENT_HYBRID', False)
+        self.hybrid_budget_ms = getattr(settings, 'RECOMMENDER_HYBRID_BUDGET_MS', None)
+        self._stage_pool = None
+        
+        # Model scoring, vector similarity and vectorization through a shared inference server, if
+        # configured; the model, vectors and vectorizer are then only loaded in this process while
+        # the server is unavailable. Row counts of the server's vectors bound the ID mappings.
+        self.embedding_rows = None
+        self.vector_rows = None
+        self._model_lock = threading.Lock()
+        socket_path = getattr(settings, 'RECOMMENDER_INFERENCE_SOCKET', None) if use_inference_server else None
+        self.inference_client = InferenceClient(
+            socket_path, timeout=getattr(settings, 'RECOMMENDER_INFERENCE_TIMEOUT', 1.0),
+            versions=handler_versions(self)
+        ) if socket_path else None
         self._load_model_and_data()
         
         # Enable verbose output
@@ -68,29 +213,7 @@ class ModelHandler:
     
     def _find_file(self, filename):
         """Search for a file in multiple possible locations"""
-        for base_dir in self.base_dirs:
-            # Try data directory
-            data_path = os.path.join(base_dir, 'data', filename)
-            if os.path.exists(data_path):
-                return data_path
-                
-            # Try recommender/data directory
-            rec_data_path = os.path.join(base_dir, 'recommender', 'data', filename)
-            if os.path.exists(rec_data_path):
-                return rec_data_path
-                
-            # Try project root directory
-            root_path = os.path.join(base_dir, filename)
-            if os.path.exists(root_path):
-                return root_path
-        
-        # Last attempt: search in all subdirectories
-        for base_dir in self.base_dirs:
-            for root, dirs, files in os.walk(base_dir):
-                if filename in files:
-                    return os.path.join(root, filename)
-        
-        return None
+        return find_data_file(filename, self.base_dirs)
     
     def _load_model_and_data(self):
         """Load model and data files"""
@@ -110,244 +233,334 @@ class ModelHandler:
                 logger.error(f"Could not find necessary data files: {', '.join(missing)}")
                 return
             
-            # Load model
-            logger.info(f"Attempting to load model: {self.model_path}")
-            try:
-                self.model = tf.keras.models.load_model(self.model_path, compile=False)
-                logger.info("Model loaded successfully")
-            except Exception as e:
-                logger.error(f"Error loading model: {str(e)}", exc_info=True)
-                # Try loading with custom objects
-                try:
-                    logger.info("Attempting to load model with custom objects")
-                    self.model = tf.keras.models.load_model(
-                        self.model_path, 
-                        compile=False,
-                        custom_objects={'tf': tf}
-                    )
-                    logger.info("Model loaded successfully with custom objects")
-                except Exception as e2:
-                    logger.error(f"Second attempt to load model failed: {str(e2)}", exc_info=True)
-                    return
+            # A shared inference server holds the model, vectors and vectorizer; only the ID mappings
+            # are needed here
+            if self._connect_inference_server():
+                self._initialize_id_mappings()
+                self.loaded = True
+                logger.info("ID mappings loaded, model and vectors served by the inference server")
+                return
+            self._load_local()
+        except Exception as e:
+            logger.error(f"Error loading model or data: {str(e)}", exc_info=True)
+    
+    def _load_local(self):
+        """Load the model, vectors and vectorizer in this process; returns whether all of them loaded"""
+        try:
+            if self.model is None and not self._load_model():
+                return False
             
-            # Load student vectors
+            # Load student vectors (including rows vectorized online, if persisted)
             logger.info(f"Attempting to load student vectors: {self.student_vectors_path}")
             try:
-                self.student_vectors = load_npz(self.student_vectors_path).toarray()
+                load_start = time.perf_counter()
+                student_vectors_file = resolve_vectors_path(self.student_vectors_path)
+                self.student_vectors = load_npz(student_vectors_file).toarray()
+                self._record_artifact('student_vectors', student_vectors_file, load_start)
                 logger.info(f"Student vectors loaded successfully, shape: {self.student_vectors.shape}")
             except Exception as e:
                 logger.error(f"Error loading student vectors: {str(e)}", exc_info=True)
-                return
+                return False
             
             # Load club vectors
             logger.info(f"Attempting to load club vectors: {self.club_vectors_path}")
             try:
+                load_start = time.perf_counter()
                 self.club_vectors = load_npz(self.club_vectors_path).toarray()
+                self._record_artifact('club_vectors', self.club_vectors_path, load_start)
                 logger.info(f"Club vectors loaded successfully, shape: {self.club_vectors.shape}")
             except Exception as e:
                 logger.error(f"Error loading club vectors: {str(e)}", exc_info=True)
-                return
+                return False
             
             # Load vectorizer
             logger.info(f"Attempting to load vectorizer: {self.vectorizer_path}")
             try:
+                load_start = time.perf_counter()
                 with open(self.vectorizer_path, 'rb') as f:
                     self.vectorizer = pickle.load(f)
+                self._record_artifact('vectorizer', self.vectorizer_path, load_start)
                 logger.info("Vectorizer loaded successfully")
             except Exception as e:
                 logger.error(f"Error loading vectorizer: {str(e)}", exc_info=True)
-                return
+                return False
             
             # Initialize ID mappings
             self._initialize_id_mappings()
+            
+            # Vectorize new and edited students online with the loaded vectorizer
+            self._start_embedding_service()
+            self.loaded = True
             logger.info("All data loaded successfully")
+            return True
         except Exception as e:
             logger.error(f"Error loading model or data: {str(e)}", exc_info=True)
+            return False
+    
+    def _load_model(self):
+        """Load the Keras model in this process; returns whether it loaded"""
+        # Imported here so web workers using the inference server never import TensorFlow
+        import tensorflow as tf
+        logger.info(f"Attempting to load model: {self.model_path}")
+        try:
+            load_start = time.perf_counter()
+            self.model = tf.keras.models.load_model(self.model_path, compile=False)
+            self._record_artifact('model', self.model_path, load_start)
+            logger.info("Model loaded successfully")
+        except Exception as e:
+            logger.error(f"Error loading model: {str(e)}", exc_info=True)
+            # Try loading with custom objects
+            try:
+                logger.info("Attempting to load model with custom objects")
+                self.model = tf.keras.models.load_model(
+                    self.model_path, 
+                    compile=False,
+                    custom_objects={'tf': tf}
+                )
+                logger.info("Model loaded successfully with custom objects")
+            except Exception as e2:
+                logger.error(f"Second attempt to load model failed: {str(e2)}", exc_info=True)
+                return False
+        self.embedding_rows = {
+            name: self.model.get_layer(name).input_dim for name in ('student_embedding', 'club_embedding')
+        }
+        return True
+    
+    def _connect_inference_server(self):
+        """Use the inference server for model and vector work if one is configured and healthy"""
+        if self.inference_client is None:
+            return False
+        health = self.inference_client.health()
+        if health is None:
+            logger.warning(f"Inference server {self.inference_client.socket_path} is down, loading the model and vectors in-process")
+            return False
+        if health['versions'] != self.inference_client.versions:
+            # Score requests are refused until the server serves this handler's versions again
+            logger.warning(f"Inference server serves {health['versions']}, not {self.inference_client.versions}; loading the model and vectors in-process")
+            return False
+        self.embedding_rows = health['embedding_rows']
+        self.vector_rows = {'student': health['student_vectors'], 'club': health['club_vectors']}
+        logger.info(f"Using inference server {self.inference_client.socket_path} (model version {health['model_version']})")
+        return True
+    
+    def _ensure_local(self):
+        """Load the model, vectors and vectorizer in-process on first use, for work while the inference server is down"""
+        if self.embedding_service is None:
+            with self._model_lock:
+                if self.embedding_service is None:
+                    self._load_local()
+        return self.embedding_service is not None
+    
+    def _record_artifact(self, artifact, path, load_start):
+        """Export the load time and version (file modification time) of a loaded artifact"""
+        metrics.ARTIFACT_LOAD_SECONDS.set(round(time.perf_counter() - load_start, 4), artifact=artifact)
+        version = self.artifact_version or time.strftime('%Y%m%d-%H%M%S', time.gmtime(os.path.getmtime(path)))
+        labels = {'artifact': artifact, 'file': os.path.basename(path), 'version': version}
+        metrics.ARTIFACT_INFO.set(1, **labels)
+        self._artifact_labels.append(labels)
     
     def _initialize_id_mappings(self):
-        """Initialize ID mappings to resolve index alignment issues"""
+        """
+        Load the persisted primary key -> vector row mappings.
+        
+        The vector_index columns are written when the artifacts are generated or imported,
+        so this is a single indexed query per table instead of guessing from row order.
+        """
         try:
-            # Create student ID to vector index mapping
-            students = Student.objects.all()
-            for i, student in enumerate(students):
-                if i < len(self.student_vectors):
-                    self.student_id_mapping[student.id] = i
-            
-            # Create club ID to vector index mapping
-            clubs = Club.objects.all()
-            for i, club in enumerate(clubs):
-                if i < len(self.club_vectors):
-                    self.club_id_mapping[club.id] = i
-            
-            logger.info(f"ID mappings initialized: {len(self.student_id_mapping)} students, {len(self.club_id_mapping)} clubs")
+            num_student_vectors, num_club_vectors = self._vector_row_counts()
+            self.student_index_by_pk = self._build_index_array(
+                Student.objects.filter(vector_index__isnull=False).values_list('id', 'vector_index'),
+                num_student_vectors
+            )
+            club_rows = list(Club.objects.filter(vector_index__isnull=False).values_list('id', 'vector_index'))
+            self.club_index_by_pk = self._build_index_array(club_rows, num_club_vectors)
+            
+            # Reverse mapping used to turn vector similarity results back into clubs
+            self.club_pk_by_index = np.full(num_club_vectors, -1, dtype=np.int64)
+            for pk, vector_index in club_rows:
+                if vector_index < num_club_vectors:
+                    self.club_pk_by_index[vector_index] = pk
+            
+            num_students = int((self.student_index_by_pk >= 0).sum())
+            num_clubs = int((self.club_index_by_pk >= 0).sum())
+            logger.info(f"ID mappings initialized: {num_students} students, {num_clubs} clubs")
+            if num_students == 0 or num_clubs == 0:
+                logger.warning("No vector indexes found in the database; run the import_training_data command to map rows to vectors")
         except Exception as e:
             logger.error(f"Error initializing ID mappings: {str(e)}", exc_info=True)
-
+    
+    def _vector_row_counts(self):
+        """
+        Student and club vector rows the ID mappings may point at.
+        
+        Returns:
+            (students, clubs); students is None while the inference server holds the vectors,
+            since its store grows as it vectorizes new students
+        """
+        if self.vector_rows is not None:
+            return None, self.vector_rows['club']
+        return len(self.student_vectors), len(self.club_vectors)
+    
+    @staticmethod
+    def _build_index_array(rows, num_vectors):
+        """Build a pk-indexed array of vector rows from (pk, vector_index) pairs (num_vectors None: no bound)"""
+        rows = [(pk, vector_index) for pk, vector_index in rows if num_vectors is None or vector_index < num_vectors]
+        max_pk = max((pk for pk, _ in rows), default=-1)
+        index_by_pk = np.full(max_pk + 1, -1, dtype=np.int64)
+        if rows:
+            pks, vector_indexes = zip(*rows)
+            index_by_pk[list(pks)] = vector_indexes
+        return index_by_pk
+    
+    def _start_embedding_service(self):
+        """Create the online student embedding service on top of the loaded vectors"""
+        if self.embedding_service is not None:
+            self.embedding_service.stop()
+        
+        # The model's ID embedding only covers the students it was trained with
+        num_trained_rows = (self.embedding_rows or {}).get('student_embedding', len(self.student_vectors))
+        
+        store = VectorStore(self.student_vectors)
+        self.student_vectors = store.vectors
+        self.embedding_service = StudentEmbeddingService(
+            self, self.vectorizer, store, self.student_vectors_path, num_trained_rows
+        )
+        self.embedding_service.start()
+    
+    def on_student_vectors_updated(self, vectors, mappings):
+        """Called by the embedding service after rows were added or rewritten"""
+        self.student_vectors = vectors
+        self._map_students(mappings)
+    
+    def _map_students(self, mappings):
+        """Record (pk, vector_index) pairs in the student mapping, growing it as needed"""
+        max_pk = max((pk for pk, _ in mappings), default=-1)
+        if max_pk >= len(self.student_index_by_pk):
+            grown = np.full(max(max_pk + 1, 2 * len(self.student_index_by_pk)), -1, dtype=np.int64)
+            grown[:len(self.student_index_by_pk)] = self.student_index_by_pk
+            self.student_index_by_pk = grown
+        for pk, vector_index in mappings:
+            self.student_index_by_pk[pk] = vector_index
+    
+    def ensure_student_vector_index(self, student):
+        """Like get_student_vector_index, but vectorizes the student on the fly if it has no row yet"""
+        vector_index = self.get_student_vector_index(student)
+        metrics.CACHE_REQUESTS.inc(cache='student_vector', result='miss' if vector_index is None else 'hit')
+        if vector_index is None and self.vector_rows is not None:
+            try:
+                vector_index = self.inference_client.vectorize(student.id)
+            except InferenceUnavailable:
+                metrics.FALLBACKS.inc(fallback='inference_server')
+                self._ensure_local()
+            else:
+                if vector_index is not None:
+                    self._map_students([(int(student.id), vector_index)])
+                return vector_index
+        if vector_index is None and self.embedding_service is not None:
+            try:
+                vector_index = self.embedding_service.vectorize(student)
+            except Exception as e:
+                logger.error(f"Error vectorizing student {student.id}: {str(e)}", exc_info=True)
+        return vector_index
+    
+    def get_student_embedding_index(self, vector_index):
+        """Row of the model's student embedding to use for a student vector row"""
+        if self.embedding_service is None:
+            return vector_index
+        return self.embedding_service.embedding_index(vector_index)
+    
     def refresh_id_mappings(self):
         """Refresh ID mappings to ensure they're current with the database"""
         self._initialize_id_mappings()
     
+    def get_student_vector_index(self, student):
+        """Return the student's row in student_vectors, or None if the student has no vector"""
+        # The loaded mapping first: while another artifact version is being activated, the
+        # vector_index column may already refer to the new version's rows
+        vector_index = None
+        pk = int(student.id)
+        if pk < len(self.student_index_by_pk) and self.student_index_by_pk[pk] >= 0:
+            vector_index = int(self.student_index_by_pk[pk])
+        if vector_index is None:
+            vector_index = getattr(student, 'vector_index', None)
+        if vector_index is None:
+            return None
+        # Rows held by the inference server are checked there
+        if self.vector_rows is None and (self.student_vectors is None or vector_index >= len(self.student_vectors)):
+            return None
+        return int(vector_index)
+    
+    def get_club_vector_indexes(self, club_ids):
+        """Vectorized lookup of club vector rows; returns an int array with -1 for clubs without a vector"""
+        club_ids = np.asarray(club_ids, dtype=np.int64)
+        result = np.full(len(club_ids), -1, dtype=np.int64)
+        in_range = club_ids < len(self.club_index_by_pk)
+        result[in_range] = self.club_index_by_pk[club_ids[in_range]]
+        return result
+    
     def _print_terminal(self, message):
         """Print to terminal and log the message"""
         if self.verbose:
             print(message, flush=True)
         logger.info(message)
     
-    def get_hybrid_recommendations(self, student, top_n=5, cbf_weight=0.4):
+    @tracing.traced('hybrid')
+    def get_hybrid_recommendations(self, student, top_n=5, cbf_weight=0.4, budget_ms=None):
         """
-        Improved hybrid recommendation method that better integrates content and collaborative filtering results.
+        Two-stage hybrid recommendations: cheap candidate generators each nominate a bounded set of
+        clubs, then one batched re-ranker scores only those candidates.
         
         Args:
             student: Student object
             top_n: Number of recommendations to return
             cbf_weight: Weight for content-based filtering (0-1)
+            budget_ms: Latency budget for candidate generation (default RECOMMENDER_HYBRID_BUDGET_MS);
+                generators that miss it are left out of the merge
             
         Returns:
-            List of dictionaries with club_id and score
+            List of dictionaries with club_id, score and the sources (candidate generators and
+            model) behind each recommendation
         """
         self._print_terminal(f"Getting hybrid recommendations for student {student.id}")
         self._print_terminal(f"Hybrid: Starting hybrid recommendations for student PK {student.id}, Student ID {student.student_id}")
         
-        if self.model is None:
+        if self.embedding_rows is None:
             self._print_terminal("Model not loaded, unable to provide hybrid model recommendations")
             # Attempt to reload model
             self._load_model_and_data()
             
             # If model still not loaded, use simplified hybrid recommendations
-            if self.model is None:
+            if self.embedding_rows is None:
                 self._print_terminal("Model reload failed, using simplified hybrid recommendation method")
                 return self._get_simplified_hybrid_recommendations(student, top_n, cbf_weight)
         
+        budget_ms = self.hybrid_budget_ms if budget_ms is None else budget_ms
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+        
         try:
-            # Get student index using mapping
-            student_id = self.student_id_mapping.get(student.id)
-            if student_id is None:
-                self._print_terminal(f"WARNING:recommender.model_handler:Student ID {student.student_id} (PK {student.id}) not found in student_id_map. Falling back to attribute-based matching.")
-                # Fallback to simple indexing
-                student_id = min(int(student.id) - 1, len(self.student_vectors) - 1)
-                if student_id < 0:
-                    student_id = 0
-            
-            # Get content-based recommendations
-            cbf_recommendations = self.get_content_based_recommendations(student, top_n)
-            self._print_terminal(f"Hybrid: Got {len(cbf_recommendations)} content-based recommendations: {cbf_recommendations}")
+            vector_index = self._model_stage(student)
+            interacted = set(Interaction.objects.filter(student=student).values_list('club_id', flat=True))
             
-            # Get collaborative filtering recommendations
-            cf_recommendations = self.get_collaborative_recommendations(student, top_n)
-            self._print_terminal(f"Hybrid: Got {len(cf_recommendations)} collaborative filtering recommendations: {cf_recommendations}")
-            
-            # Get all clubs
-            clubs = list(Club.objects.all())
-            num_clubs = len(clubs)
-            if num_clubs == 0:
-                self._print_terminal("No clubs found in database, unable to provide recommendations")
-                return []
+            # Stage 1: candidate generation, concurrently or one generator after another
+            generators = self._candidate_generators(student, vector_index, interacted, top_n)
+            if self.concurrent_stages:
+                candidates = self._generate_candidates_concurrently(generators, deadline)
+            else:
+                candidates = self._generate_candidates(generators, deadline)
+            missed = sorted(set(generators) - set(candidates))
+            if missed:
+                metrics.FALLBACKS.inc(fallback='hybrid_partial')
+                self._print_terminal(f"Hybrid: Generators {missed} missed the {budget_ms}ms budget or failed; merging {sorted(candidates)}")
+            for name, nominated in candidates.items():
+                metrics.CANDIDATES.observe(len(nominated), generator=name)
+                self._print_terminal(f"Hybrid: {name} nominated {len(nominated)} clubs: {list(nominated)}")
             
-            # Ensure data dimensions match
-            num_clubs_to_use = min(num_clubs, len(self.club_vectors)) if self.club_vectors is not None else num_clubs
-            
-            # Prepare hybrid recommendation results
-            # Identify all unique club IDs from recommendations
-            unique_club_ids = set()
-            for rec in cbf_recommendations:
-                unique_club_ids.add(rec['club_id'])
-            for rec in cf_recommendations:
-                unique_club_ids.add(rec['club_id'])
-            
-            self._print_terminal(f"Hybrid: Found {len(unique_club_ids)} unique clubs to evaluate for hybrid scoring.")
-            
-            # Calculate hybrid scores for each recommended club
-            cbf_scores = {rec['club_id']: rec['score'] for rec in cbf_recommendations}
-            cf_scores = {rec['club_id']: rec['score'] for rec in cf_recommendations}
-            
-            # Normalize scores
-            if cbf_scores:
-                cbf_max = max(cbf_scores.values())
-                if cbf_max > 0:
-                    for club_id in cbf_scores:
-                        cbf_scores[club_id] /= cbf_max  # Normalize CBF scores
-            
-            if cf_scores:
-                cf_max = max(cf_scores.values()) 
-                if cf_max > 0:
-                    for club_id in cf_scores:
-                        cf_scores[club_id] /= cf_max  # Normalize CF scores
-            
-            # Log normalized scores
-            self._print_terminal(f"Hybrid: Normalized CBF scores: {cbf_scores}")
-            self._print_terminal(f"Hybrid: Normalized CF scores: {cf_scores}")
-            
-            # Dynamically adjust weights - increase CBF weight if CF recommendations are few; favor CF if sufficient
-            adjusted_cbf_weight = cbf_weight
-            if len(cf_recommendations) < 2:
-                adjusted_cbf_weight = min(0.8, cbf_weight + 0.3)
-                self._print_terminal(f"Hybrid: Adjusting CBF weight from {cbf_weight} to {adjusted_cbf_weight} due to few CF recommendations")
-            elif len(cf_recommendations) >= top_n:
-                adjusted_cbf_weight = max(0.2, cbf_weight - 0.1)
-                self._print_terminal(f"Hybrid: Adjusting CBF weight from {cbf_weight} to {adjusted_cbf_weight} to favor CF recommendations")
-            
-            # Calculate final hybrid scores
-            hybrid_scores = {}
-            for club_id in unique_club_ids:
-                norm_cbf = cbf_scores.get(club_id, 0.0)
-                norm_cf = cf_scores.get(club_id, 0.0)
-                
-                # Adjust with model prediction if available
-                model_score = 0.0
-                if self.model is not None and student_id is not None and club_id in self.club_id_mapping:
-                    club_idx = self.club_id_mapping.get(club_id)
-                    if club_idx is not None and self.student_vectors is not None and self.club_vectors is not None:
-                        try:
-                            # Prepare input data for single prediction
-                            student_vec = np.tile(self.student_vectors[student_id], (1, 1))
-                            club_vec = self.club_vectors[club_idx].reshape(1, -1)
-                            student_idx = np.array([[student_id]])
-                            club_idx_arr = np.array([[club_idx]])
-                            
-                            single_input = {
-                                "student_vector": student_vec,
-                                "club_vector": club_vec,
-                                "student_idx": student_idx,
-                                "club_idx": club_idx_arr
-                            }
-                            
-                            # Get model prediction
-                            pred_score = self.model.predict(single_input, verbose=0)[0][0]
-                            model_score = float(pred_score)
-                        except Exception as e:
-                            logger.error(f"Error predicting score for single club: {str(e)}", exc_info=True)
-                
-                # Calculate weighted average score
-                if model_score > 0:
-                    # Use model score to adjust final score
-                    final_score = (adjusted_cbf_weight * norm_cbf + 
-                                  (1 - adjusted_cbf_weight) * norm_cf + 
-                                  model_score) / 2
-                else:
-                    # Use only CBF and CF scores
-                    final_score = adjusted_cbf_weight * norm_cbf + (1 - adjusted_cbf_weight) * norm_cf
-                
-                hybrid_scores[club_id] = final_score
-                
-                club_name = next((club.name for club in clubs if club.id == club_id), f"Club {club_id}")
-                self._print_terminal(f"Hybrid: Club {club_id} - NormCBF: {norm_cbf:.2f}, NormCF: {norm_cf:.2f}, ModelScore: {model_score:.2f}, WeightCBF: {adjusted_cbf_weight:.1f}, FinalHybrid: {final_score:.2f}")
-            
-            # Sort and select top_n recommendations
-            sorted_clubs = sorted(hybrid_scores.items(), key=lambda x: x[1], reverse=True)[:top_n]
-            
-            # Create recommendation list
-            recommendations = []
-            for club_id, score in sorted_clubs:
-                club = next((c for c in clubs if c.id == club_id), None)
-                if club:
-                    recommendations.append({
-                        'club_id': club_id,
-                        'score': score,
-                        'type': 'hybrid',
-                        'club_name': club.name,
-                        'club_category': club.category
-                    })
+            if not any(candidates.values()):
+                self._print_terminal("Hybrid: No candidates, using simplified hybrid recommendation method")
+                return self._get_simplified_hybrid_recommendations(student, top_n, cbf_weight)
             
+            # Stage 2: score only the candidates
+            recommendations = self._rerank(student, candidates, vector_index, top_n, cbf_weight)
             self._print_terminal(f"Final recommendations for student {student.id}: {recommendations}")
             return recommendations
         except Exception as e:
@@ -355,14 +568,383 @@ class ModelHandler:
             self._print_terminal(f"Hybrid: Error in model-based hybrid recommendations. Falling back to simplified hybrid method.")
             return self._get_simplified_hybrid_recommendations(student, top_n, cbf_weight)
     
+    def _model_stage(self, student):
+        """Student vector row for model scoring, vectorizing new students on the fly"""
+        with tracing.span('vector_index'):
+            vector_index = self.ensure_student_vector_index(student)
+        if vector_index is None:
+            self._print_terminal(f"WARNING:recommender.model_handler:Student ID {student.student_id} (PK {student.id}) has no vector row. Skipping model scoring.")
+        return vector_index
+    
+    def _candidate_generators(self, student, vector_index, interacted, top_n):
+        """
+        Candidate generators to run, cheapest first, each bound to its RECOMMENDER_CANDIDATE_BUDGETS
+        entry; generators with a budget of 0 are left out.
+        
+        Clubs the student already interacted with are only nominated by CF, which adds a few of
+        them (at most half of top_n) when it finds too few new clubs.
+        
+        Returns:
+            Dictionary of generator name to a callable returning {club_id: score}, best first
+        """
+        budgets = getattr(settings, 'RECOMMENDER_CANDIDATE_BUDGETS', DEFAULT_CANDIDATE_BUDGETS)
+        generators = {
+            'vector': lambda budget: self._vector_candidates(vector_index, budget, interacted),
+            'popularity': lambda budget: self._popularity_candidates(student, budget, interacted),
+            'category': lambda budget: self._category_candidates(student, budget, interacted),
+            'cf': lambda budget: self._collaborative_candidates(student, budget, interacted, top_n),
+        }
+        return {
+            name: functools.partial(self._run_generator, name, generate, budgets[name])
+            for name, generate in generators.items() if budgets.get(name, 0) > 0
+        }
+    
+    @staticmethod
+    def _run_generator(name, generate, budget):
+        # Timed as a request stage of its own (Server-Timing, stage latency metrics)
+        with timing.stage(name):
+            return generate(budget)
+    
+    def _generate_candidates(self, generators, deadline):
+        """Run the generators one after another; generators not started before the deadline are skipped"""
+        candidates = {}
+        for name, generate in generators.items():
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            try:
+                candidates[name] = generate()
+            except Exception as e:
+                logger.error(f"Candidate generator {name} failed: {str(e)}", exc_info=True)
+        return candidates
+    
+    def _generate_candidates_concurrently(self, generators, deadline):
+        """
+        Run the generators in parallel on the stage pool.
+        
+        Generators still running at the deadline are left out (they finish in the background). If
+        none finished in time, the first one to finish is used so the request still gets an answer.
+        """
+        pool = self._get_stage_pool()
+        futures = {
+            pool.submit(self._run_stage, contextvars.copy_context(), generate): name
+            for name, generate in generators.items()
+        }
+        timeout = max(deadline - time.perf_counter(), 0) if deadline is not None else None
+        done, _ = futures_wait(futures, timeout=timeout)
+        if not done:
+            done, _ = futures_wait(futures, return_when=FIRST_COMPLETED)
+        
+        candidates = {}
+        for future in done:
+            try:
+                candidates[futures[future]] = future.result()
+            except Exception as e:
+                logger.error(f"Candidate generator {futures[future]} failed: {str(e)}", exc_info=True)
+        return candidates
+    
+    def _vector_candidates(self, vector_index, budget, exclude=()):
+        """Clubs whose vectors are most similar to the student's, from one matrix-vector product"""
+        if vector_index is None or not self.loaded:
+            return {}
+        mapped = self.club_pk_by_index >= 0
+        if exclude:
+            mapped &= ~np.isin(self.club_pk_by_index, np.fromiter(exclude, dtype=np.int64))
+        mapped_rows = np.flatnonzero(mapped)
+        if len(mapped_rows) == 0:
+            return {}
+        # No in-process load within the candidate budget; scoring loads the vectors if the server is down
+        similarities = self._club_similarities(vector_index, load=False)
+        if similarities is None:
+            return {}
+        similarities = similarities[mapped_rows]
+        # Partial selection of the budget, then a sort of just those rows
+        if len(mapped_rows) > budget:
+            top = np.argpartition(-similarities, budget - 1)[:budget]
+        else:
+            top = np.arange(len(mapped_rows))
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        # Clubs sharing no terms with the student are no evidence of a match
+        top = top[similarities[top] > 0]
+        return dict(zip(self.club_pk_by_index[mapped_rows[top]].tolist(), similarities[top].astype(float).tolist()))
+    
+    def _popularity_candidates(self, student, budget, exclude=()):
+        """Trending clubs in the student's course, filled up with trending clubs overall"""
+        recommendations = self._popular_recommendations(student, budget, 'trending', exclude=exclude) or []
+        # The overall ranking fills up with clubs nobody joined; those are no candidates
+        return {rec['club_id']: rec['score'] for rec in recommendations if rec['score'] > 0}
+    
+    def _category_candidates(self, student, budget, exclude=()):
+        """
+        Clubs of the categories the student's hobbies, interests, skills or course match, directly
+        (weight 1.0) or through profiles.CATEGORY_MAPPING (0.8); the most popular clubs of each category first.
+        """
+        profile = profiles.get_profile(student)
+        if not profile.terms:
+            return {}
+        table = popularity.get_popularity_table()
+        if table is not None:
+            categories = list(table.categories)
+        else:
+            categories = list(Club.objects.values_list('category', flat=True).distinct())
+        matches = profiles.matching_categories(profile, categories)
+        if not matches:
+            return {}
+        
+        candidates = {}
+        if table is not None:
+            per_category = max(budget // len(matches), 1)
+            for category, weight in sorted(matches.items(), key=lambda item: item[1], reverse=True):
+                for club_id, _, _ in table.top(per_category, course=student.course, category=category, exclude=exclude):
+                    candidates.setdefault(club_id, weight)
+        else:
+            clubs = (
+                Club.objects.filter(category__in=list(matches)).exclude(id__in=exclude)
+                .values_list('id', 'category')[:budget]
+            )
+            candidates = {club_id: matches[category] for club_id, category in clubs}
+        ranked = sorted(candidates.items(), key=lambda item: item[1], reverse=True)[:budget]
+        return dict(ranked)
+    
+    def _collaborative_candidates(self, student, budget, interacted, top_n, top_k_users=20):
+        """
+        Clubs of the students sharing the most clubs with this one, scored by the share of those
+        neighbours that interacted with them; the count query stops at the budget.
+        """
+        if not interacted:
+            return {}
+        with tracing.span('cf_similar_students'):
+            neighbours = list(
+                Interaction.objects.filter(club_id__in=interacted).exclude(student_id=student.id)
+                .values('student_id').annotate(overlap_count=Count('club_id', distinct=True))
+                .order_by('-overlap_count').values_list('student_id', flat=True)[:top_k_users]
+            )
+        if not neighbours:
+            return {}
+        with tracing.span('cf_club_counts'):
+            counts = list(
+                Interaction.objects.filter(student_id__in=neighbours).values('club_id')
+                .annotate(interaction_count=Count('student_id', distinct=True))
+                .order_by('-interaction_count').values_list('club_id', 'interaction_count')[:budget + len(interacted)]
+            )
+        # New clubs first; as in CF, known clubs fill up to half of top_n when there are too few
+        new = [(club_id, count) for club_id, count in counts if club_id not in interacted]
+        known = [(club_id, count) for club_id, count in counts if club_id in interacted]
+        ranked = new[:budget]
+        if len(new) < top_n:
+            ranked += known[:min(top_n - len(new), top_n // 2)]
+        return {club_id: count / len(neighbours) for club_id, count in ranked}
+    
+    def _rerank(self, student, candidates, vector_index, top_n, cbf_weight):
+        """
+        Score the merged candidates in one pass: content scores on the candidate clubs only, the CF
+        scores from generation, and one batched model call, blended as before.
+        
+        Args:
+            candidates: Dictionary of generator name to {club_id: score}, best first
+            vector_index: The student's vector row, None to skip model scoring
+            
+        Returns:
+            top_n recommendation dictionaries
+        """
+        # Round-robin over the generators so each keeps its best candidates under the cap
+        max_candidates = getattr(settings, 'RECOMMENDER_RERANK_MAX_CANDIDATES', 150)
+        sources = {}
+        iterators = [iter(nominated) for nominated in candidates.values()]
+        while iterators and len(sources) < max_candidates:
+            for iterator in list(iterators):
+                club_id = next(iterator, None)
+                if club_id is None:
+                    iterators.remove(iterator)
+                elif len(sources) < max_candidates:
+                    sources.setdefault(club_id, set())
+        for name, nominated in candidates.items():
+            for club_id in nominated:
+                if club_id in sources:
+                    sources[club_id].add(name)
+        metrics.CANDIDATES.observe(len(sources), generator='merged')
+        
+        with tracing.span('clubs_query'):
+            clubs = Club.objects.only('id', 'name', 'category', 'description').in_bulk(list(sources))
+        if not clubs:
+            self._print_terminal("No clubs found in database, unable to provide recommendations")
+            return []
+        
+        with timing.stage('cbf'):
+            cbf_scores = {club.id: score for club, score in self._content_scores(student, clubs.values(), log=False)}
+        cf_scores = dict(candidates.get('cf', {}))
+        model_scores = self._predict_scores(vector_index, list(clubs)) if vector_index is not None else {}
+        
+        # Normalize scores
+        for scores in (cbf_scores, cf_scores):
+            best = max(scores.values(), default=0.0)
+            if best > 0:
+                for club_id in scores:
+                    scores[club_id] /= best
+        
+        # Lean on CBF when CF has little to say, on CF when it covers the whole list. Judged on the
+        # top_n CF results, as CF recommendations were requested, not on its whole candidate budget
+        cf_results = min(len(cf_scores), top_n)
+        adjusted_cbf_weight = cbf_weight
+        if cf_results < 2:
+            adjusted_cbf_weight = min(0.8, cbf_weight + 0.3)
+        elif cf_results >= top_n:
+            adjusted_cbf_weight = max(0.2, cbf_weight - 0.1)
+        
+        hybrid_scores = {}
+        for club_id in clubs:
+            blend = adjusted_cbf_weight * cbf_scores.get(club_id, 0.0) + (1 - adjusted_cbf_weight) * cf_scores.get(club_id, 0.0)
+            model_score = model_scores.get(club_id, 0.0)
+            # The model score, where there is one, counts as much as the CBF/CF blend
+            hybrid_scores[club_id] = (blend + model_score) / 2 if model_score > 0 else blend
+        
+        recommendations = []
+        for club_id, score in sorted(hybrid_scores.items(), key=lambda item: item[1], reverse=True)[:top_n]:
+            club = clubs[club_id]
+            club_sources = sources[club_id] | ({'model'} if model_scores.get(club_id, 0.0) > 0 else set())
+            recommendations.append({
+                'club_id': club_id,
+                'score': score,
+                'type': 'hybrid',
+                'club_name': club.name,
+                'club_category': club.category,
+                'sources': sorted(club_sources)
+            })
+        return recommendations
+    
+    @staticmethod
+    def _run_stage(context, func, *args):
+        """Run a stage in a pool thread with the request's timing and tracing context"""
+        def run():
+            try:
+                with timing.track_queries():
+                    return func(*args)
+            finally:
+                # Pool threads outlive requests; drop their connections once past CONN_MAX_AGE
+                close_old_connections()
+        return context.run(run)
+    
+    def _get_stage_pool(self):
+        if self._stage_pool is None:
+            self._stage_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RECOMMENDER_STAGE_WORKERS', 4),
+                thread_name_prefix='hybrid-stage'
+            )
+        return self._stage_pool
+    
+    def release(self):
+        """Give back a handler obtained with acquire_model_handler"""
+        with _handler_lock:
+            self.in_flight -= 1
+    
+    def close(self):
+        """Stop background work and drop the loaded artifacts (after the handler was replaced)"""
+        if self.embedding_service is not None:
+            self.embedding_service.stop()
+            try:
+                self.embedding_service.persist()
+            except Exception as e:
+                logger.error(f"Error persisting student vectors of version {self.version}: {str(e)}", exc_info=True)
+        if self._stage_pool is not None:
+            self._stage_pool.shutdown(wait=False)
+        for labels in self._artifact_labels:
+            metrics.ARTIFACT_INFO.set(0, **labels)
+        self.model = self.student_vectors = self.club_vectors = self.vectorizer = None
+        logger.info(f"Released model version {self.version}")
+    
+    def _predict_scores(self, vector_index, club_ids):
+        """
+        Model scores for a student and a list of clubs, in one batched call.
+        
+        Args:
+            vector_index: The student's vector row
+            club_ids: Club primary keys; clubs without a vector row (or outside the model's
+                club embedding) are left out
+            
+        Returns:
+            Dictionary mapping club_id to score
+        """
+        if self.embedding_rows is None or not self.loaded:
+            return {}
+        club_ids = np.asarray(club_ids, dtype=np.int64)
+        rows = self.get_club_vector_indexes(club_ids)
+        usable = (rows >= 0) & (rows < self.embedding_rows['club_embedding'])
+        club_ids, rows = club_ids[usable], rows[usable]
+        if len(rows) == 0:
+            return {}
+        
+        try:
+            with timing.stage('model'):
+                predict_start = time.perf_counter()
+                scores = self._score_rows(vector_index, rows)
+                metrics.MODEL_LATENCY.observe(time.perf_counter() - predict_start)
+                metrics.MODEL_BATCH_SIZE.observe(len(rows))
+        except Exception as e:
+            logger.error(f"Error predicting club scores: {str(e)}", exc_info=True)
+            return {}
+        return dict(zip(club_ids.tolist(), scores.astype(float).tolist()))
+    
+    def _server_call(self, method, *args):
+        """
+        Call an InferenceClient method, or return None to do the work in-process.
+        
+        Only handlers connected to a server at load time use it; the others hold the vectors.
+        """
+        if self.vector_rows is None:
+            return None
+        try:
+            return getattr(self.inference_client, method)(*args)
+        except InferenceVersionMismatch as e:
+            # The server was restarted on other artifacts (or this handler was swapped)
+            logger.warning(f"{str(e)}; working in-process")
+            metrics.FALLBACKS.inc(fallback='inference_version')
+        except InferenceUnavailable:
+            metrics.FALLBACKS.inc(fallback='inference_server')
+        return None
+    
+    def _club_similarities(self, vector_index, load=True):
+        """
+        Similarity of a student vector row to every club vector row, on the inference server if possible.
+        
+        Args:
+            vector_index: The student's vector row
+            load: Load the vectors in-process if the server fails; if False, None is returned instead
+        """
+        similarities = self._server_call('similar', vector_index)
+        if similarities is not None:
+            return similarities
+        if not load and self.embedding_service is None:
+            return None
+        if not self._ensure_local():
+            raise RuntimeError('Vectors could not be loaded')
+        return self.club_vectors @ self.student_vectors[vector_index]
+    
+    def _score_rows(self, vector_index, rows):
+        """Model scores for a student vector row and club vector rows, on the inference server if possible"""
+        scores = self._server_call('score', vector_index, rows)
+        if scores is not None:
+            return scores
+        if not self._ensure_local():
+            raise RuntimeError('Model could not be loaded')
+        student_vector = self.student_vectors[vector_index]
+        student_idx = self.get_student_embedding_index(vector_index)
+        inputs = {
+            'student_vector': np.repeat(student_vector[np.newaxis, :], len(rows), axis=0),
+            'club_vector': self.club_vectors[rows],
+            'student_idx': np.full((len(rows), 1), student_idx),
+            'club_idx': rows.reshape(-1, 1),
+        }
+        return np.asarray(self.model(inputs, training=False)).reshape(-1)
+    
+    @tracing.traced('hybrid_simplified')
     def _get_simplified_hybrid_recommendations(self, student, top_n=5, cbf_weight=0.5):
         """
         Simplified hybrid recommendation method used when the primary hybrid method fails
         """
+        metrics.FALLBACKS.inc(fallback='simplified_hybrid')
         try:
-            # Get recommendations
-            cbf_recommendations = self.get_content_based_recommendations(student, top_n * 2)  # Get more recommendations for diversity
-            cf_recommendations = self.get_collaborative_recommendations(student, top_n * 2)
+            # Get recommendations; trending clubs fill up the list instead of asking both for more
+            cbf_recommendations = self.get_content_based_recommendations(student, top_n)
+            cf_recommendations = self.get_collaborative_recommendations(student, top_n)
             
             # Merge recommendations
             all_recommendations = {}
@@ -412,14 +994,81 @@ class ModelHandler:
             
             # Sort and return top_n recommendations
             sorted_recommendations = sorted(hybrid_scores, key=lambda x: x['score'], reverse=True)[:top_n]
+            if len(sorted_recommendations) < top_n:
+                trending = self._popular_recommendations(
+                    student, top_n - len(sorted_recommendations), 'hybrid-simplified-trending', exclude=set(all_recommendations)
+                )
+                # Scaled to rank below every CBF/CF match
+                floor = min((rec['score'] for rec in sorted_recommendations), default=1.0)
+                for rec in trending or []:
+                    rec['score'] *= floor
+                    sorted_recommendations.append(rec)
             self._print_terminal(f"Simplified hybrid recommendations for student {student.id}: {sorted_recommendations}")
             return sorted_recommendations
             
         except Exception as e:
             logger.error(f"Error in simplified hybrid recommendations: {str(e)}", exc_info=True)
-            self._print_terminal("Simplified hybrid recommendations failed, returning content-based recommendations only")
-            return self.get_content_based_recommendations(student, top_n)
+            self._print_terminal("Simplified hybrid recommendations failed, returning trending clubs")
+            return self._popular_recommendations(student, top_n, 'hybrid-simplified-trending') or self.get_content_based_recommendations(student, top_n)
     
+    def _popular_recommendations(self, student, top_n, rec_type, exclude=(), categories=()):
+        """
+        Trending clubs among students of the same course, from the precomputed popularity table.
+        
+        Args:
+            student: Student object
+            top_n: Number of recommendations to return
+            rec_type: Recommendation type to report
+            exclude: Club IDs to leave out
+            categories: Prefer clubs of these categories; other clubs only fill up the list
+            
+        Returns:
+            List of dictionaries with club_id and score (trending score relative to the best),
+            or None while the table is not built yet
+        """
+        table = popularity.get_popularity_table()
+        if table is None:
+            return None
+        with tracing.span('popularity'):
+            picks = []
+            for category in categories:
+                picks.extend(table.top(top_n, course=student.course, category=category, exclude=exclude))
+            picks = sorted(picks, key=lambda pick: (pick[1], pick[2]), reverse=True)
+            # Clubs nobody in the course interacted with are filled from the overall ranking
+            picks = [pick for pick in picks if pick[2] > 0][:top_n]
+            for course in (student.course, None):
+                if len(picks) < top_n:
+                    taken = set(exclude) | {club_id for club_id, _, _ in picks}
+                    more = table.top(top_n - len(picks), course=course, exclude=taken)
+                    picks.extend(pick for pick in more if pick[2] > 0 or course is None)
+        
+        # Scores relative to the best pick; popularity when nothing trended recently
+        column = 1 if any(pick[1] > 0 for pick in picks) else 2
+        best = max((pick[column] for pick in picks), default=0.0) or 1.0
+        recommendations = []
+        for pick in picks:
+            club_name, club_category = table.club_info(pick[0])
+            recommendations.append({
+                'club_id': pick[0],
+                'score': pick[column] / best,
+                'type': rec_type,
+                'club_name': club_name,
+                'club_category': club_category
+            })
+        return recommendations
+    
+    def _collaborative_fallback(self, student, top_n, exclude=(), categories=()):
+        """Trending clubs for students CF cannot serve; content-based until the popularity table is built"""
+        recommendations = self._popular_recommendations(student, top_n, 'collaborative-fallback', exclude, categories)
+        if recommendations:
+            self._print_terminal(f"CF: Returning {len(recommendations)} trending clubs: {recommendations}")
+            return recommendations
+        recommendations = self.get_content_based_recommendations(student, top_n)
+        for rec in recommendations:
+            rec['type'] = 'collaborative-fallback'
+        return recommendations
+    
+    @timing.timed('cbf')
     def get_content_based_recommendations(self, student, top_n=5):
         """
         Improved content-based recommendation algorithm using more precise matching of student attributes with clubs.
@@ -436,139 +1085,14 @@ class ModelHandler:
         
         try:
             # Get all clubs
-            clubs = list(Club.objects.all())
+            with tracing.span('clubs_query'):
+                clubs = list(Club.objects.all())
             if not clubs:
                 self._print_terminal("No clubs found in database, unable to provide recommendations")
                 return []
             
             self._print_terminal(f"CBF: Found {len(clubs)} clubs to evaluate")
-            
-            # Get student attributes
-            hobbies = student.hobbies if hasattr(student, 'hobbies') and student.hobbies else []
-            interests = student.interests if hasattr(student, 'interests') and student.interests else []
-            skills = student.skills if hasattr(student, 'skills') and student.skills else []
-            course = student.course if hasattr(student, 'course') else ''
-            
-            self._print_terminal(f"CBF: Student attributes - hobbies: {hobbies}, interests: {interests}, skills: {skills}, course: {course}")
-            
-            # Set weights for attributes
-            weights = {
-                'category_match': 3.0,    # Highest weight for category matching
-                'description_match': 2.0, # Description matching
-                'name_match': 1.5,        # Name matching
-                'course_match': 1.0       # Course matching
-            }
-            
-            # Define category mapping - map student interests to club categories
-            category_mapping = {
-                # Arts-related mapping
-                'arts': ['arts', 'creative', 'design', 'music', 'photography', 'film', 'drama', 'drawing', 'painting'],
-                'literature': ['literature', 'reading', 'writing', 'poetry', 'book', 'arts'],
-                'music': ['music', 'singing', 'choir', 'band', 'orchestra', 'arts'],
-                'photography': ['photography', 'camera', 'arts', 'visual'],
-                'design': ['design', 'graphic', 'arts', 'creative', 'visual'],
-                'drawing': ['drawing', 'sketch', 'arts', 'creative', 'visual'],
-                'painting': ['painting', 'arts', 'creative', 'visual'],
-                
-                # Academic-related mapping
-                'academics': ['academics', 'study', 'learning', 'education', 'research', 'science'],
-                'mathematics': ['mathematics', 'math', 'algebra', 'calculus', 'academics', 'science'],
-                'science': ['science', 'physics', 'chemistry', 'biology', 'academics', 'research'],
-                'technology': ['technology', 'computer', 'programming', 'coding', 'tech', 'it'],
-                'engineering': ['engineering', 'mechanics', 'electronics', 'design', 'technology'],
-                'programming': ['programming', 'coding', 'software', 'development', 'technology', 'computer', 'tech'],
-                
-                # Sports-related mapping
-                'sports': ['sports', 'athletic', 'fitness', 'exercise', 'team'],
-                'basketball': ['basketball', 'sports', 'team', 'athletic'],
-                'football': ['football', 'sports', 'team', 'athletic'],
-                'soccer': ['soccer', 'sports', 'team', 'athletic'],
-                'swimming': ['swimming', 'sports', 'athletic'],
-                'tennis': ['tennis', 'sports', 'athletic'],
-                'fitness': ['fitness', 'gym', 'health', 'exercise', 'sports'],
-                
-                # Community service-related mapping
-                'volunteer': ['volunteer', 'service', 'community', 'charity', 'helping'],
-                'environment': ['environment', 'nature', 'climate', 'sustainability', 'green'],
-                'social': ['social', 'community', 'networking', 'cultural', 'diversity'],
-                'leadership': ['leadership', 'management', 'organization', 'entrepreneurship'],
-                'business': ['business', 'entrepreneurship', 'finance', 'marketing', 'economics'],
-                
-                # Other categories
-                'gaming': ['gaming', 'games', 'video games', 'esports', 'entertainment'],
-                'food': ['food', 'cooking', 'culinary', 'baking', 'nutrition'],
-                'travel': ['travel', 'adventure', 'exploration', 'culture']
-            }
-            
-            # Flatten student interests and hobbies for easier matching
-            student_interests = []
-            for item in hobbies + interests + skills:
-                student_interests.append(item.lower())
-                
-            if course:
-                student_interests.append(course.lower())
-            
-            # Calculate relevance score for each club
-            club_scores = []
-            for club in clubs:
-                score = 0.0
-                
-                # 1. Category matching - match club category with student interests
-                if club.category:
-                    category_lower = club.category.lower()
-                    
-                    # Direct category matching
-                    for interest in student_interests:
-                        if interest == category_lower:
-                            score += weights['category_match']
-                            self._print_terminal(f"CBF: Direct category match for {club.name} with {interest} (+{weights['category_match']})")
-                            break
-                    
-                    # Indirect matching using category mapping
-                    for interest in student_interests:
-                        for category, related_terms in category_mapping.items():
-                            if interest in related_terms and category_lower in related_terms:
-                                score += weights['category_match'] * 0.8  # 80% of direct match weight
-                                self._print_terminal(f"CBF: Indirect category match for {club.name} via {interest} and {category} (+{weights['category_match'] * 0.8})")
-                                break
-                
-                # 2. Name matching - check if club name contains student interests
-                if club.name:
-                    name_lower = club.name.lower()
-                    for interest in student_interests:
-                        if interest in name_lower or name_lower in interest:
-                            score += weights['name_match']
-                            self._print_terminal(f"CBF: Name match for {club.name} with {interest} (+{weights['name_match']})")
-                            break
-                
-                # 3. Description matching - if description exists, check for student interests
-                if hasattr(club, 'description') and club.description:
-                    desc_lower = club.description.lower()
-                    for interest in student_interests:
-                        if interest in desc_lower:
-                            score += weights['description_match']
-                            self._print_terminal(f"CBF: Description match for {club.name} with {interest} (+{weights['description_match']})")
-                            break
-                
-                # 4. Course relevance - if club is related to student’s course
-                if course and hasattr(club, 'target_courses') and club.target_courses:
-                    if isinstance(club.target_courses, list):
-                        for target_course in club.target_courses:
-                            if course.lower() in target_course.lower():
-                                score += weights['course_match']
-                                self._print_terminal(f"CBF: Course match for {club.name} with {course} (+{weights['course_match']})")
-                                break
-                    elif isinstance(club.target_courses, str):
-                        if course.lower() in club.target_courses.lower():
-                            score += weights['course_match']
-                            self._print_terminal(f"CBF: Course match for {club.name} with {course} (+{weights['course_match']})")
-                
-                # Add base score to avoid zero scores
-                score = max(score, 0.01)
-                
-                # Save score
-                club_scores.append((club, score))
-                self._print_terminal(f"CBF: Club {club.name} (ID: {club.id}) final score: {score:.2f}")
+            club_scores = self._content_scores(student, clubs)
             
             # Sort and get top_n recommendations
             sorted_clubs = sorted(club_scores, key=lambda x: x[1], reverse=True)[:top_n]
@@ -592,44 +1116,119 @@ class ModelHandler:
             logger.error(f"Error generating content-based recommendations: {str(e)}", exc_info=True)
             
             # Fallback to vector similarity (if available)
-            if self.student_vectors is not None and self.club_vectors is not None:
+            if self.loaded:
                 try:
                     self._print_terminal("CBF: Error in attribute-based matching. Trying vector similarity as fallback.")
+                    metrics.FALLBACKS.inc(fallback='vector', reason='error')
                     return self._get_vector_based_recommendations(student, top_n)
                 except Exception as e2:
                     logger.error(f"Vector similarity fallback failed: {str(e2)}", exc_info=True)
             
         return [] 
     
+    def _content_scores(self, student, clubs, log=True):
+        """
+        Attribute-matching score of each club for a student (at least 0.01).
+        
+        Args:
+            student: Student object
+            clubs: Club objects to score (the whole catalog for CBF, candidates when re-ranking)
+            log: Print every match, as the CBF endpoint does
+            
+        Returns:
+            List of (club, score) tuples
+        """
+        log = log and self.verbose
+        weights = CBF_WEIGHTS
+        profile = profiles.get_profile(student)
+        course = profile.course
+        if log:
+            self._print_terminal(f"CBF: Student attributes - hobbies: {student.hobbies}, interests: {student.interests}, skills: {student.skills}, course: {student.course}")
+        
+        # Category matches per distinct category; the catalog has few of them
+        category_matches = {}
+        
+        # Calculate relevance score for each club
+        club_scores = []
+        for club in clubs:
+            score = 0.0
+            
+            # 1. Category matching - the category is one of the student's terms, or related to
+            # them through the category mapping (80% of the direct weight per related term)
+            if club.category:
+                matches = category_matches.get(club.category)
+                if matches is None:
+                    matches = category_matches[club.category] = profile.category_matches(club.category)
+                direct, related = matches
+                if direct:
+                    score += weights['category_match']
+                    if log:
+                        self._print_terminal(f"CBF: Direct category match for {club.name} (+{weights['category_match']})")
+                if related:
+                    score += weights['category_match'] * 0.8 * related
+                    if log:
+                        self._print_terminal(f"CBF: Indirect category match for {club.name} via {related} terms (+{weights['category_match'] * 0.8 * related})")
+            
+            # 2. Name matching - check if club name contains student interests
+            if club.name:
+                name_lower = club.name.lower()
+                interest = next((term for term in profile.terms if term in name_lower or name_lower in term), None)
+                if interest is not None:
+                    score += weights['name_match']
+                    if log:
+                        self._print_terminal(f"CBF: Name match for {club.name} with {interest} (+{weights['name_match']})")
+            
+            # 3. Description matching - if description exists, check for student interests
+            if hasattr(club, 'description') and club.description:
+                desc_lower = club.description.lower()
+                interest = next((term for term in profile.terms if term in desc_lower), None)
+                if interest is not None:
+                    score += weights['description_match']
+                    if log:
+                        self._print_terminal(f"CBF: Description match for {club.name} with {interest} (+{weights['description_match']})")
+            
+            # 4. Course relevance - if club is related to student’s course
+            if course and hasattr(club, 'target_courses') and club.target_courses:
+                target_courses = club.target_courses if isinstance(club.target_courses, list) else [club.target_courses]
+                if any(course in target_course.lower() for target_course in target_courses):
+                    score += weights['course_match']
+                    if log:
+                        self._print_terminal(f"CBF: Course match for {club.name} with {student.course} (+{weights['course_match']})")
+            
+            # Add base score to avoid zero scores
+            score = max(score, 0.01)
+            
+            # Save score
+            club_scores.append((club, score))
+            if log:
+                self._print_terminal(f"CBF: Club {club.name} (ID: {club.id}) final score: {score:.2f}")
+        return club_scores
+    
+    @tracing.traced('vector')
     def _get_vector_based_recommendations(self, student, top_n=5):
         """
         Helper method for recommendations using vector similarity
         """
-        # Get student index using mapping
-        student_id = self.student_id_mapping.get(student.id)
+        # Get student vector row from the persisted mapping, vectorizing new students on the fly
+        student_id = self.ensure_student_vector_index(student)
         if student_id is None:
-            # Fallback to simple indexing
-            student_id = min(int(student.id) - 1, len(self.student_vectors) - 1)
-            if student_id < 0:
-                student_id = 0
+            self._print_terminal(f"CBF Vector: Student PK {student.id} has no vector row, unable to compute similarity")
+            return []
         
         # Calculate cosine similarity
-        student_vec = self.student_vectors[student_id].reshape(1, -1)
-        similarities = np.dot(student_vec, self.club_vectors.T)[0]
-        
-        # Get all clubs
-        clubs = list(Club.objects.all())
+        similarities = self._club_similarities(student_id)
         
-        # Get recommended clubs
-        num_clubs = min(len(clubs), len(similarities))
-        top_indices = np.argsort(similarities[:num_clubs])[::-1][:top_n]
-        top_scores = similarities[top_indices]
+        # Only rank vector rows that belong to a club in the database
+        mapped_rows = np.flatnonzero(self.club_pk_by_index >= 0)
+        top_rows = mapped_rows[np.argsort(similarities[mapped_rows])[::-1][:top_n]]
+        clubs = Club.objects.in_bulk(self.club_pk_by_index[top_rows].tolist())
         
         # Create recommendation list
         recommendations = []
-        for idx, score in zip(top_indices, top_scores):
-            if idx < len(clubs):  # Ensure index is valid
-                club = clubs[idx]
+        for row in top_rows:
+            club = clubs.get(int(self.club_pk_by_index[row]))
+            if club:
+                score = similarities[row]
                 self._print_terminal(f"CBF Vector: Club {club.name} (ID: {club.id}) scored {score:.2f}")
                 recommendations.append({
                     'club_id': int(club.id),
@@ -641,6 +1240,7 @@ class ModelHandler:
         
         return recommendations
     
+    @timing.timed('cf')
     def get_collaborative_recommendations(self, student, top_n=5, top_k_users=20):
         """
         Improved collaborative filtering recommendation implementation.
@@ -657,9 +1257,6 @@ class ModelHandler:
         self._print_terminal(f"Hybrid: Getting collaborative filtering recommendations")
         self._print_terminal(f"CF: Starting collaborative filtering for student PK {student.id}, Student ID {student.student_id}")
 
-        # Refresh ID mappings to ensure they're current
-        self.refresh_id_mappings()
-
         try:
             # Get current student’s interactions (as a set for efficient lookup)
             student_interacted_club_ids = set(Interaction.objects.filter(
@@ -667,11 +1264,9 @@ class ModelHandler:
             ).values_list('club_id', flat=True))
             
             if not student_interacted_club_ids:
-                self._print_terminal(f"CF: Student {student.id} has no interactions. Using content-based as fallback.")
-                recommendations = self.get_content_based_recommendations(student, top_n)
-                for rec in recommendations:
-                    rec['type'] = 'collaborative-fallback'
-                return recommendations
+                self._print_terminal(f"CF: Student {student.id} has no interactions. Using trending clubs as fallback.")
+                metrics.FALLBACKS.inc(fallback='collaborative', reason='no_interactions')
+                return self._collaborative_fallback(student, top_n)
             
             interacted_clubs_details = Club.objects.filter(id__in=student_interacted_club_ids)
             student_interactions_log = [
@@ -679,37 +1274,42 @@ class ModelHandler:
             ]
             self._print_terminal(f"CF: Student PK {student.id} has interacted with (IDs: {student_interacted_club_ids}): {student_interactions_log}")
             
-            # Lower similarity requirement: consider users with at least one common interaction
-            similar_students_qs = Student.objects.filter(
-                interaction__club_id__in=student_interacted_club_ids
+            # Lower similarity requirement: consider users with at least one common interaction.
+            # Grouping interactions (not students) lets SQLite answer from the (club, student) index.
+            similar_students_qs = Interaction.objects.filter(
+                club_id__in=student_interacted_club_ids
             ).exclude(
-                id=student.id
+                student_id=student.id
+            ).values(
+                'student_id'
             ).annotate(
-                overlap_count=Count('interaction__club_id', filter=Q(interaction__club_id__in=student_interacted_club_ids), distinct=True)
-            ).filter(
-                overlap_count__gte=1  # At least one common interaction
+                overlap_count=Count('club_id', distinct=True)
             ).order_by('-overlap_count')[:top_k_users]
             
-            similar_student_pks = [s.id for s in similar_students_qs]
+            with tracing.span('cf_similar_students'):
+                similar_students = list(similar_students_qs)
+                similar_student_pks = [s['student_id'] for s in similar_students]
             
             if not similar_student_pks:
-                self._print_terminal(f"CF: No similar students found for student PK {student.id} (based on current interactions). Using content-based as fallback.")
-                recommendations = self.get_content_based_recommendations(student, top_n)
-                for rec in recommendations:
-                    rec['type'] = 'collaborative-fallback'
-                return recommendations
-            
-            self._print_terminal(f"CF: Found {len(similar_student_pks)} similar students (PKs: {similar_student_pks}). Overlap counts: {[s.overlap_count for s in similar_students_qs]}")
-
-            all_similar_student_interactions = Interaction.objects.filter(student_id__in=similar_student_pks)
-            all_similar_interactions_log = []
-            clubs_for_log_dict = {c.id: c.name for c in Club.objects.filter(id__in=all_similar_student_interactions.values_list('club_id', flat=True).distinct())}
-            for interaction_obj in all_similar_student_interactions:
-                all_similar_interactions_log.append({
-                    'student_pk': interaction_obj.student_id,
-                    'club_pk': interaction_obj.club_id,
-                    'club_name': clubs_for_log_dict.get(interaction_obj.club_id, f"Club PK {interaction_obj.club_id}")
-                })
+                self._print_terminal(f"CF: No similar students found for student PK {student.id} (based on current interactions). Using trending clubs as fallback.")
+                metrics.FALLBACKS.inc(fallback='collaborative', reason='no_similar_students')
+                return self._collaborative_fallback(
+                    student, top_n, exclude=student_interacted_club_ids,
+                    categories={c.category for c in interacted_clubs_details}
+                )
+            
+            self._print_terminal(f"CF: Found {len(similar_student_pks)} similar students (PKs: {similar_student_pks}). Overlap counts: {[s['overlap_count'] for s in similar_students]}")
+
+            with tracing.span('cf_diagnostics'):
+                all_similar_student_interactions = Interaction.objects.filter(student_id__in=similar_student_pks)
+                all_similar_interactions_log = []
+                clubs_for_log_dict = {c.id: c.name for c in Club.objects.filter(id__in=all_similar_student_interactions.values_list('club_id', flat=True).distinct())}
+                for interaction_obj in all_similar_student_interactions:
+                    all_similar_interactions_log.append({
+                        'student_pk': interaction_obj.student_id,
+                        'club_pk': interaction_obj.club_id,
+                        'club_name': clubs_for_log_dict.get(interaction_obj.club_id, f"Club PK {interaction_obj.club_id}")
+                    })
             self._print_terminal(f"CF DIAGNOSTIC: All clubs interacted with by similar students (before filtering known clubs): {all_similar_interactions_log}")
 
             # Get all clubs interacted with by similar users, including those already interacted by the current student
@@ -725,11 +1325,12 @@ class ModelHandler:
             new_club_interactions = []
             known_club_interactions = []
             
-            for item in all_club_interaction_counts:
-                if item['club_id'] in student_interacted_club_ids:
-                    known_club_interactions.append(item)
-                else:
-                    new_club_interactions.append(item)
+            with tracing.span('cf_club_counts'):
+                for item in all_club_interaction_counts:
+                    if item['club_id'] in student_interacted_club_ids:
+                        known_club_interactions.append(item)
+                    else:
+                        new_club_interactions.append(item)
             
             # Ensure enough recommendations
             # If new clubs are insufficient, add some popular known clubs
@@ -768,8 +1369,119 @@ class ModelHandler:
             return recommendations
         except Exception as e:
             logger.error(f"Error generating collaborative filtering recommendations: {str(e)}", exc_info=True)
-            self._print_terminal(f"CF: Error in collaborative filtering ({str(e)}). Falling back to content-based.")
-            recommendations = self.get_content_based_recommendations(student, top_n)
-            for rec in recommendations:
-                rec['type'] = 'collaborative-fallback'
-            return recommendations
\ No newline at end of file
+            self._print_terminal(f"CF: Error in collaborative filtering ({str(e)}). Falling back to trending clubs.")
+            metrics.FALLBACKS.inc(fallback='collaborative', reason='error')
+            return self._collaborative_fallback(student, top_n)
+
+
+# The serving handler. Requests lease it with acquire_model_handler/release, so a reload can
+# build the next handler in the background, swap the reference, and close the previous one
+# once the requests still using it have finished.
+_active_handler = None
+_handler_lock = threading.Lock()
+_watcher = None
+
+
+def acquire_model_handler():
+    """The serving ModelHandler, loaded on first use; every call must be paired with release()"""
+    global _active_handler
+    with _handler_lock:
+        if _active_handler is None:
+            _active_handler = ModelHandler()
+            _start_artifact_watcher()
+        _active_handler.in_flight += 1
+        return _active_handler
+
+
+def serving_model_version():
+    """Version of the serving handler without leasing it ('' if unversioned), None before the first load"""
+    handler = _active_handler
+    return None if handler is None else (handler.version or '')
+
+
+@contextmanager
+def model_handler_lease():
+    """Use the serving ModelHandler for the enclosed block; a reload does not close it meanwhile"""
+    handler = acquire_model_handler()
+    try:
+        yield handler
+    finally:
+        handler.release()
+
+
+def install_model_handler(handler):
+    """
+    Make handler the serving one.
+    
+    The previous handler is closed in the background once its in-flight requests have finished
+    (or after RECOMMENDER_HANDLER_DRAIN_SECONDS).
+    
+    Returns:
+        The previous handler, or None
+    """
+    global _active_handler
+    with _handler_lock:
+        previous, _active_handler = _active_handler, handler
+    if previous is not None and previous is not handler:
+        threading.Thread(target=_retire, args=(previous,), name='model-handler-retire', daemon=True).start()
+    return previous
+
+
+def reload_model_handler(version=None):
+    """
+    Load a new handler next to the serving one and swap to it.
+    
+    Args:
+        version: Artifact version to load (default: the one CURRENT points at)
+        
+    Returns:
+        The new handler, or None if it failed to load (the serving handler is kept)
+    """
+    start = time.perf_counter()
+    handler = ModelHandler(version)
+    if not handler.loaded:
+        handler.close()
+        metrics.MODEL_RELOADS.inc(result='failed')
+        logger.error(f"Model version {handler.version} failed to load; still serving the previous version")
+        return None
+    previous = install_model_handler(handler)
+    metrics.MODEL_RELOADS.inc(result='swapped')
+    logger.info(f"Swapped model version {previous.version if previous else None} -> {handler.version} "
+                f"(loaded in {time.perf_counter() - start:.1f}s)")
+    return handler
+
+
+def _retire(handler):
+    deadline = time.monotonic() + getattr(settings, 'RECOMMENDER_HANDLER_DRAIN_SECONDS', 30)
+    while handler.in_flight > 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if handler.in_flight > 0:
+        logger.warning(f"Closing model version {handler.version} with {handler.in_flight} requests still running")
+    handler.close()
+
+
+def _start_artifact_watcher():
+    """Poll the CURRENT pointer and reload when it names another version"""
+    global _watcher
+    interval = getattr(settings, 'RECOMMENDER_ARTIFACT_POLL_SECONDS', None)
+    if not interval or _watcher is not None:
+        return
+    _watcher = threading.Thread(target=_watch_current, args=(interval,), name='artifact-watcher', daemon=True)
+    _watcher.start()
+
+
+def _watch_current(interval):
+    failed_version = None
+    while True:
+        time.sleep(interval)
+        try:
+            version = artifacts.read_current()
+            serving = _active_handler
+            if version is None or serving is None or version in (serving.artifact_version, failed_version):
+                continue
+            logger.info(f"CURRENT points at model version {version}, reloading")
+            failed_version = None if reload_model_handler(version) else version
+        except Exception as e:
+            logger.error(f"Error reloading model artifacts: {str(e)}", exc_info=True)
+        finally:
+            close_old_connections()
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from . import profiles
 
 class Student(models.Model):
     STATUS_CHOICES = [
@@ -23,6 +24,11 @@ class Student(models.Model):
     hobbies = models.JSONField(default=list)
     interests = models.JSONField(default=list)
     skills = models.JSONField(default=list)
+    # Row of this student in student_vectors.npz, written when the artifacts are generated or imported
+    vector_index = models.PositiveIntegerField(null=True, blank=True, unique=True)
+    # Normalized terms of hobbies, interests, skills and course for content-based matching,
+    # rebuilt on every save (see profiles.build_profile)
+    interest_profile = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -43,6 +49,14 @@ class Student(models.Model):
         if isinstance(self.skills, str):
             self.skills = [x.strip() for x in self.skills.split(',') if x.strip()]
         
+        # Refresh the interest profile unless the save leaves its source fields alone
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or profiles.PROFILE_FIELDS.intersection(update_fields):
+            self.interest_profile = profiles.build_profile(self)
+            self._interest_profile = None
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'interest_profile'}
+        
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -52,6 +66,8 @@ class Club(models.Model):
     name = models.CharField(max_length=100)
     category = models.CharField(max_length=50)
     description = models.TextField()
+    # Row of this club in club_vectors.npz, written when the artifacts are generated or imported
+    vector_index = models.PositiveIntegerField(null=True, blank=True, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -72,6 +88,12 @@ class Interaction(models.Model):
 
     class Meta:
         unique_together = ('student', 'club', 'interaction_type')
+        indexes = [
+            # Collaborative filtering: students who interacted with a set of clubs
+            models.Index(fields=['club', 'student'], name='interaction_club_student_idx'),
+            # Dashboard: recent activity
+            models.Index(fields=['timestamp'], name='interaction_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student} - {self.club} ({self.interaction_type})"
@@ -131,6 +153,9 @@ class Category(models.Model):
 
     @property
     def member_count(self):
+        # Use the num_members annotation when the queryset provides it
+        if hasattr(self, 'num_members'):
+            return self.num_members
         return self.members.count()
 
     @property
@@ -147,4 +172,10 @@ class Application(models.Model):
         ('approved', 'Approved'),
         ('rejected', 'Rejected')
     ], default='pending')
-    # other fields as needed 
\ No newline at end of file
+    # other fields as needed 
+
+    class Meta:
+        indexes = [
+            # Dashboard counts of applications by status
+            models.Index(fields=['status', 'apply_date'], name='application_status_date_idx'),
+        ]
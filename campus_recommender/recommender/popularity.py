@@ -0,0 +1,344 @@
+import os
+import math
+import time
+import logging
+import threading
+import numpy as np
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F, FloatField, Func, Q
+from .models import Club, Interaction
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Weight of each interaction type in popularity and trending scores
+EVENT_WEIGHTS = {'join': 3.0, 'like': 2.0, 'view': 1.0}
+# Seconds of already-applied events read again on every catch-up, for transactions that commit
+# after newer events were seen
+CATCH_UP_OVERLAP = 5.0
+# Forward-decayed sums are rebased before their exponent gets near float64 overflow (~709)
+MAX_EXPONENT = 500.0
+# Interaction rows applied per batch while building the table
+BUILD_BATCH = 50000
+
+_EVENT_FIELDS = ('id', 'club_id', 'student__course', 'interaction_type')
+# Julian day number of the Unix epoch
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+
+class PopularityTable:
+    """
+    Per-club popularity and trending scores, overall and per student course.
+
+    Scores are dense arrays indexed by club primary key (courses are rows of 2-D arrays).
+    Popularity is the weighted number of interactions. Trending decays each event with a
+    half-life; events are stored forward-decayed, w * exp((t - t0) / tau) against a fixed
+    reference time t0, so adding one is O(1) and all clubs share the same decay factor at read
+    time. Rankings per segment (overall, course, category) are cached until the next event,
+    which makes a fallback a slice of a precomputed order.
+    """
+
+    def __init__(self, half_life_days=7.0):
+        self.tau = half_life_days * 86400 / math.log(2)
+        self.t0 = time.time()
+        self.popularity = np.zeros(0)
+        self.trending = np.zeros(0)
+        self.course_popularity = np.zeros((0, 0))
+        self.course_trending = np.zeros((0, 0))
+        self.courses = {}
+        # Category code of every club (-1 for primary keys without a club) and club names
+        self.categories = {}
+        self.club_category = np.full(0, -1, dtype=np.int32)
+        self.club_names = {}
+        # Newest event applied (epoch seconds) and highest interaction ID counted in popularity
+        self.watermark = None
+        self.last_id = 0
+        self._recent = {}
+        self._rankings = {}
+        self._lock = threading.RLock()
+
+    def _reserve(self, num_clubs, num_courses):
+        """Grow the arrays to at least num_clubs columns and num_courses course rows"""
+        clubs, courses = len(self.popularity), len(self.course_popularity)
+        if num_clubs <= clubs and num_courses <= courses:
+            return
+        clubs, courses = max(num_clubs, clubs), max(num_courses, courses)
+        for name in ('popularity', 'trending'):
+            grown = np.zeros(clubs)
+            grown[:len(getattr(self, name))] = getattr(self, name)
+            setattr(self, name, grown)
+        for name in ('course_popularity', 'course_trending'):
+            current = getattr(self, name)
+            grown = np.zeros((courses, clubs))
+            grown[:current.shape[0], :current.shape[1]] = current
+            setattr(self, name, grown)
+        category = np.full(clubs, -1, dtype=np.int32)
+        category[:len(self.club_category)] = self.club_category
+        self.club_category = category
+
+    def set_clubs(self, clubs):
+        """Refresh club categories and names from (pk, name, category) rows; missing clubs are never ranked"""
+        clubs = list(clubs)
+        with self._lock:
+            self._reserve(max((pk for pk, _, _ in clubs), default=-1) + 1, len(self.courses))
+            category = np.full(len(self.club_category), -1, dtype=np.int32)
+            for pk, name, club_category in clubs:
+                category[pk] = self.categories.setdefault(club_category, len(self.categories))
+            self.club_names = {pk: (name, club_category) for pk, name, club_category in clubs}
+            if not np.array_equal(category, self.club_category):
+                self.club_category = category
+                self._rankings = {}
+
+    def apply(self, events):
+        """
+        Add interaction events to the scores.
+
+        Args:
+            events: (id, club_id, course, interaction_type, epoch seconds) tuples; events already
+                applied within the catch-up overlap are skipped, and popularity only counts rows
+                with a new ID (a refreshed view updates the timestamp of an existing row)
+        """
+        events = list(events)
+        if not events:
+            return 0
+        with self._lock:
+            count = len(events)
+            ids = np.fromiter((event[0] for event in events), dtype=np.int64, count=count)
+            clubs = np.fromiter((event[1] for event in events), dtype=np.int64, count=count)
+            courses = np.fromiter(
+                (self.courses.setdefault(event[2], len(self.courses)) for event in events), dtype=np.int64, count=count
+            )
+            weights = np.fromiter((EVENT_WEIGHTS.get(event[3], 1.0) for event in events), dtype=np.float64, count=count)
+            stamps = np.fromiter((event[4] for event in events), dtype=np.float64, count=count)
+
+            # Only events inside the overlap window can have been applied already
+            if self._recent:
+                oldest = min(self._recent.values())
+                fresh = np.array([
+                    stamp < oldest or (int(event_id), stamp) not in self._recent
+                    for event_id, stamp in zip(ids, stamps)
+                ])
+                ids, clubs, courses, weights, stamps = ids[fresh], clubs[fresh], courses[fresh], weights[fresh], stamps[fresh]
+                if not len(ids):
+                    return 0
+
+            self._reserve(int(clubs.max()) + 1, len(self.courses))
+            if (stamps.max() - self.t0) / self.tau > MAX_EXPONENT:
+                self._rebase(stamps.max())
+
+            decayed = weights * np.exp((stamps - self.t0) / self.tau)
+            np.add.at(self.trending, clubs, decayed)
+            np.add.at(self.course_trending, (courses, clubs), decayed)
+            new = ids > self.last_id
+            np.add.at(self.popularity, clubs[new], weights[new])
+            np.add.at(self.course_popularity, (courses[new], clubs[new]), weights[new])
+
+            self.last_id = max(self.last_id, int(ids.max()))
+            self.watermark = max(self.watermark or 0.0, float(stamps.max()))
+            horizon = self.watermark - CATCH_UP_OVERLAP
+            self._recent = {key: stamp for key, stamp in self._recent.items() if stamp >= horizon}
+            recent = stamps >= horizon
+            self._recent.update(((int(event_id), stamp), stamp) for event_id, stamp in zip(ids[recent], stamps[recent]))
+            self._rankings = {}
+            return len(ids)
+
+    def _rebase(self, t0):
+        factor = math.exp((self.t0 - t0) / self.tau)
+        self.trending *= factor
+        self.course_trending *= factor
+        self.t0 = t0
+
+    def _ranking(self, course=None, category=None):
+        """Club primary keys of a segment, best first (trending, then popularity)"""
+        key = (course, category)
+        ranking = self._rankings.get(key)
+        if ranking is None:
+            trending, popularity = self._scores(course)
+            valid = self.club_category >= 0
+            if category is not None:
+                valid &= self.club_category == self.categories.get(category, -2)
+            pks = np.flatnonzero(valid)
+            ranking = pks[np.lexsort((-popularity[pks], -trending[pks]))]
+            self._rankings[key] = ranking
+        return ranking
+
+    def _scores(self, course):
+        if course is None:
+            return self.trending, self.popularity
+        row = self.courses[course]
+        return self.course_trending[row], self.course_popularity[row]
+
+    def top(self, n, course=None, category=None, exclude=()):
+        """
+        Best clubs of a segment.
+
+        Args:
+            n: Number of clubs
+            course: Rank by interactions of students in this course (default, or for a course
+                without interactions: everyone)
+            category: Only clubs of this category
+            exclude: Club primary keys to skip (e.g. clubs the student already interacted with)
+
+        Returns:
+            List of (club_id, trending score now, popularity) tuples
+        """
+        with self._lock:
+            if course not in self.courses:
+                course = None
+            ranking = self._ranking(course, category)
+            trending, popularity = self._scores(course)
+            decay = math.exp((self.t0 - time.time()) / self.tau)
+            result = []
+            for pk in ranking:
+                if len(result) >= n:
+                    break
+                if pk not in exclude:
+                    result.append((int(pk), float(trending[pk] * decay), float(popularity[pk])))
+            return result
+
+    def club_info(self, club_id):
+        """(name, category) of a club, as of the last refresh"""
+        return self.club_names.get(club_id, (None, None))
+
+    def save(self, path):
+        """Atomically write the table as an .npz snapshot"""
+        with self._lock:
+            tmp_path = path + '.tmp.npz'
+            np.savez(
+                tmp_path,
+                meta=np.array([self.tau, self.t0, self.watermark or 0.0, self.last_id]),
+                popularity=self.popularity, trending=self.trending,
+                course_popularity=self.course_popularity, course_trending=self.course_trending,
+                courses=np.array(sorted(self.courses, key=self.courses.get), dtype=np.str_),
+            )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Table from a snapshot; clubs still have to be set with set_clubs"""
+        with np.load(path) as data:
+            table = cls()
+            table.tau, table.t0, watermark, last_id = data['meta']
+            table.watermark = float(watermark) or None
+            table.last_id = int(last_id)
+            table.popularity, table.trending = data['popularity'], data['trending']
+            table.course_popularity, table.course_trending = data['course_popularity'], data['course_trending']
+            table.courses = {str(course): row for row, course in enumerate(data['courses'])}
+            table.club_category = np.full(len(table.popularity), -1, dtype=np.int32)
+        return table
+
+    def catch_up(self):
+        """
+        Apply interactions written since the last event seen (by any process); returns how many.
+
+        Rows with a new ID are read whatever their timestamp, so back-dated inserts (imports,
+        generated test data) are counted too.
+        """
+        self.set_clubs(Club.objects.values_list('id', 'name', 'category'))
+        events = Interaction.objects.order_by()
+        if self.watermark is not None:
+            # Without the applied keys (table loaded from a snapshot) the overlap would count twice
+            since = self.watermark - (CATCH_UP_OVERLAP if self._recent else 0.0)
+            events = events.filter(
+                Q(id__gt=self.last_id) | Q(timestamp__gt=datetime.fromtimestamp(since, tz=dt_timezone.utc))
+            )
+        applied = 0
+        batch = []
+        for event in _event_rows(events):
+            batch.append(event)
+            if len(batch) >= BUILD_BATCH:
+                applied += self.apply(batch)
+                batch = []
+        if batch:
+            applied += self.apply(batch)
+        return applied
+
+
+def _event_rows(queryset):
+    """(id, club_id, course, interaction_type, epoch seconds) rows of interactions"""
+    if connections[queryset.db].vendor == 'sqlite':
+        # Converting a million timestamps to aware datetimes costs more than the query itself
+        queryset = queryset.annotate(julian_day=Func(F('timestamp'), function='julianday', output_field=FloatField()))
+        for *fields, julian_day in queryset.values_list(*_EVENT_FIELDS, 'julian_day').iterator(chunk_size=10000):
+            yield (*fields, (julian_day - UNIX_EPOCH_JULIAN_DAY) * 86400)
+    else:
+        for *fields, timestamp in queryset.values_list(*_EVENT_FIELDS, 'timestamp').iterator(chunk_size=10000):
+            yield (*fields, timestamp.timestamp())
+
+
+class PopularityService:
+    """
+    Keeps the process-wide table current: builds it in the background (from the snapshot if one
+    exists), applies new interactions every refresh_interval seconds and rebuilds from scratch
+    every rebuild_interval seconds so deleted interactions drop out.
+    """
+
+    def __init__(self, half_life_days=7.0, refresh_interval=30.0, rebuild_interval=86400.0, snapshot_path=None):
+        self.half_life_days = half_life_days
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.snapshot_path = snapshot_path
+        self.table = None
+        self._built_at = 0.0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='popularity-refresher', daemon=True)
+            self._thread.start()
+
+    def build(self, use_snapshot=True):
+        """Build a table from the snapshot (if any) plus newer interactions, or from every interaction"""
+        start = time.perf_counter()
+        table = None
+        if use_snapshot and self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                table = PopularityTable.load(self.snapshot_path)
+            except Exception as e:
+                logger.error(f"Error loading popularity snapshot {self.snapshot_path}: {str(e)}", exc_info=True)
+        if table is None:
+            table = PopularityTable(self.half_life_days)
+        applied = table.catch_up()
+        self.table = table
+        self._built_at = time.monotonic()
+        metrics.ARTIFACT_LOAD_SECONDS.set(round(time.perf_counter() - start, 4), artifact='popularity')
+        logger.info(f"Popularity table built from {applied} interactions in {time.perf_counter() - start:.2f}s")
+        return table
+
+    def _run(self):
+        while True:
+            try:
+                if self.table is None:
+                    self.build()
+                elif time.monotonic() - self._built_at >= self.rebuild_interval:
+                    self.build(use_snapshot=False)
+                else:
+                    self.table.catch_up()
+            except Exception as e:
+                logger.error(f"Error refreshing popularity table: {str(e)}", exc_info=True)
+            finally:
+                close_old_connections()
+            time.sleep(self.refresh_interval)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_popularity_table():
+    """The process-wide popularity table, or None while it is first being built"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                service = PopularityService(
+                    half_life_days=getattr(settings, 'RECOMMENDER_TRENDING_HALF_LIFE_DAYS', 7.0),
+                    refresh_interval=getattr(settings, 'RECOMMENDER_POPULARITY_REFRESH_SECONDS', 30),
+                    rebuild_interval=getattr(settings, 'RECOMMENDER_POPULARITY_REBUILD_SECONDS', 86400),
+                    snapshot_path=str(getattr(settings, 'RECOMMENDER_POPULARITY_SNAPSHOT', None) or '') or None,
+                )
+                service.start()
+                _service = service
+    return _service.table
@@ -0,0 +1,177 @@
+from collections import Counter
+
+# Bumped whenever normalization or CATEGORY_MAPPING changes, so stored profiles are rebuilt
+PROFILE_VERSION = 1
+
+# Student fields a profile is computed from
+PROFILE_FIELDS = frozenset({'hobbies', 'interests', 'skills', 'course'})
+
+# Student interests mapped to related terms, matched against club categories
+CATEGORY_MAPPING = {
+    # Arts-related mapping
+    'arts': ['arts', 'creative', 'design', 'music', 'photography', 'film', 'drama', 'drawing', 'painting'],
+    'literature': ['literature', 'reading', 'writing', 'poetry', 'book', 'arts'],
+    'music': ['music', 'singing', 'choir', 'band', 'orchestra', 'arts'],
+    'photography': ['photography', 'camera', 'arts', 'visual'],
+    'design': ['design', 'graphic', 'arts', 'creative', 'visual'],
+    'drawing': ['drawing', 'sketch', 'arts', 'creative', 'visual'],
+    'painting': ['painting', 'arts', 'creative', 'visual'],
+
+    # Academic-related mapping
+    'academics': ['academics', 'study', 'learning', 'education', 'research', 'science'],
+    'mathematics': ['mathematics', 'math', 'algebra', 'calculus', 'academics', 'science'],
+    'science': ['science', 'physics', 'chemistry', 'biology', 'academics', 'research'],
+    'technology': ['technology', 'computer', 'programming', 'coding', 'tech', 'it'],
+    'engineering': ['engineering', 'mechanics', 'electronics', 'design', 'technology'],
+    'programming': ['programming', 'coding', 'software', 'development', 'technology', 'computer', 'tech'],
+
+    # Sports-related mapping
+    'sports': ['sports', 'athletic', 'fitness', 'exercise', 'team'],
+    'basketball': ['basketball', 'sports', 'team', 'athletic'],
+    'football': ['football', 'sports', 'team', 'athletic'],
+    'soccer': ['soccer', 'sports', 'team', 'athletic'],
+    'swimming': ['swimming', 'sports', 'athletic'],
+    'tennis': ['tennis', 'sports', 'athletic'],
+    'fitness': ['fitness', 'gym', 'health', 'exercise', 'sports'],
+
+    # Community service-related mapping
+    'volunteer': ['volunteer', 'service', 'community', 'charity', 'helping'],
+    'environment': ['environment', 'nature', 'climate', 'sustainability', 'green'],
+    'social': ['social', 'community', 'networking', 'cultural', 'diversity'],
+    'leadership': ['leadership', 'management', 'organization', 'entrepreneurship'],
+    'business': ['business', 'entrepreneurship', 'finance', 'marketing', 'economics'],
+
+    # Other categories
+    'gaming': ['gaming', 'games', 'video games', 'esports', 'entertainment'],
+    'food': ['food', 'cooking', 'culinary', 'baking', 'nutrition'],
+    'travel': ['travel', 'adventure', 'exploration', 'culture']
+}
+
+# Every term of CATEGORY_MAPPING to the union of the groups it appears in
+RELATED_TERMS = {}
+for _group in CATEGORY_MAPPING.values():
+    for _term in _group:
+        RELATED_TERMS.setdefault(_term, set()).update(_group)
+
+
+class TermVocabulary:
+    """
+    Fixed table of the terms (interests, categories) interned as small integer IDs.
+
+    Built once at import from CATEGORY_MAPPING, which names the categories the mapping can relate
+    terms to, so it never grows with the free-text terms students enter.
+    """
+
+    def __init__(self, terms):
+        self._ids = {}
+        for term in terms:
+            self._ids.setdefault(term, len(self._ids))
+
+    def get(self, term):
+        """ID of a term, None for a term outside the vocabulary"""
+        return self._ids.get(term)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+vocabulary = TermVocabulary([*CATEGORY_MAPPING, *RELATED_TERMS])
+
+
+def student_terms(student):
+    """Lowercased hobbies, interests and skills of a student, followed by the course"""
+    terms = [item.lower() for item in (student.hobbies or []) + (student.interests or []) + (student.skills or [])]
+    if student.course:
+        terms.append(student.course.lower())
+    return terms
+
+
+def build_profile(student):
+    """
+    Normalized interest profile of a student, as stored in Student.interest_profile.
+
+    Returns:
+        Dictionary with the distinct terms (in order), the related-term counts (for every term
+        any CATEGORY_MAPPING group links to, the number of the student's terms linking to it)
+        and the lowercased course
+    """
+    terms = student_terms(student)
+    related = Counter()
+    for term in terms:
+        related.update(RELATED_TERMS.get(term, ()))
+    return {
+        'version': PROFILE_VERSION,
+        'terms': list(dict.fromkeys(terms)),
+        'related': dict(related),
+        'course': (student.course or '').lower(),
+    }
+
+
+class InterestProfile:
+    """
+    A stored profile with its vocabulary terms as IDs, so category matching is a set or dict lookup.
+
+    Terms outside the vocabulary stay strings: substring matching against club names and
+    descriptions uses terms (deduplicated), and a category outside the vocabulary can only match
+    one of them directly.
+    """
+
+    __slots__ = ('terms', 'term_ids', 'other_terms', 'related', 'course')
+
+    def __init__(self, stored):
+        self.terms = tuple(stored['terms'])
+        term_ids = {term: vocabulary.get(term) for term in self.terms}
+        self.term_ids = frozenset(term_id for term_id in term_ids.values() if term_id is not None)
+        self.other_terms = frozenset(term for term, term_id in term_ids.items() if term_id is None)
+        # Related terms come from CATEGORY_MAPPING, so all of them are in the vocabulary
+        self.related = {vocabulary.get(term): count for term, count in stored['related'].items()}
+        self.course = stored['course']
+
+    def category_matches(self, category):
+        """
+        How a club category matches the profile.
+
+        Returns:
+            (direct, related) tuple: whether a term is the category, and the number of the
+            student's terms CATEGORY_MAPPING links to it
+        """
+        if not category:
+            return False, 0
+        category = category.lower()
+        category_id = vocabulary.get(category)
+        if category_id is None:
+            return category in self.other_terms, 0
+        return category_id in self.term_ids, self.related.get(category_id, 0)
+
+
+def get_profile(student):
+    """
+    The student's InterestProfile, memoized on the instance.
+
+    Uses the profile stored by Student.save; students written without it (bulk inserts, rows
+    older than PROFILE_VERSION) get one built on the fly.
+    """
+    profile = getattr(student, '_interest_profile', None)
+    if profile is None:
+        stored = getattr(student, 'interest_profile', None)
+        if not stored or stored.get('version') != PROFILE_VERSION:
+            stored = build_profile(student)
+        profile = student._interest_profile = InterestProfile(stored)
+    return profile
+
+
+def matching_categories(profile, categories):
+    """
+    Club categories matching a profile: 1.0 for a direct match, 0.8 through CATEGORY_MAPPING.
+
+    Returns:
+        Dictionary of category (as given) to weight
+    """
+    matches = {}
+    for category in categories:
+        direct, related = profile.category_matches(category)
+        if direct:
+            matches[category] = 1.0
+        elif related:
+            matches[category] = 0.8
+    return matches
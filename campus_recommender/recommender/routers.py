@@ -0,0 +1,61 @@
+import contextvars
+from contextlib import contextmanager
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+
+# Alias reads of the current request may use; None (the default, e.g. in background threads)
+# keeps every read on the primary
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def use_replica():
+    """Let reads of the current request go to the replica (set by ReplicaPinningMiddleware)"""
+    return _read_alias.set(REPLICA)
+
+
+def reset(token):
+    _read_alias.reset(token)
+
+
+def pin_to_primary():
+    """Send the remaining reads of the current request to the primary (read-your-writes)"""
+    _read_alias.set(None)
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads of recommender models in safe requests to the replica alias.
+
+    Auth tables (users, tokens, sessions) always use the primary so a fresh login is visible at
+    once. After the first write of a request, the rest of the request reads the primary, and
+    ReplicaPinningMiddleware keeps a client that just wrote on the primary for a few seconds so
+    it reads its own writes while the replica catches up.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'recommender':
+            return PRIMARY
+        return _read_alias.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary made by sync_replica, never migrated directly
+        return db != REPLICA
@@ -0,0 +1,132 @@
+import re
+import logging
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# FTS5 virtual tables backing the admin search boxes. Each row's rowid is the
+# primary key of the indexed Student/Admin, so a MATCH returns ranked IDs directly.
+STUDENT_SEARCH_TABLE = 'recommender_student_search'
+ADMIN_SEARCH_TABLE = 'recommender_admin_search'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# Whether the search tables exist, per connection alias and database name; looked up once, as
+# they are only created or dropped by migrations
+_available = {}
+
+
+def is_available():
+    """Check whether the search index can be used on the current database"""
+    if connection.vendor != 'sqlite':
+        return False
+    key = (connection.alias, connection.settings_dict['NAME'])
+    available = _available.get(key)
+    if available is None:
+        available = _available[key] = STUDENT_SEARCH_TABLE in connection.introspection.table_names()
+    return available
+
+
+def build_match_query(search):
+    """
+    Convert free text from the search box into an FTS5 prefix query.
+
+    Every word becomes a quoted prefix term and all terms must match, e.g.
+    'john@exa' -> '"john"* AND "exa"*'.
+
+    Returns:
+        The query, or None if prefix matching cannot answer the search: there are no words, or
+        a word is all digits, such as '0001' from the middle of student ID T0000001, which only
+        a substring match finds
+    """
+    tokens = _TOKEN_RE.findall(search or '')
+    if not tokens or any(token.isdigit() for token in tokens):
+        return None
+    return ' AND '.join(f'"{token}"*' for token in tokens)
+
+
+def _filter_matching(queryset, table, match_query):
+    # Joined in SQL instead of fetching the matching IDs first, so no match is cut off and the
+    # paginator's COUNT and LIMIT run on the join
+    pk_column = f'"{queryset.model._meta.db_table}"."{queryset.model._meta.pk.column}"'
+    return queryset.extra(
+        select={'search_rank': f'{table}.rank'},
+        tables=[table],
+        where=[f'{table}.rowid = {pk_column}', f'{table} MATCH %s'],
+        params=[match_query],
+        order_by=['search_rank'],
+    )
+
+
+def filter_students(queryset, match_query):
+    """Restrict a Student queryset to the matches of an FTS5 query, best match first"""
+    return _filter_matching(queryset, STUDENT_SEARCH_TABLE, match_query)
+
+
+def filter_admins(queryset, match_query):
+    """Restrict an Admin queryset to the matches of an FTS5 query, best match first"""
+    return _filter_matching(queryset, ADMIN_SEARCH_TABLE, match_query)
+
+
+def index_student(student):
+    """Insert or refresh the search entry of a single student"""
+    if not is_available():
+        return
+    user = student.user
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {STUDENT_SEARCH_TABLE} WHERE rowid = %s", [student.pk])
+        cursor.execute(
+            f"INSERT INTO {STUDENT_SEARCH_TABLE} (rowid, username, student_id, email) VALUES (%s, %s, %s, %s)",
+            [student.pk, user.username, student.student_id, user.email]
+        )
+
+
+def index_admin(admin):
+    """Insert or refresh the search entry of a single admin"""
+    if not is_available():
+        return
+    user = admin.user
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {ADMIN_SEARCH_TABLE} WHERE rowid = %s", [admin.pk])
+        cursor.execute(
+            f"INSERT INTO {ADMIN_SEARCH_TABLE} (rowid, username, email, first_name, last_name) VALUES (%s, %s, %s, %s, %s)",
+            [admin.pk, user.username, user.email, user.first_name, user.last_name]
+        )
+
+
+def remove_student(student_pk):
+    """Remove a student from the search index"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {STUDENT_SEARCH_TABLE} WHERE rowid = %s", [student_pk])
+
+
+def remove_admin(admin_pk):
+    """Remove an admin from the search index"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {ADMIN_SEARCH_TABLE} WHERE rowid = %s", [admin_pk])
+
+
+def rebuild_index():
+    """
+    Repopulate both search tables from the Student/Admin tables with set-based SQL.
+    Used after bulk imports that bypass model signals.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {STUDENT_SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {STUDENT_SEARCH_TABLE} (rowid, username, student_id, email) "
+            "SELECT s.id, u.username, s.student_id, u.email "
+            "FROM recommender_student s JOIN auth_user u ON u.id = s.user_id"
+        )
+        cursor.execute(f"DELETE FROM {ADMIN_SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {ADMIN_SEARCH_TABLE} (rowid, username, email, first_name, last_name) "
+            "SELECT a.id, u.username, u.email, u.first_name, u.last_name "
+            "FROM recommender_admin a JOIN auth_user u ON u.id = a.user_id"
+        )
+    logger.info("Search index rebuilt")
@@ -56,10 +56,35 @@ class StudentSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class ClubSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """Field names of the comma-separated fields= query parameter, or None when it is absent"""
+    value = request.GET.get('fields')
+    if not value:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin limiting the output to the fields named in a `fields` argument
+    (a sparse fieldset, e.g. from requested_fields). Unknown names are a validation error.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            unknown = [name for name in fields if name not in self.fields]
+            if unknown:
+                raise serializers.ValidationError({
+                    'fields': f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(self.fields)}"
+                })
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class ClubSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Club
         fields = '__all__'
+        read_only_fields = ('vector_index',)
 
 class InteractionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -149,6 +174,8 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'status', 'memberCount', 'activityCount', 'isJoined']
 
     def get_isJoined(self, obj):
+        if 'joined_category_ids' in self.context:
+            return obj.id in self.context['joined_category_ids']
         request = self.context.get('request')
         # Only authenticated students can join categories
         if request and request.user.is_authenticated and hasattr(request.user, 'student'):
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Student, Admin, Club, Interaction
+from . import search, embeddings, versions
+
+# User columns copied into the search index
+SEARCHABLE_USER_FIELDS = {'username', 'email', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Student)
+def index_student_on_save(sender, instance, **kwargs):
+    search.index_student(instance)
+
+
+@receiver(post_save, sender=Student)
+def vectorize_student_on_save(sender, instance, **kwargs):
+    # Registration or profile update: (re-)vectorize in the next embedding batch once committed
+    transaction.on_commit(lambda: embeddings.mark_pending(instance.pk))
+
+
+@receiver(post_delete, sender=Student)
+def remove_student_on_delete(sender, instance, **kwargs):
+    search.remove_student(instance.pk)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def bump_student_recommendations(sender, instance, **kwargs):
+    versions.bump_recommendations([instance.user_id])
+
+
+@receiver(post_save, sender=Interaction)
+def bump_interaction_recommendations(sender, instance, **kwargs):
+    # Views save interactions with the student already loaded, so this costs no query. There is
+    # no post_delete receiver: it would turn cascading and bulk deletes into row-by-row ones
+    versions.bump_recommendations([instance.student.user_id])
+
+
+@receiver(post_save, sender=Club)
+@receiver(post_delete, sender=Club)
+def bump_catalog_version(sender, instance, **kwargs):
+    versions.bump_catalog()
+
+
+@receiver(post_save, sender=Admin)
+def index_admin_on_save(sender, instance, **kwargs):
+    search.index_admin(instance)
+
+
+@receiver(post_delete, sender=Admin)
+def remove_admin_on_delete(sender, instance, **kwargs):
+    search.remove_admin(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def reindex_user_profiles_on_save(sender, instance, created, update_fields=None, **kwargs):
+    # Username/email/name changes live on User, so refresh any profile built on it
+    if created:
+        return
+    if update_fields is not None and not set(update_fields) & SEARCHABLE_USER_FIELDS:
+        return
+    student = Student.objects.filter(user=instance).first()
+    if student:
+        search.index_student(student)
+    admin = Admin.objects.filter(user=instance).first()
+    if admin:
+        search.index_admin(admin)
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Straight on the DB-API connection so request query counts and logs leave them out
+    for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,253 @@
+import os
+import re
+import subprocess
+import sys
+import time
+import tempfile
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from recommender import metrics, model_handler, popularity, profiles, timing
+from recommender.models import Admin, Application, Category, Club, Interaction, SavedClub, Student
+
+CLUBS = [
+    ('Photography Club', 'Arts', 'Photography walks, camera skills and exhibitions'),
+    ('Film Club', 'Arts', 'Weekly screenings and film discussions'),
+    ('Basketball Club', 'Sports', 'Basketball training and friendly matches'),
+    ('Fitness Club', 'Sports', 'Group workouts, gym sessions and fitness challenges'),
+    ('Coding Club', 'Technology', 'Programming workshops and hackathons'),
+    ('Robotics Club', 'Technology', 'Build and program robots for competitions'),
+    ('Volunteer Club', 'Social', 'Community service and charity events'),
+    ('Debate Club', 'Academics', 'Public speaking and competitive debate'),
+]
+
+STUDENTS = [
+    ('T0000001', 'Computer Science', ['Photography'], ['Technology'], ['Programming']),
+    ('T0000002', 'Computer Science', ['Basketball'], ['Programming'], ['Coding']),
+    ('T0000003', 'Fine Arts', ['Film', 'Drawing'], ['Arts'], ['Design']),
+    ('T0000004', 'Business', ['Fitness'], ['Sports', 'Leadership'], ['Public Speaking']),
+    ('T0000005', 'Sociology', ['Volunteer'], ['Social'], ['Writing']),
+    ('T0000006', 'Engineering', ['Robotics'], ['Engineering', 'Technology'], ['Electronics']),
+]
+
+# Club indexes (into CLUBS) each student interacted with
+INTERACTIONS = [(0, 1, 4), (2, 4, 5), (0, 1, 7), (2, 3, 6), (6, 7, 1), (4, 5, 2)]
+
+
+def _queries_in_server_timing(response):
+    """Queries the timing middleware counted, including work offloaded to thread pools"""
+    match = re.search(r'desc="(\d+) queries"', response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else 0
+
+
+# No snapshot from the data directory; the table is built from the fixture interactions
+@override_settings(RECOMMENDER_POPULARITY_SNAPSHOT=None)
+class QueryBudgetTests(APITransactionTestCase):
+    """Every endpoint in timing.QUERY_BUDGETS stays within its query budget"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        handler = model_handler.ModelHandler()
+        handler.verbose = False
+        if handler.embedding_service:
+            # Fixture students vectorized during the tests must not reach the overlay file
+            handler.embedding_service.persist_path = None
+        cls.handler = handler
+        cls.previous_handler = model_handler.install_model_handler(handler)
+
+    @classmethod
+    def tearDownClass(cls):
+        model_handler.install_model_handler(cls.previous_handler)
+        super().tearDownClass()
+
+    def setUp(self):
+        # Fixture rows are mapped onto the first artifact rows so the model scoring path runs
+        clubs = [Club.objects.create(name=name, category=category, description=description, vector_index=index)
+                 for index, (name, category, description) in enumerate(CLUBS)]
+        students = []
+        for index, (student_id, course, hobbies, interests, skills) in enumerate(STUDENTS):
+            user = User.objects.create_user(username=student_id, password='password')
+            students.append(Student.objects.create(
+                user=user, student_id=student_id, gender='Other', course=course,
+                hobbies=hobbies, interests=interests, skills=skills, vector_index=index
+            ))
+        for student, club_indexes in zip(students, INTERACTIONS):
+            for index in club_indexes:
+                Interaction.objects.create(student=student, club=clubs[index], interaction_type='join')
+                SavedClub.objects.create(student=student, club=clubs[index])
+                Application.objects.create(student=student, club=clubs[index])
+        for name in ('Arts', 'Sports', 'Technology'):
+            category = Category.objects.create(name=name, description=f'{name} clubs')
+            category.members.set(students[:3])
+
+        admin_user = User.objects.create_user(username='admin', password='password', is_staff=True)
+        Admin.objects.create(user=admin_user, role='super')
+        self.handler.refresh_id_mappings()
+        self.clients = {'student': self._client(students[0].user), 'admin': self._client(admin_user)}
+
+    def _client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
+
+    def _wait_for_popularity_table(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while popularity.get_popularity_table() is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def test_endpoints_within_query_budgets(self):
+        self._wait_for_popularity_table()
+        for name, budget in timing.QUERY_BUDGETS.items():
+            with self.subTest(endpoint=name):
+                client = self.clients[budget['user']]
+                # Warm up first so one-off work (vectorizing the student, caches) is not counted
+                self.assertEqual(client.get(reverse(name)).status_code, 200)
+                with timing.assert_max_queries(budget['max_queries'], label=name):
+                    response = client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(_queries_in_server_timing(response), budget['max_queries'])
+
+
+@override_settings(RECOMMENDER_METRICS_ENABLED=True, RECOMMENDER_METRICS_ALLOWED_IPS=['10.0.0.5'])
+class MetricsAccessTests(APITestCase):
+    """/metrics is served to allow-listed scrape addresses and staff users only"""
+
+    def test_allow_listed_address(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    def test_other_address_forbidden(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.6').status_code, 403)
+
+    def test_staff_token(self):
+        staff = User.objects.create_user(username='ops', password='password', is_staff=True)
+        student = User.objects.create_user(username='T0000001', password='password')
+        for user, expected in ((staff, 200), (student, 403)):
+            key = Token.objects.create(user=user).key
+            response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.6', HTTP_AUTHORIZATION=f'Token {key}')
+            self.assertEqual(response.status_code, expected)
+
+    @override_settings(RECOMMENDER_METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 404)
+
+
+class StudentSearchTests(APITestCase):
+    """Student search: ranked prefix matches on the index, substring matches for ID digits"""
+
+    def setUp(self):
+        for student_id, course, *_ in STUDENTS:
+            user = User.objects.create_user(username=student_id.lower(), password='password', email=f'{student_id}@example.com')
+            Student.objects.create(user=user, student_id=student_id, gender='Other', course=course)
+        staff = User.objects.create_user(username='admin', password='password', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=staff).key}')
+
+    def _search(self, search, **params):
+        response = self.client.get(reverse('student-list'), {'search': search, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_prefix_search_is_paginated(self):
+        data = self._search('t00000', page_size=4)
+        self.assertEqual(data['count'], len(STUDENTS))
+        self.assertEqual(len(data['results']), 4)
+
+    def test_id_digits_match_substrings(self):
+        data = self._search('0003')
+        self.assertEqual([student['student_id'] for student in data['results']], ['T0000003'])
+
+
+class MetricsRegistryTests(TestCase):
+    """Multi-process collection keeps totals of exited workers but drops their gauges"""
+
+    def _registry(self, directory):
+        registry = metrics.Registry(directory)
+        return registry, registry.counter('requests', 'Requests'), registry.gauge('loaded', 'Loaded')
+
+    def test_dead_process_files_are_folded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Values of an exited worker: a process that already ran and was reaped
+            dead, requests, loaded = self._registry(directory)
+            requests.inc(3)
+            loaded.set(1, version='old')
+            dead.flush()
+            exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+            os.rename(os.path.join(directory, f'metrics-{os.getpid()}.json'),
+                      os.path.join(directory, f'metrics-{int(exited.stdout)}.json'))
+
+            live, requests, loaded = self._registry(directory)
+            requests.inc(2)
+            loaded.set(1, version='new')
+            exposition = live.exposition()
+            self.assertIn('requests_total 5', exposition)
+            self.assertIn('loaded{version="new"} 1', exposition)
+            self.assertNotIn('version="old"', exposition)
+            self.assertEqual(sorted(os.listdir(directory)), ['.lock', metrics.ARCHIVE_FILE, f'metrics-{os.getpid()}.json'])
+            # Folded counters keep counting on later scrapes
+            self.assertIn('requests_total 5', live.exposition())
+
+
+class PopularityTableTests(TestCase):
+    """Incremental catch-up and snapshots of the popularity table"""
+
+    def setUp(self):
+        self.club = Club.objects.create(name='Chess Club', category='Academics', description='Chess')
+        self.students = [
+            Student.objects.create(
+                user=User.objects.create_user(username=student_id, password='password'),
+                student_id=student_id, gender='Other', course=course
+            )
+            for student_id, course, *_ in STUDENTS[:3]
+        ]
+
+    def _interact(self, student, days_ago=0):
+        interaction = Interaction.objects.create(student=student, club=self.club, interaction_type='join')
+        if days_ago:
+            Interaction.objects.filter(pk=interaction.pk).update(timestamp=timezone.now() - timedelta(days=days_ago))
+        return interaction
+
+    def test_catch_up_counts_back_dated_rows(self):
+        self._interact(self.students[0])
+        table = popularity.PopularityTable()
+        table.catch_up()
+        self._interact(self.students[1], days_ago=10)
+        self.assertEqual(table.catch_up(), 1)
+        self.assertEqual(table.top(1)[0][2], 2 * popularity.EVENT_WEIGHTS['join'])
+
+    def test_snapshot_round_trip(self):
+        for student in self.students:
+            self._interact(student)
+        table = popularity.PopularityTable()
+        table.catch_up()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'popularity.npz')
+            table.save(path)
+            loaded = popularity.PopularityTable.load(path)
+        self.assertEqual(loaded.courses, table.courses)
+        self.assertTrue(all(type(course) is str for course in loaded.courses))
+        self.assertEqual(loaded.last_id, table.last_id)
+        loaded.set_clubs([(self.club.id, self.club.name, self.club.category)])
+        # Trending decays between the two calls; club and popularity must match
+        (club_id, _, score), = loaded.top(1, course='Computer Science')
+        self.assertEqual((club_id, score), (self.club.id, 2 * popularity.EVENT_WEIGHTS['join']))
+
+
+class InterestProfileTests(TestCase):
+    """Interest profiles match categories without growing the term vocabulary"""
+
+    def test_vocabulary_is_fixed(self):
+        size = len(profiles.vocabulary)
+        user = User.objects.create_user(username='T0000009', password='password')
+        student = Student.objects.create(
+            user=user, student_id='T0000009', gender='Other', course='Marine Biology',
+            hobbies=['Basketball', 'Underwater Hockey'], interests=['Kite Surfing']
+        )
+        profile = profiles.get_profile(Student.objects.get(pk=student.pk))
+        self.assertEqual(len(profiles.vocabulary), size)
+        self.assertEqual(profile.category_matches('Sports'), (False, 1))
+        self.assertEqual(profile.category_matches('Kite Surfing'), (True, 0))
+        self.assertEqual(profile.category_matches('Robotics'), (False, 0))
@@ -0,0 +1,183 @@
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager, nullcontext, ExitStack
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from . import tracing, metrics
+
+# Maximum number of DB queries per GET request, keyed by URL name. Exceeding a budget is logged
+# by RequestTimingMiddleware and fails QueryBudgetTests (recommender/tests.py).
+QUERY_BUDGETS = {
+    'recommender-recommend': {'max_queries': 10, 'user': 'student'},
+    'recommender-content-based': {'max_queries': 6, 'user': 'student'},
+    'recommender-collaborative': {'max_queries': 12, 'user': 'student'},
+    'recommender-async-recommend': {'max_queries': 10, 'user': 'student'},
+    'recommender-async-content-based': {'max_queries': 6, 'user': 'student'},
+    'recommender-async-collaborative': {'max_queries': 12, 'user': 'student'},
+    'category-list': {'max_queries': 6, 'user': 'student'},
+    'application-list': {'max_queries': 4, 'user': 'admin'},
+    'club-list': {'max_queries': 3, 'user': 'student'},
+    'savedclub-list': {'max_queries': 3, 'user': 'student'},
+}
+
+# Timings of the request being handled, set by RequestTimingMiddleware
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """DB query count, DB time and named stage durations collected for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.stages = {}
+        self._started = time.perf_counter()
+        # Concurrent hybrid stages record into the same request from pool threads
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_query(self, execute, sql, params, many, context):
+        """Database execute wrapper counting queries and their duration"""
+        if _current.get() is not self:
+            # A connection shared by concurrent async requests runs queries for each of them
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.queries += 1
+                self.db_seconds += elapsed
+
+    def server_timing(self):
+        """Value of the Server-Timing header, durations in milliseconds"""
+        metrics = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+        metrics.append(f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries"')
+        metrics.append(f'total;dur={self.elapsed * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def current():
+    """Timings of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def _aliases(using):
+    """Database aliases to count queries on: one alias, or all of them (primary and replica)"""
+    return [using] if using else list(connections)
+
+
+def _record_queries(timings, using):
+    stack = ExitStack()
+    for alias in _aliases(using):
+        stack.enter_context(connections[alias].execute_wrapper(timings.record_query))
+    return stack
+
+
+@contextmanager
+def collect(using=None):
+    """Collect query counts and stage timings for the enclosed block"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        with _record_queries(timings, using):
+            yield timings
+    finally:
+        _current.reset(token)
+
+
+@asynccontextmanager
+async def acollect(using=None):
+    """
+    collect() for async requests.
+
+    Connections are per thread, and async ORM queries run on the request's sync thread, so the
+    query wrapper is installed on that thread's connection rather than the event loop's.
+    """
+    timings = RequestTimings()
+    token = _current.set(timings)
+
+    def install():
+        for alias in _aliases(using):
+            connections[alias].execute_wrappers.append(timings.record_query)
+
+    def remove():
+        for alias in _aliases(using):
+            connections[alias].execute_wrappers.remove(timings.record_query)
+
+    await sync_to_async(install)()
+    try:
+        yield timings
+    finally:
+        await sync_to_async(remove)()
+        _current.reset(token)
+
+
+def track_queries(using=None):
+    """Count this thread's queries towards the current request (for work run on other threads)"""
+    timings = _current.get()
+    if timings is None:
+        return nullcontext()
+    return _record_queries(timings, using)
+
+
+@contextmanager
+def stage(name):
+    """Time a stage (auth, cbf, cf, model, serialize, ...) of the current request, trace and metrics"""
+    timings = _current.get()
+    with tracing.span(name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if timings is not None:
+                timings.add(name, elapsed)
+            metrics.STAGE_LATENCY.observe(elapsed, stage=name)
+
+
+def timed(name):
+    """Decorator timing every call of a function as a stage of the current request"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_max_queries(max_queries, using='default', label=None):
+    """
+    Fail when the enclosed block runs more than max_queries queries.
+
+    The error lists the executed SQL, which makes N+1 patterns easy to spot.
+
+    Args:
+        max_queries: Allowed number of queries
+        using: Database alias to watch
+        label: Name used in the error message
+    """
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > max_queries:
+        queries = '\n'.join(f"  {i}. {query['sql']}" for i, query in enumerate(captured.captured_queries, 1))
+        raise QueryBudgetExceeded(
+            f"{label or 'Block'} ran {len(captured)} queries, budget is {max_queries}:\n{queries}"
+        )
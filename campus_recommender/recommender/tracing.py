@@ -0,0 +1,167 @@
+import json
+import time
+import functools
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Span of the stage currently running, None outside a trace
+_current = contextvars.ContextVar('trace_span', default=None)
+# Shared no-op context returned while tracing is off, so disabled spans allocate nothing
+_NOOP = nullcontext()
+
+
+class Span:
+    """A timed stage with nested sub-stages"""
+
+    __slots__ = ('name', 'attrs', 'start', 'duration', 'children')
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.duration = None
+        self.children = []
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'attrs': self.attrs,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+    def walk(self, depth=0):
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+class Tracer:
+    """
+    Collects finished traces into a ring buffer and per-stage aggregates.
+
+    Finished traces can also be logged as indented span trees and appended to a JSON Lines
+    profile file.
+    """
+
+    def __init__(self, enabled=False, buffer_size=200, log_threshold_ms=None, profile_path=None):
+        self.enabled = enabled
+        self.log_threshold_ms = log_threshold_ms
+        self.profile_path = profile_path
+        self.recent = deque(maxlen=buffer_size)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, **attrs):
+        """Context manager timing a stage; starts a new trace when none is active"""
+        if not self.enabled:
+            return _NOOP
+        return self._span(name, attrs)
+
+    @contextmanager
+    def _span(self, name, attrs):
+        parent = _current.get()
+        span = Span(name, attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _current.reset(token)
+            if parent is not None:
+                parent.children.append(span)
+            else:
+                self._finish(span)
+
+    def _finish(self, root):
+        with self._lock:
+            for _, span in root.walk():
+                stats = self._stages.setdefault(span.name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+                ms = span.duration * 1000
+                stats['count'] += 1
+                stats['total_ms'] += ms
+                stats['max_ms'] = max(stats['max_ms'], ms)
+            self.recent.append({'finished_at': time.time(), **root.to_dict()})
+
+        if self.log_threshold_ms is not None and root.duration * 1000 >= self.log_threshold_ms:
+            lines = [f"{'  ' * depth}{span.name} {span.duration * 1000:.2f}ms" for depth, span in root.walk()]
+            logger.info('Trace:\n' + '\n'.join(lines))
+        if self.profile_path:
+            try:
+                with open(self.profile_path, 'a') as f:
+                    f.write(json.dumps(root.to_dict(), default=str) + '\n')
+            except OSError as e:
+                logger.error(f"Error writing trace profile: {str(e)}")
+
+    def stage_stats(self):
+        """Per-stage call count, total, mean and max duration across all finished traces"""
+        with self._lock:
+            return {
+                name: {
+                    'count': stats['count'],
+                    'total_ms': round(stats['total_ms'], 3),
+                    'mean_ms': round(stats['total_ms'] / stats['count'], 3),
+                    'max_ms': round(stats['max_ms'], 3),
+                }
+                for name, stats in sorted(self._stages.items(), key=lambda item: -item[1]['total_ms'])
+            }
+
+    def slowest(self, limit=10):
+        """Slowest traces in the ring buffer, with their span trees"""
+        with self._lock:
+            traces = list(self.recent)
+        return sorted(traces, key=lambda trace: trace['ms'] or 0, reverse=True)[:limit]
+
+    def profile(self, limit=10):
+        """JSON-serializable profile: stage aggregates plus the slowest recent traces"""
+        return {
+            'enabled': self.enabled,
+            'traces_buffered': len(self.recent),
+            'stages': self.stage_stats(),
+            'slowest': self.slowest(limit),
+        }
+
+    def dump_profile(self, path, limit=50):
+        with open(path, 'w') as f:
+            json.dump(self.profile(limit), f, indent=2, default=str)
+
+    def reset(self):
+        with self._lock:
+            self.recent.clear()
+            self._stages.clear()
+
+
+tracer = Tracer(
+    enabled=getattr(settings, 'RECOMMENDER_TRACING', False),
+    buffer_size=getattr(settings, 'RECOMMENDER_TRACE_BUFFER_SIZE', 200),
+    log_threshold_ms=getattr(settings, 'RECOMMENDER_TRACE_LOG_MS', None),
+    profile_path=getattr(settings, 'RECOMMENDER_TRACE_FILE', None),
+)
+
+
+def span(name, **attrs):
+    """Time a stage of the current trace (no-op while tracing is disabled)"""
+    return tracer.span(name, **attrs)
+
+
+def traced(name):
+    """Decorator running every call of a function inside a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    return _current.get()
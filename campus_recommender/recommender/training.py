@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import logging
+import numpy as np
+import tensorflow as tf
+from contextlib import contextmanager
+from scipy.sparse import save_npz
+from sklearn.feature_extraction.text import TfidfVectorizer
+from .embeddings import student_document, club_document
+from .artifacts import MODEL_FILE, STUDENT_VECTORS_FILE, CLUB_VECTORS_FILE, VECTORIZER_FILE, MANIFEST_FILE, save_row_ids
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Collects the wall time of each named pipeline stage"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+
+def fit_vectorizer(student_docs, club_docs, max_features=1000):
+    """Fit the TF-IDF vectorizer on student and club documents, as the shipped artifact was"""
+    vectorizer = TfidfVectorizer(max_features=max_features, stop_words='english')
+    vectorizer.fit(list(student_docs) + list(club_docs))
+    return vectorizer
+
+
+def vectorize(vectorizer, students, clubs):
+    """Return sparse float32 student and club matrices, rows in the given order"""
+    student_vectors = vectorizer.transform([student_document(s) for s in students]).astype(np.float32)
+    club_vectors = vectorizer.transform([club_document(c) for c in clubs]).astype(np.float32)
+    return student_vectors, club_vectors
+
+
+def generate_pairs(positive_students, positive_clubs, num_clubs, negatives_per_positive=1, seed=None):
+    """
+    Build (student_idx, club_idx, label) training pairs.
+
+    Positives are the distinct interacted (student, club) rows; negatives are sampled uniformly
+    from clubs the student has not interacted with.
+    """
+    rng = np.random.default_rng(seed)
+    positive_keys = np.unique(np.asarray(positive_students, dtype=np.int64) * num_clubs +
+                              np.asarray(positive_clubs, dtype=np.int64))
+    pos_students = positive_keys // num_clubs
+    pos_clubs = positive_keys % num_clubs
+
+    num_negatives = len(positive_keys) * negatives_per_positive
+    neg_students = np.repeat(pos_students, negatives_per_positive)
+    neg_clubs = rng.integers(0, num_clubs, size=num_negatives)
+    # Drop sampled "negatives" that are actually positives
+    is_negative = ~np.isin(neg_students * num_clubs + neg_clubs, positive_keys)
+    neg_students, neg_clubs = neg_students[is_negative], neg_clubs[is_negative]
+
+    students = np.concatenate([pos_students, neg_students]).astype(np.int32)
+    clubs = np.concatenate([pos_clubs, neg_clubs]).astype(np.int32)
+    labels = np.concatenate([np.ones(len(pos_students)), np.zeros(len(neg_students))]).astype(np.float32)
+
+    order = rng.permutation(len(labels))
+    return students[order], clubs[order], labels[order]
+
+
+def make_dataset(student_vectors, club_vectors, students, clubs, labels, batch_size, shuffle=True, seed=None):
+    """
+    Stream batches for model.fit with tf.data.
+
+    Only the index arrays are kept whole; vector rows are densified per batch from the
+    sparse matrices, so memory stays flat regardless of the number of pairs.
+    """
+    vector_dim = student_vectors.shape[1]
+    num_pairs = len(labels)
+
+    def batches():
+        order = np.random.default_rng(seed).permutation(num_pairs) if shuffle else np.arange(num_pairs)
+        for start in range(0, num_pairs, batch_size):
+            batch = order[start:start + batch_size]
+            s, c = students[batch], clubs[batch]
+            yield {
+                'student_vector': student_vectors[s].toarray(),
+                'club_vector': club_vectors[c].toarray(),
+                'student_idx': s.reshape(-1, 1),
+                'club_idx': c.reshape(-1, 1),
+            }, labels[batch].reshape(-1, 1)
+
+    signature = (
+        {
+            'student_vector': tf.TensorSpec(shape=(None, vector_dim), dtype=tf.float32),
+            'club_vector': tf.TensorSpec(shape=(None, vector_dim), dtype=tf.float32),
+            'student_idx': tf.TensorSpec(shape=(None, 1), dtype=tf.int32),
+            'club_idx': tf.TensorSpec(shape=(None, 1), dtype=tf.int32),
+        },
+        tf.TensorSpec(shape=(None, 1), dtype=tf.float32),
+    )
+    num_batches = (num_pairs + batch_size - 1) // batch_size
+    dataset = tf.data.Dataset.from_generator(batches, output_signature=signature)
+    return dataset.apply(tf.data.experimental.assert_cardinality(num_batches)).prefetch(tf.data.AUTOTUNE)
+
+
+def build_hybrid_model(num_students, num_clubs, vector_dim, embedding_dim=50, dropout=0.3):
+    """Same architecture as the shipped hybrid model: a content tower on the vectors and a CF tower on ID embeddings"""
+    student_vector = tf.keras.Input(shape=(vector_dim,), name='student_vector')
+    club_vector = tf.keras.Input(shape=(vector_dim,), name='club_vector')
+    student_idx = tf.keras.Input(shape=(1,), name='student_idx')
+    club_idx = tf.keras.Input(shape=(1,), name='club_idx')
+
+    student_embedding = tf.keras.layers.Embedding(num_students, embedding_dim, name='student_embedding')(student_idx)
+    club_embedding = tf.keras.layers.Embedding(num_clubs, embedding_dim, name='club_embedding')(club_idx)
+
+    content = tf.keras.layers.Concatenate()([student_vector, club_vector])
+    content = tf.keras.layers.Dense(128, activation='relu')(content)
+    content = tf.keras.layers.Dropout(dropout)(content)
+    content = tf.keras.layers.Dense(64, activation='relu')(content)
+    content = tf.keras.layers.Dropout(dropout)(content)
+
+    collaborative = tf.keras.layers.Concatenate()([
+        tf.keras.layers.Flatten()(student_embedding),
+        tf.keras.layers.Flatten()(club_embedding),
+    ])
+    collaborative = tf.keras.layers.Dense(128, activation='relu')(collaborative)
+    collaborative = tf.keras.layers.Dropout(dropout)(collaborative)
+    collaborative = tf.keras.layers.Dense(64, activation='relu')(collaborative)
+    collaborative = tf.keras.layers.Dropout(dropout)(collaborative)
+
+    merged = tf.keras.layers.Concatenate()([content, collaborative])
+    merged = tf.keras.layers.Dense(64, activation='relu')(merged)
+    merged = tf.keras.layers.Dropout(dropout)(merged)
+    output = tf.keras.layers.Dense(1, activation='sigmoid')(merged)
+
+    model = tf.keras.Model(inputs=[student_vector, club_vector, student_idx, club_idx], outputs=output)
+    model.compile(
+        optimizer='adam',
+        loss='binary_crossentropy',
+        metrics=['accuracy', tf.keras.metrics.AUC(name='auc')]
+    )
+    return model
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """Records training examples per second for every epoch"""
+
+    def __init__(self, num_examples, log=None):
+        super().__init__()
+        self.num_examples = num_examples
+        self.log = log
+        self.epochs = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._start
+        entry = {
+            'epoch': epoch + 1,
+            'seconds': elapsed,
+            'examples_per_sec': self.num_examples / elapsed if elapsed > 0 else 0.0,
+        }
+        entry.update({key: float(value) for key, value in (logs or {}).items()})
+        self.epochs.append(entry)
+        if self.log:
+            self.log(entry)
+
+
+def write_artifacts(output_dir, version, model, student_vectors, club_vectors, vectorizer, manifest, row_ids=None):
+    """
+    Write a complete artifact version atomically.
+
+    Everything is written to a temporary directory that is renamed into place, so readers
+    never observe a partially written version. row_ids, if given, is a (student_ids, club_ids)
+    pair of primary keys in vector row order, used when the version is activated.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    final_dir = os.path.join(output_dir, version)
+    tmp_dir = os.path.join(output_dir, f'.{version}.tmp')
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    model.save(os.path.join(tmp_dir, MODEL_FILE))
+    save_npz(os.path.join(tmp_dir, STUDENT_VECTORS_FILE), student_vectors)
+    save_npz(os.path.join(tmp_dir, CLUB_VECTORS_FILE), club_vectors)
+    with open(os.path.join(tmp_dir, VECTORIZER_FILE), 'wb') as f:
+        pickle.dump(vectorizer, f)
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    if row_ids is not None:
+        save_row_ids(tmp_dir, *row_ids)
+
+    os.rename(tmp_dir, final_dir)
+    return final_dir
+
+
+def install_artifacts(version_dir, data_dir):
+    """Copy a version's files over the ones ModelHandler loads from data/, one atomic replace per file"""
+    for filename in (MODEL_FILE, STUDENT_VECTORS_FILE, CLUB_VECTORS_FILE, VECTORIZER_FILE):
+        tmp_path = os.path.join(data_dir, f'.{filename}.tmp')
+        shutil.copyfile(os.path.join(version_dir, filename), tmp_path)
+        os.replace(tmp_path, os.path.join(data_dir, filename))
@@ -28,6 +28,14 @@ urlpatterns = [
     # Dashboard statistics endpoint
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
 
+    # Recommender stage timings and slowest traces (admin only)
+    path('recommender/traces/', views.RecommenderTraceView.as_view(), name='recommender-traces'),
+
+    # Async recommender endpoints, for ASGI deployments
+    path('recommender/async/recommend/', views.async_recommend, name='recommender-async-recommend'),
+    path('recommender/async/content-based/', views.async_content_based, name='recommender-async-content-based'),
+    path('recommender/async/collaborative/', views.async_collaborative, name='recommender-async-collaborative'),
+
     # Custom interaction endpoints
     path('interactions/record-view/', views.InteractionViewSet.as_view({'post': 'record_view'}), name='record-view'),
 
@@ -0,0 +1,115 @@
+import time
+import uuid
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+# Version token keys: the club catalog, every student's recommendations (bulk imports), and one
+# student's recommendations (their profile and interactions)
+CATALOG_KEY = 'catalog'
+ALL_RECOMMENDATIONS_KEY = 'recommendations'
+RECOMMENDATIONS_KEY = 'recommendations:{user_id}'
+
+
+def _cache():
+    return caches[getattr(settings, 'RECOMMENDER_VERSION_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'RECOMMENDER_VERSION_TOKEN_SECONDS', None)
+
+
+def get_versions(*keys):
+    """Current tokens of keys, in one cache round trip; a missing (or evicted) token starts a new version"""
+    cache = _cache()
+    found = cache.get_many(keys)
+    for key in keys:
+        if found.get(key) is None:
+            # add() keeps the token of a concurrent first reader
+            cache.add(key, uuid.uuid4().hex, timeout=_timeout())
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def get_version(key):
+    """Current token of key; a missing (or evicted) token starts a new version"""
+    return get_versions(key)[0]
+
+
+def bump(*keys):
+    """
+    Give keys new tokens once the current transaction commits.
+
+    Bumping earlier would let a concurrent reader tag the uncommitted state's predecessor with
+    the new token and keep serving it as current.
+    """
+    if keys:
+        transaction.on_commit(lambda: _cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=_timeout()))
+
+
+def bump_catalog():
+    bump(CATALOG_KEY)
+
+
+def bump_recommendations(user_ids=None):
+    """New recommendation versions for the students of user_ids, or for every student when None"""
+    if user_ids is None:
+        bump(ALL_RECOMMENDATIONS_KEY)
+    else:
+        bump(*(RECOMMENDATIONS_KEY.format(user_id=user_id) for user_id in set(user_ids)))
+
+
+def catalog_state():
+    return (get_version(CATALOG_KEY),)
+
+
+def recommendations_state(user_id):
+    """
+    Tokens a student's recommendations depend on, read before they are computed.
+
+    Other students' activity (collaborative filtering, trending clubs) bumps no token of this
+    student, so a time bucket of RECOMMENDER_RECOMMENDATION_ETAG_SECONDS is part of the state.
+    """
+    bucket = int(time.time() // getattr(settings, 'RECOMMENDER_RECOMMENDATION_ETAG_SECONDS', 300))
+    return get_versions(RECOMMENDATIONS_KEY.format(user_id=user_id), ALL_RECOMMENDATIONS_KEY, CATALOG_KEY) + (bucket,)
+
+
+def make_etag(request, *parts):
+    """Strong ETag of a response to request (path, query string and format) given the state parts"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    key = '|'.join(str(part) for part in (request.get_full_path(), getattr(renderer, 'format', 'json')) + parts)
+    return f'"{hashlib.sha1(key.encode()).hexdigest()[:24]}"'
+
+
+def etag_matches(request, etag):
+    """
+    Whether the If-None-Match header of request matches etag.
+
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, so ETags that the compression
+    middleware has weakened still match.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def tag_response(response, etag, private=False):
+    """Set the ETag and revalidation headers on a response (or a 304 in place of it)"""
+    response['ETag'] = etag
+    if private:
+        # Per-user responses: shared caches must not serve one student's list to another
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def not_modified(etag, private=False):
+    return tag_response(HttpResponseNotModified(), etag, private)
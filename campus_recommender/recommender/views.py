@@ -3,6 +3,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.shortcuts import get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.conf import settings
 from rest_framework.decorators import action, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.views import APIView
@@ -15,9 +18,11 @@ from .models import Student, Club, Interaction, SavedClub, Admin, Category, Appl
 from .serializers import (
     StudentSerializer, ClubSerializer, InteractionSerializer,
     SavedClubSerializer, UserSerializer, AdminSerializer, AdminCreateSerializer,
-    CategorySerializer, ApplicationSerializer
+    CategorySerializer, ApplicationSerializer, requested_fields
 )
-from .model_handler import ModelHandler
+from .model_handler import acquire_model_handler, model_handler_lease, serving_model_version
+from . import search as search_index
+from . import timing, tracing, metrics, ingestion, renderers, versions
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
@@ -28,8 +33,12 @@ from django.http import JsonResponse
 import json
 from django.db.models import Q, Count
 from django.utils import timezone
+from django.db import close_old_connections
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
 
 class StudentPagination(PageNumberPagination):
@@ -37,6 +46,17 @@ class StudentPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class ClubCursorPagination(CursorPagination):
+    # Keyset pagination on the primary key: every page is one indexed range scan, however deep,
+    # and there is no COUNT(*) over the catalog
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+# Clubs fetched per database round trip and written per response chunk by the NDJSON export
+CLUB_EXPORT_CHUNK_SIZE = 500
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -66,11 +86,17 @@ class StudentViewSet(viewsets.ModelViewSet):
             # Search functionality
             search = self.request.query_params.get('search', None)
             if search:
-                queryset = queryset.filter(
-                    Q(user__username__icontains=search) |
-                    Q(student_id__icontains=search) |
-                    Q(user__email__icontains=search)
-                )
+                match_query = search_index.build_match_query(search) if search_index.is_available() else None
+                if match_query:
+                    # Ranked prefix search on the FTS index instead of a full-table scan
+                    queryset = search_index.filter_students(queryset, match_query)
+                else:
+                    # No index, or fragments only a substring match finds (digits of a student ID)
+                    queryset = queryset.filter(
+                        Q(user__username__icontains=search) |
+                        Q(student_id__icontains=search) |
+                        Q(user__email__icontains=search)
+                    )
                 
             # Course filter
             course = self.request.query_params.get('course', None)
@@ -200,12 +226,83 @@ class ClubViewSet(viewsets.ModelViewSet):
     queryset = Club.objects.all()
     serializer_class = ClubSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ClubCursorPagination
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'export']:
             return []
         return [IsAdminUser()]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request) if self.request.method == 'GET' else None
+        if fields:
+            # Leave unrequested columns (e.g. long descriptions) in the database
+            columns = {field.name for field in Club._meta.concrete_fields}
+            queryset = queryset.only(*(name for name in fields if name in columns))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+    @action(detail=False, methods=['get'], renderer_classes=[renderers.NDJSONRenderer])
+    def export(self, request):
+        """
+        The whole catalog as NDJSON, one club per line in ID order, serialized as rows come out of
+        the database so memory stays flat however many clubs there are. Takes fields= too.
+        """
+        return self._conditional(request, self._export)
+
+    def _export(self, request):
+        queryset = self.get_queryset().order_by('id')
+        serializer = self.get_serializer()
+        # Django buffers a sync iterator whole under ASGI (and an async one under WSGI)
+        if isinstance(request._request, ASGIRequest):
+            chunks = _aclub_ndjson_chunks(queryset, serializer)
+        else:
+            chunks = _club_ndjson_chunks(queryset, serializer)
+        return StreamingHttpResponse(chunks, content_type=renderers.NDJSONRenderer.media_type)
+
+    def _conditional(self, request, view, *args, **kwargs):
+        """Answer If-None-Match with 304 while the catalog version is unchanged, before any query"""
+        etag = versions.make_etag(request, *versions.catalog_state())
+        if versions.etag_matches(request, etag):
+            return versions.not_modified(etag)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            versions.tag_response(response, etag)
+        return response
+
+    def get_serializer(self, *args, **kwargs):
+        # Sparse fieldset: ?fields=id,name,category
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', requested_fields(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+def _club_ndjson_chunks(queryset, serializer):
+    lines = []
+    for club in queryset.iterator(chunk_size=CLUB_EXPORT_CHUNK_SIZE):
+        lines.append(renderers.dumps(serializer.to_representation(club)))
+        if len(lines) == CLUB_EXPORT_CHUNK_SIZE:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+async def _aclub_ndjson_chunks(queryset, serializer):
+    lines = []
+    async for club in queryset.aiterator(chunk_size=CLUB_EXPORT_CHUNK_SIZE):
+        lines.append(renderers.dumps(serializer.to_representation(club)))
+        if len(lines) == CLUB_EXPORT_CHUNK_SIZE:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
 class InteractionViewSet(viewsets.ModelViewSet):
     queryset = Interaction.objects.all()
     serializer_class = InteractionSerializer
@@ -219,12 +316,17 @@ class InteractionViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         student = get_object_or_404(Student, user=self.request.user)
         serializer.save(student=student)
+
+    def perform_destroy(self, instance):
+        versions.bump_recommendations([instance.student.user_id])
+        instance.delete()
         
     @action(detail=False, methods=['post'])
     def record_view(self, request):
         """
         Record a view interaction, updating if it already exists.
         This avoids the UNIQUE constraint error.
+        With RECOMMENDER_BUFFERED_VIEWS the view is queued and written in bulk later (202).
         """
         try:
             # 确保用户已认证
@@ -234,6 +336,11 @@ class InteractionViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
             
+            if getattr(settings, 'RECOMMENDER_BUFFERED_VIEWS', False):
+                buffered = self._buffer_view(request)
+                if buffered is not None:
+                    return buffered
+            
             student = get_object_or_404(Student, user=request.user)
             club_id = request.data.get('club')
             
@@ -263,6 +370,7 @@ class InteractionViewSet(viewsets.ModelViewSet):
             )
             
             print(f"View interaction {'created' if created else 'updated'} for student {student.id} and club {club.id}")
+            metrics.VIEW_EVENTS.inc(result='direct')
             
             return Response(
                 {
@@ -282,6 +390,32 @@ class InteractionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _buffer_view(self, request):
+        """
+        Validate a view against the buffer's caches and queue it.
+
+        Returns the response, or None when the buffer is full and the view is written directly.
+        """
+        view_buffer = ingestion.get_view_buffer()
+        student_pk = view_buffer.student_pk(request.user)
+        if student_pk is None:
+            raise Http404('Student not found')
+        club_id = request.data.get('club')
+        if not club_id:
+            return Response({'error': 'Club ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            club_id = int(club_id)
+        except (ValueError, TypeError):
+            return Response({'error': f'Invalid club ID: {club_id}'}, status=status.HTTP_400_BAD_REQUEST)
+        if not view_buffer.club_exists(club_id):
+            raise Http404('Club not found')
+        if not view_buffer.record(student_pk, club_id):
+            return None
+        return Response(
+            {'success': True, 'queued': True, 'student_id': student_pk, 'club_id': club_id},
+            status=status.HTTP_202_ACCEPTED
+        )
+
 class SavedClubViewSet(viewsets.ModelViewSet):
     queryset = SavedClub.objects.all()
     serializer_class = SavedClubSerializer
@@ -310,15 +444,17 @@ class ApplicationViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        # The serializer reads the student's name and the club's name for every row
+        applications = Application.objects.select_related('student__user', 'club')
         if user.is_anonymous:  # Handle anonymous users
-            return Application.objects.all().order_by('-apply_date')
+            return applications.order_by('-apply_date')
         if user.is_staff:
-            return Application.objects.all().order_by('-apply_date')
+            return applications.order_by('-apply_date')
         
         # Regular users can only see their own applications
         try:
             student = Student.objects.get(user=user)
-            return Application.objects.filter(student=student).order_by('-apply_date')
+            return applications.filter(student=student).order_by('-apply_date')
         except Student.DoesNotExist:
             return Application.objects.none()
 
@@ -353,83 +489,174 @@ class ApplicationViewSet(viewsets.ModelViewSet):
 
 class RecommenderViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
-    _model_handler = None
 
-    @classmethod
-    def get_model_handler(cls):
-        """Get a shared ModelHandler instance, creating it if needed"""
-        if cls._model_handler is None:
-            cls._model_handler = ModelHandler()
-        return cls._model_handler
+    def perform_authentication(self, request):
+        with timing.stage('auth'):
+            super().perform_authentication(request)
+
+    def _club_details(self, recommendations, model_handler):
+        """Full club details for recommendations, fetched in one query, tagged with the model version"""
+        with timing.stage('serialize'):
+            clubs = Club.objects.in_bulk([rec['club_id'] for rec in recommendations])
+            details = _recommendation_details(recommendations, clubs, requested_fields(self.request))
+            return Response(details, headers=_model_version_headers(model_handler))
+
+    def _recommend(self, request, method_name):
+        # Read the version tokens before computing, so a change meanwhile is never tagged as seen
+        state = versions.recommendations_state(request.user.id)
+        model_version = serving_model_version()
+        if model_version is not None:
+            etag = versions.make_etag(request, request.user.id, *state, model_version)
+            if versions.etag_matches(request, etag):
+                return versions.not_modified(etag, private=True)
 
-    @action(detail=False, methods=['get'])
-    def recommend(self, request):
         student = get_object_or_404(Student, user=request.user)
         n_recommendations = int(request.query_params.get('n', 5))
 
-        model_handler = self.get_model_handler()
-        recommendations = model_handler.get_hybrid_recommendations(
-            student, top_n=n_recommendations
-        )
-        
-        # Get full club details for recommendations
-        club_details = []
-        for rec in recommendations:
-            club = get_object_or_404(Club, id=rec['club_id'])
-            club_data = ClubSerializer(club).data
-            club_data.update({
-                'score': rec['score'],
-                'recommendation_type': rec['type']
-            })
-            club_details.append(club_data)
-        
-        return Response(club_details)
+        with model_handler_lease() as model_handler:
+            recommendations = getattr(model_handler, method_name)(student, top_n=n_recommendations)
+
+        response = self._club_details(recommendations, model_handler)
+        etag = versions.make_etag(request, request.user.id, *state, model_handler.version or '')
+        return versions.tag_response(response, etag, private=True)
 
     @action(detail=False, methods=['get'])
-    def content_based(self, request):
-        student = get_object_or_404(Student, user=request.user)
-        n_recommendations = int(request.query_params.get('n', 5))
+    def recommend(self, request):
+        return self._recommend(request, 'get_hybrid_recommendations')
 
-        model_handler = self.get_model_handler()
-        recommendations = model_handler.get_content_based_recommendations(
-            student, top_n=n_recommendations
-        )
-        
-        # Get full club details for recommendations
-        club_details = []
-        for rec in recommendations:
-            club = get_object_or_404(Club, id=rec['club_id'])
-            club_data = ClubSerializer(club).data
-            club_data.update({
-                'score': rec['score'],
-                'recommendation_type': rec['type']
-            })
-            club_details.append(club_data)
-        
-        return Response(club_details)
+    @action(detail=False, methods=['get'])
+    def content_based(self, request):
+        return self._recommend(request, 'get_content_based_recommendations')
 
     @action(detail=False, methods=['get'])
     def collaborative(self, request):
-        student = get_object_or_404(Student, user=request.user)
-        n_recommendations = int(request.query_params.get('n', 5))
+        return self._recommend(request, 'get_collaborative_recommendations')
+
+def _model_version_headers(model_handler):
+    return {'X-Model-Version': model_handler.version} if model_handler.version else {}
+
 
-        model_handler = self.get_model_handler()
-        recommendations = model_handler.get_collaborative_recommendations(
-            student, top_n=n_recommendations
+# Recommendation keys added to the club fields; they can be selected with fields= too
+RECOMMENDATION_FIELDS = ('score', 'recommendation_type', 'recommendation_sources')
+
+
+def _recommendation_details(recommendations, clubs, fields=None):
+    """
+    Serialized clubs with their recommendation score, type and sources.
+
+    Args:
+        recommendations: Recommendations of a ModelHandler method
+        clubs: Club objects by ID
+        fields: Sparse fieldset (club fields and RECOMMENDATION_FIELDS), None for everything
+    """
+    missing = [rec['club_id'] for rec in recommendations if rec['club_id'] not in clubs]
+    if missing:
+        raise Http404(f"Club {missing[0]} not found")
+    club_fields = None if fields is None else [name for name in fields if name not in RECOMMENDATION_FIELDS]
+    # One serializer for the whole list instead of one per club
+    serialized = ClubSerializer([clubs[rec['club_id']] for rec in recommendations], many=True, fields=club_fields).data
+
+    club_details = []
+    for rec, club_data in zip(recommendations, serialized):
+        extra = {
+            'score': rec['score'],
+            'recommendation_type': rec['type']
+        }
+        if 'sources' in rec:
+            extra['recommendation_sources'] = rec['sources']
+        if fields is not None:
+            extra = {key: value for key, value in extra.items() if key in fields}
+        club_data.update(extra)
+        club_details.append(club_data)
+    return club_details
+
+
+# Async recommender endpoints for ASGI deployments. DRF 3.14 views are synchronous, so these are
+# plain Django views: token, student and club lookups use the async ORM and the ModelHandler work
+# (ORM queries plus TensorFlow) runs on a bounded thread pool, keeping the event loop free.
+_recommender_executor = None
+
+
+def _get_recommender_executor():
+    global _recommender_executor
+    if _recommender_executor is None:
+        _recommender_executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'RECOMMENDER_ASYNC_WORKERS', 8),
+            thread_name_prefix='recommender'
         )
-        
-        # Get full club details for recommendations
-        club_details = []
-        for rec in recommendations:
-            club = get_object_or_404(Club, id=rec['club_id'])
-            club_data = ClubSerializer(club).data
-            club_data.update({
-                'score': rec['score'],
-                'recommendation_type': rec['type']
-            })
-            club_details.append(club_data)
-        
-        return Response(club_details)
+    return _recommender_executor
+
+
+def _offload(func, *args, **kwargs):
+    """Await func on the recommender thread pool, counting its queries towards the request"""
+    def run():
+        try:
+            with timing.track_queries():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False, executor=_get_recommender_executor())()
+
+
+async def _async_token_user(request):
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Token '):
+        return None
+    token = await Token.objects.select_related('user').filter(key=auth_header.split(' ')[1]).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+async def _async_recommendations(request, method_name):
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    with timing.stage('auth'):
+        user = await _async_token_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    # The cache backend's client is synchronous; keep it off the event loop
+    state = await sync_to_async(versions.recommendations_state, thread_sensitive=False)(user.id)
+    model_version = serving_model_version()
+    if model_version is not None:
+        etag = versions.make_etag(request, user.id, *state, model_version)
+        if versions.etag_matches(request, etag):
+            return versions.not_modified(etag, private=True)
+    student = await Student.objects.filter(user=user).afirst()
+    if student is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    n_recommendations = int(request.GET.get('n', 5))
+
+    model_handler = await _offload(acquire_model_handler)
+    try:
+        recommendations = await _offload(getattr(model_handler, method_name), student, top_n=n_recommendations)
+    finally:
+        model_handler.release()
+
+    with timing.stage('serialize'):
+        clubs = await Club.objects.ain_bulk([rec['club_id'] for rec in recommendations])
+        try:
+            club_details = _recommendation_details(recommendations, clubs, requested_fields(request))
+        except Http404 as e:
+            return JsonResponse({'detail': str(e)}, status=404)
+        except ValidationError as e:
+            return JsonResponse(e.detail, status=400)
+        body = renderers.dumps(club_details)
+    response = HttpResponse(body, content_type='application/json', headers=_model_version_headers(model_handler))
+    return versions.tag_response(response, versions.make_etag(request, user.id, *state, model_handler.version or ''), private=True)
+
+
+async def async_recommend(request):
+    return await _async_recommendations(request, 'get_hybrid_recommendations')
+
+
+async def async_content_based(request):
+    return await _async_recommendations(request, 'get_content_based_recommendations')
+
+
+async def async_collaborative(request):
+    return await _async_recommendations(request, 'get_collaborative_recommendations')
+
 
 class AdminViewSet(viewsets.ModelViewSet):
     queryset = Admin.objects.all()
@@ -450,12 +677,16 @@ class AdminViewSet(viewsets.ModelViewSet):
         # Search by name or email
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(user__username__icontains=search) |
-                Q(user__email__icontains=search) |
-                Q(user__first_name__icontains=search) |
-                Q(user__last_name__icontains=search)
-            )
+            match_query = search_index.build_match_query(search) if search_index.is_available() else None
+            if match_query:
+                queryset = search_index.filter_admins(queryset, match_query)
+            else:
+                queryset = queryset.filter(
+                    Q(user__username__icontains=search) |
+                    Q(user__email__icontains=search) |
+                    Q(user__first_name__icontains=search) |
+                    Q(user__last_name__icontains=search)
+                )
             
         return queryset
 
@@ -707,8 +938,8 @@ class CategoryListView(APIView):
             search = request.query_params.get('search', '')
             status_filter = request.query_params.get('status', '')
             
-            # Filter categories
-            categories = Category.objects.all()
+            # Filter categories, counting members in the same query
+            categories = Category.objects.annotate(num_members=Count('members'))
             if search:
                 categories = categories.filter(name__icontains=search)
             if status_filter:
@@ -732,7 +963,14 @@ class CategoryListView(APIView):
             # Slice for pagination
             categories = categories[start:end]
             
-            serializer = CategorySerializer(categories, many=True, context={'request': request})
+            context = {'request': request}
+            student = Student.objects.filter(user_id=request.user.id).first() if request.user.is_authenticated else None
+            if student:
+                # One membership lookup for the page instead of one per category
+                context['joined_category_ids'] = set(
+                    student.categories.filter(id__in=[c.id for c in categories]).values_list('id', flat=True)
+                )
+            serializer = CategorySerializer(categories, many=True, context=context)
             
             return Response({
                 'results': serializer.data,
@@ -833,4 +1071,41 @@ class DashboardStatsView(APIView):
             return Response(
                 {'error': f'Failed to fetch dashboard statistics: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class RecommenderTraceView(APIView):
+    """
+    Aggregated recommender stage timings and the slowest recent requests with their span trees
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        return Response(tracing.tracer.profile(limit))
+
+    def delete(self, request):
+        tracing.tracer.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def _may_scrape_metrics(request):
+    """Whether the request comes from an allow-listed scrape address or a staff user"""
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'RECOMMENDER_METRICS_ALLOWED_IPS', ()):
+        return True
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    token_key = request.headers.get('Authorization', '').removeprefix('Token ')
+    return bool(token_key) and Token.objects.filter(key=token_key, user__is_staff=True).exists()
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the recommender metrics, for allow-listed addresses and staff"""
+    if not getattr(settings, 'RECOMMENDER_METRICS_ENABLED', False):
+        raise Http404
+    if not _may_scrape_metrics(request):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')